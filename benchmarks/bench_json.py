@@ -0,0 +1,42 @@
+"""Compares the json codecs on the decoding of api pages and the encoding of
+RECORD messages.
+
+usage: python benchmarks/bench_json.py
+"""
+import timeit
+
+from payloads import sample_records
+
+from tap_yotpo import jsoncodec
+
+PAGES = {"orders": 100, "product_reviews": 150}
+REPEAT = 20
+
+
+def main():
+    # a command line benchmark, its results are reported on stdout
+    for stream_name, page_size in PAGES.items():
+        records = sample_records(stream_name, page_size)
+        page = jsoncodec.JsonCodec.dumps({stream_name: records}).encode("utf-8")
+        print(f"{stream_name}: {page_size} records per page, {len(page) // 1024} KiB")  # noqa: T201
+        for name in jsoncodec.AVAILABLE_CODECS:
+            codec = jsoncodec.get_codec(name)
+            decode = min(timeit.repeat(lambda: codec.loads(page), number=10, repeat=REPEAT)) / 10
+            encode = (
+                min(
+                    timeit.repeat(
+                        lambda: [codec.dumps({"type": "RECORD", "stream": stream_name, "record": _}) for _ in records],
+                        number=10,
+                        repeat=REPEAT,
+                    )
+                )
+                / 10
+            )
+            print(  # noqa: T201
+                f"  {name:>7}: decode {page_size / decode:>10,.0f} records/s"
+                f"  encode {page_size / encode:>10,.0f} records/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
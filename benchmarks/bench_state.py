@@ -0,0 +1,73 @@
+"""Measures the STATE messages written by a stream synced for every order
+id, with the state emission policies of `state_emit_every` and
+`state_emit_seconds`.
+
+usage: python benchmarks/bench_state.py [orders]
+"""
+import io
+import sys
+import time
+from unittest import mock
+
+from tap_yotpo.bookmarks import ParentBookmarks
+from tap_yotpo.checkpoints import StatePolicy
+from tap_yotpo.streams import OrderFulfillments
+from tap_yotpo.sync import SharedState
+
+POLICIES = {
+    "every state": {},
+    "every 100": {"state_emit_every": 100},
+    "every 1000": {"state_emit_every": 1000},
+    "every 5 seconds": {"state_emit_seconds": 5},
+}
+START_DATE = "2021-01-01T00:00:00Z"
+
+
+class CountingSink(io.RawIOBase):
+    """A stdout counting the bytes written to it."""
+
+    def __init__(self):
+        super().__init__()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def run(config, orders):
+    """Bookmarks `orders` orders one state at a time, returns the bytes
+    written and the cpu seconds spent."""
+    shared_state = SharedState({}, ["order_fulfillments"])
+    stream = OrderFulfillments(mock.Mock(config={"api_key": "key", **config}))
+    stream.state_writer = lambda state: shared_state.write(stream.tap_stream_id, state)
+    stream.state_policy = StatePolicy.from_config(config)
+    sink = CountingSink()
+    stdout = io.TextIOWrapper(sink, encoding="utf-8", write_through=True)
+    with mock.patch("sys.stdout", stdout):
+        started = time.process_time()
+        state = shared_state.start(stream.tap_stream_id)
+        parent_bookmarks = ParentBookmarks(state, stream.tap_stream_id, START_DATE)
+        for order_id in range(1, orders + 1):
+            parent_bookmarks.update(order_id, "2022-06-01T12:00:00Z")
+            state = stream.write_bookmark(state, "currently_syncing", order_id)
+            stream.write_state(parent_bookmarks.write())
+        shared_state.finish(stream.tap_stream_id, state)
+        elapsed = time.process_time() - started
+    return sink.size, elapsed
+
+
+def main():
+    # a command line benchmark, its results are reported on stdout
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"order_fulfillments: {orders} orders, one bookmark per order")  # noqa: T201
+    for name, config in POLICIES.items():
+        size, elapsed = run(config, orders)
+        print(f"  {name:>15}: {size / 2**20:>10,.1f} MiB of STATE  {elapsed:>7.2f} cpu seconds")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
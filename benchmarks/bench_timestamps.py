@@ -0,0 +1,47 @@
+"""Compares the parsing of the replication key of every incremental stream
+with `singer.utils.strptime_to_utc` and the ISO-8601 fast paths.
+
+usage: python benchmarks/bench_timestamps.py
+"""
+import timeit
+from unittest import mock
+
+from payloads import sample_records
+from singer import utils
+
+from tap_yotpo import streams, timestamps
+
+RECORDS = 1000
+REPEAT = 5
+
+# the fast path backends of `timestamps.strptime_to_utc`
+BACKENDS = {"fromisoformat": timestamps._fromisoformat}  # pylint: disable=W0212
+if timestamps.ciso8601:
+    BACKENDS["ciso8601"] = timestamps.ciso8601.parse_datetime
+
+
+def time_parse(parse, values):
+    """Returns the seconds spent parsing each value, checking the result
+    matches `singer.utils.strptime_to_utc`."""
+    assert [parse(_) for _ in values] == [utils.strptime_to_utc(_) for _ in values]
+    return min(timeit.repeat(lambda: [parse(_) for _ in values], number=1, repeat=REPEAT)) / len(values)
+
+
+def main():
+    # a command line benchmark, its results are reported on stdout
+    for tap_stream_id, stream_class in streams.STREAMS.items():
+        if not stream_class.replication_key:
+            continue
+        records = sample_records(tap_stream_id, RECORDS)
+        values = [_[stream_class.replication_key] for _ in records if _.get(stream_class.replication_key)]
+        print(f"{tap_stream_id}.{stream_class.replication_key}: {values[0]}")  # noqa: T201
+        before = time_parse(utils.strptime_to_utc, values)
+        print(f"  {'dateutil':>13}: {before * 10**6:>7.2f} us per record")  # noqa: T201
+        for name, backend in BACKENDS.items():
+            with mock.patch.object(timestamps, "_parse", backend):
+                after = time_parse(timestamps.strptime_to_utc, values)
+            print(f"  {name:>13}: {after * 10**6:>7.2f} us per record, {before / after:>5.1f}x faster")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
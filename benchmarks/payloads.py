@@ -0,0 +1,45 @@
+"""Realistic api payloads generated from the stream schemas."""
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from tap_yotpo.helpers import get_abs_path
+
+WORDS = "great fit lovely colour fast shipping would buy again runs small soft fabric".split()
+
+
+def load_schema(stream_name):
+    """Returns the json schema of a stream."""
+    with open(get_abs_path(f"schemas/{stream_name}.json"), encoding="utf-8") as schema_file:
+        return json.load(schema_file)
+
+
+def sample_value(schema, rand, key=""):
+    """Returns a value matching the schema, with a few nulls sprinkled in."""
+    types = schema.get("type", ["string"])
+    types = [types] if isinstance(types, str) else types
+    if "null" in types and rand.random() < 0.1:
+        return None
+    types = [_ for _ in types if _ != "null"] or ["string"]
+    typ = types[0]
+    if schema.get("format") == "date-time":
+        value = datetime(2021, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=rand.randint(0, 10**8))
+        return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    if typ == "object":
+        return {name: sample_value(sub, rand, name) for name, sub in schema.get("properties", {}).items()}
+    if typ == "array":
+        return [sample_value(schema.get("items", {}), rand, key) for _ in range(rand.randint(0, 3))]
+    if typ == "integer":
+        return rand.randint(1, 10**9)
+    if typ == "number":
+        return round(rand.uniform(0, 500), 2)
+    if typ == "boolean":
+        return rand.random() < 0.5
+    return " ".join(rand.choice(WORDS) for _ in range(rand.randint(1, 30 if key in ("content", "title") else 4)))
+
+
+def sample_records(stream_name, count, seed=0):
+    """Returns `count` records of a stream."""
+    rand = random.Random(seed)
+    schema = load_schema(stream_name)
+    return [sample_value(schema, rand) for _ in range(count)]
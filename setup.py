@@ -17,7 +17,13 @@ setup(
         "dev": [
             "pylint",
             "ipdb",
-        ]
+        ],
+        "brotli": [
+            "brotli",
+        ],
+        "ciso8601": [
+            "ciso8601",
+        ],
     },
     entry_points="""
     [console_scripts]
@@ -25,7 +25,11 @@ def main():
         ) as req_timer:
             client.req_counter = req_counter
             client.req_timer = req_timer
-            sync(client, args.catalog or discover(args.config), args.state)
+            try:
+                sync(client, args.catalog or discover(args.config), args.state)
+            finally:
+                # connection churn is reported along with the total requests metric
+                req_counter.tags.update(client.pool_stats())
 
 
 if __name__ == "__main__":
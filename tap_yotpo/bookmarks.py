@@ -0,0 +1,225 @@
+"""tap-yotpo parent bookmarks module.
+
+The child streams keep a replication key bookmark for every product or
+order they are synced for, so by default the state grows with the catalog.
+`ParentBookmarks` can instead keep a single watermark every parent was
+synced up to and only the few parents bookmarked after it.
+"""
+import base64
+import sys
+import zlib
+from array import array
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from singer.utils import now, strftime
+
+from .timestamps import strptime_to_utc
+
+# bookmark keys of the child streams which are not parent ids
+RESERVED_KEYS = {"currently_syncing", "low_watermark", "fingerprints", "changes_checked_at", "parents"}
+
+# records updated right before a pass started may not be visible to it yet
+PASS_LOOKBACK = timedelta(hours=1)
+
+
+def _as_int(parent_id) -> Optional[int]:
+    try:
+        return int(parent_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def pack_fingerprints(fingerprints: Dict[str, str]) -> str:
+    """Packs the 16 hex digits fingerprints of the parents in a single
+    string, the sorted ids then the fingerprints as binary, compressed."""
+    ids = array("q", sorted(_as_int(_) for _ in fingerprints))
+    digests = b"".join(bytes.fromhex(fingerprints[str(_)]) for _ in ids)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return base64.b64encode(zlib.compress(ids.tobytes() + digests)).decode("ascii")
+
+
+def unpack_fingerprints(packed: Optional[str]) -> Dict[str, str]:
+    """Returns the fingerprints of the parents packed by
+    `pack_fingerprints`."""
+    if not packed:
+        return {}
+    raw = zlib.decompress(base64.b64decode(packed))
+    ids = array("q", raw[: len(raw) // 2])
+    if sys.byteorder == "big":
+        ids.byteswap()
+    digests = raw[len(raw) // 2 :]
+    return {str(parent_id): digests[index * 8 : index * 8 + 8].hex() for index, parent_id in enumerate(ids)}
+
+
+class ParentBookmarks:
+    """The bookmarks of the parents of a child stream.
+
+    By default every parent id is a key of the stream bookmarks. The compact
+    store keeps them in the `parents` bookmark instead:
+     - `watermark`: the start of the last complete pass over the parents,
+       every record updated before it was synced.
+     - `covered_through`: the greatest parent id synced by the complete
+       passes, the watermark does not apply to the parents created since.
+     - `exceptions`: the parents bookmarked after the watermark.
+     - `pass_watermark` and `synced_through`: the start of the pass in
+       progress and the id up to which the parents, synced in id order, are
+       bookmarked from it.
+     - `fingerprints`: the fingerprints of the parents packed in a single
+       string.
+
+    An interrupted pass resumed from `synced_through` keeps its
+    `pass_watermark`. When the parents are not synced in id order, the
+    bookmarks of the pass are only written once it completes.
+    """
+
+    def __init__(self, state: Dict, tap_stream_id: str, start_date: str, compact: bool = False) -> None:
+        self.state = state
+        self.tap_stream_id = tap_stream_id
+        self.start_date = start_date
+        self.compact = compact
+        bookmarks = state.get("bookmarks", {}).get(tap_stream_id, {})
+        parents = bookmarks.get("parents", {})
+        self.watermark = parents.get("watermark")
+        self.covered_through = parents.get("covered_through")
+        self.pass_watermark = parents.get("pass_watermark")
+        self.synced_through = parents.get("synced_through")
+        self.exceptions = dict(parents.get("exceptions", {}))
+        self.fingerprints = unpack_fingerprints(parents.get("fingerprints"))
+        self._packed_fingerprints = parents.get("fingerprints")
+        if compact:
+            # the bookmarks written per parent by the previous syncs are kept as exceptions
+            for key, value in bookmarks.items():
+                if key not in RESERVED_KEYS:
+                    self.exceptions.setdefault(key, value)
+            for key, value in bookmarks.get("fingerprints", {}).items():
+                if _as_int(key) is not None:
+                    self.fingerprints.setdefault(key, value)
+                    self._packed_fingerprints = None
+        self._unsettled = set()
+        self._deferred = None
+
+    def start(self, resumed: bool, in_order: bool = True) -> None:
+        """Starts a pass over the parents, or resumes the interrupted one.
+
+        Parents not synced `in_order` keep the bookmarks of the previous
+        pass in the state until `complete`.
+        """
+        if not in_order:
+            self._deferred = self.to_dict()
+        if not resumed or not in_order or not self.pass_watermark:
+            self.pass_watermark, self.synced_through = strftime(now() - PASS_LOOKBACK), None
+
+    def _pass_synced(self, parent_id: str) -> bool:
+        parent_id = _as_int(parent_id)
+        return self.synced_through is not None and parent_id is not None and parent_id <= self.synced_through
+
+    def _covered(self, parent_id: str) -> bool:
+        parent_id = _as_int(parent_id)
+        return (
+            bool(self.watermark) and None not in (parent_id, self.covered_through) and parent_id <= self.covered_through
+        )
+
+    def get(self, parent_id) -> str:
+        """Returns the bookmark of a parent, the start date for a parent
+        never synced."""
+        parent_id = str(parent_id)
+        if not self.compact:
+            return self.state.get("bookmarks", {}).get(self.tap_stream_id, {}).get(parent_id, self.start_date)
+        if self._pass_synced(parent_id):
+            base = self.pass_watermark
+        else:
+            base = self.watermark if self._covered(parent_id) else None
+        values = [_ for _ in (base, self.exceptions.get(parent_id), self.start_date) if _]
+        return max(values, key=strptime_to_utc)
+
+    def known(self, parent_id) -> bool:
+        """Returns whether a parent was synced by a previous sync."""
+        parent_id = str(parent_id)
+        if not self.compact:
+            return parent_id in self.state.get("bookmarks", {}).get(self.tap_stream_id, {})
+        return self._covered(parent_id) or parent_id in self.exceptions or self._pass_synced(parent_id)
+
+    def update(self, parent_id, value: str) -> None:
+        """Bookmarks a parent synced up to `value`."""
+        parent_id = str(parent_id)
+        if not self.compact:
+            self.state.setdefault("bookmarks", {}).setdefault(self.tap_stream_id, {})[parent_id] = value
+            return
+        self.exceptions[parent_id] = value
+        self._unsettled.add(parent_id)
+        self._settle()
+
+    def get_fingerprint(self, parent_id) -> Optional[str]:
+        """Returns the fingerprint of a parent recorded by the previous
+        syncs."""
+        if not self.compact:
+            return (
+                self.state.get("bookmarks", {}).get(self.tap_stream_id, {}).get("fingerprints", {}).get(str(parent_id))
+            )
+        return self.fingerprints.get(str(parent_id))
+
+    def set_fingerprint(self, parent_id, fingerprint: str) -> None:
+        """Records the fingerprint of a parent."""
+        if not self.compact:
+            bookmarks = self.state.setdefault("bookmarks", {}).setdefault(self.tap_stream_id, {})
+            bookmarks.setdefault("fingerprints", {})[str(parent_id)] = fingerprint
+        elif _as_int(parent_id) is not None and self.fingerprints.get(str(parent_id)) != fingerprint:
+            self.fingerprints[str(parent_id)] = fingerprint
+            self._packed_fingerprints = None
+
+    def advance(self, parent_id) -> None:
+        """Records that every parent up to `parent_id` was synced by the
+        pass."""
+        if self.compact and self._deferred is None and _as_int(parent_id) is not None:
+            self.synced_through = _as_int(parent_id)
+            self._settle()
+
+    def _settle(self) -> None:
+        """Drops the exceptions of the parents covered by the pass
+        watermark."""
+        pass_watermark = strptime_to_utc(self.pass_watermark) if self.pass_watermark else None
+        for parent_id in [_ for _ in self._unsettled if self._pass_synced(_)]:
+            self._unsettled.discard(parent_id)
+            if strptime_to_utc(self.exceptions[parent_id]) <= pass_watermark:
+                del self.exceptions[parent_id]
+
+    def complete(self, parent_ids: Iterable[Tuple] = ()) -> None:
+        """Ends a pass which synced every parent of `parent_ids`, its start
+        becomes the watermark of the parents up to the greatest id."""
+        if not self.compact or not self.pass_watermark:
+            return
+        covered = [_ for _ in (_as_int(pair[0]) for pair in parent_ids) if _ is not None]
+        if self.covered_through is not None:
+            covered.append(self.covered_through)
+        self.covered_through = max(covered, default=None)
+        self.watermark, self.pass_watermark, self.synced_through = self.pass_watermark, None, None
+        watermark = strptime_to_utc(self.watermark)
+        self.exceptions = {key: value for key, value in self.exceptions.items() if strptime_to_utc(value) > watermark}
+        self._unsettled.clear()
+        self._deferred = None
+
+    def to_dict(self) -> Dict:
+        """Returns the value of the `parents` bookmark."""
+        if self._deferred is not None:
+            return self._deferred
+        parents = {"watermark": self.watermark, "exceptions": dict(self.exceptions)}
+        if self.covered_through is not None:
+            parents["covered_through"] = self.covered_through
+        if self.fingerprints:
+            if self._packed_fingerprints is None:
+                self._packed_fingerprints = pack_fingerprints(self.fingerprints)
+            parents["fingerprints"] = self._packed_fingerprints
+        if self.pass_watermark:
+            parents.update(pass_watermark=self.pass_watermark, synced_through=self.synced_through)
+        return parents
+
+    def write(self) -> Dict:
+        """Writes the compact bookmarks to the state, returns the state."""
+        if self.compact:
+            bookmarks = self.state.setdefault("bookmarks", {}).setdefault(self.tap_stream_id, {})
+            for key in [_ for _ in bookmarks if _ not in RESERVED_KEYS or _ == "fingerprints"]:
+                del bookmarks[key]
+            bookmarks["parents"] = self.to_dict()
+        return self.state
@@ -0,0 +1,97 @@
+"""tap-yotpo state checkpoints module.
+
+The streams fetched for every product or order id write a state after each
+parent, a full dump of bookmarks growing with the parents. `StatePolicy`
+holds those states back until `state_emit_every` states were passed or
+`state_emit_seconds` elapsed since the last emitted one. A state always
+describes records already written, so holding it back only moves the
+checkpoint an interrupted sync resumes from: the last state is emitted
+when a stream ends or fails. After a shutdown signal, or once a stream
+failed, the other streams emit their state and stop at their next
+checkpoint or api request.
+"""
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+from singer import get_logger
+
+LOGGER = get_logger()
+
+# set by the first shutdown signal received during a sync, or by the first stream failing
+shutdown_requested = threading.Event()
+
+
+class ShutdownRequested(Exception):
+    """Raised by a stream stopped at a checkpoint by a shutdown signal or
+    the failure of another stream."""
+
+
+class StatePolicy:
+    """Decides which states of a stream are emitted, every state by
+    default."""
+
+    def __init__(
+        self, every: Optional[int] = None, seconds: Optional[float] = None, clock: Callable = time.monotonic
+    ) -> None:
+        self.every = max(int(every), 1) if every else None
+        self.seconds = float(seconds) if seconds else None
+        self.clock = clock
+        self._count = 0
+        self._emitted_at = clock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "StatePolicy":
+        """Returns the policy of the `state_emit_every` and
+        `state_emit_seconds` parameters."""
+        return cls(config.get("state_emit_every"), config.get("state_emit_seconds"))
+
+    def due(self) -> bool:
+        """Counts a state, returns whether it is emitted."""
+        self._count += 1
+        if self.every is None and self.seconds is None:
+            return True
+        if (self.every and self._count >= self.every) or (
+            self.seconds and self.clock() - self._emitted_at >= self.seconds
+        ):
+            self._count, self._emitted_at = 0, self.clock()
+            return True
+        return False
+
+
+@contextmanager
+def stopping_on_signals(signals: Sequence = (signal.SIGTERM, signal.SIGINT)) -> Iterator[None]:
+    """Requests the streams to stop at their next checkpoint on the first of
+    `signals`, the next one is handled by the previous handlers.
+
+    Signal handlers are only installed from the main thread.
+    """
+    shutdown_requested.clear()
+    if threading.current_thread() is not threading.main_thread():
+        try:
+            yield
+        finally:
+            shutdown_requested.clear()
+        return
+
+    previous = {}
+
+    def restore_handlers() -> None:
+        for signum, handler in previous.items():
+            if handler is not None:
+                signal.signal(signum, handler)
+
+    def request_shutdown(signum, _) -> None:
+        LOGGER.warning("Received signal %s, stopping the streams at their next checkpoint", signum)
+        shutdown_requested.set()
+        restore_handlers()
+
+    for signum in signals:
+        previous[signum] = signal.signal(signum, request_shutdown)
+    try:
+        yield
+    finally:
+        restore_handlers()
+        shutdown_requested.clear()
@@ -1,16 +1,41 @@
 """tap-yotpo client module."""
-from typing import Any, Dict, Mapping, Optional, Tuple
+import socket
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Sequence, Tuple
 
 import backoff
 import requests
 from requests import session
+from requests.adapters import HTTPAdapter
 from singer import get_logger, metrics
+from urllib3.connection import HTTPConnection
 
 from . import exceptions as errors
+from . import jsoncodec
+from .checkpoints import ShutdownRequested, shutdown_requested
 from .helpers import ApiSpec
+from .jsonstream import iter_json_array
+from .ratelimit import RateLimiter
 
 LOGGER = get_logger()
 
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 30
+DEFAULT_REQUEST_TIMEOUT = 300
+STREAM_CHUNK_SIZE = 64 * 1024
+# errors interrupting a streamed body, the page is requested again up to `STREAM_MAX_TRIES` times
+STREAM_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionResetError,
+)
+STREAM_MAX_TRIES = 5
+# hosts served by a dedicated connection pool, keyed by the config name of their pool size
+POOL_HOSTS = {"api": "https://api.yotpo.com", "cdn": "https://api-cdn.yotpo.com"}
+
 
 def raise_for_error(response: requests.Response) -> None:
     """Raises the associated response exception. Takes in a response object,
@@ -32,6 +57,37 @@ def raise_for_error(response: requests.Response) -> None:
             raise errors.ClientError(_) from None
 
 
+def is_not_retried(err: Exception) -> bool:
+    """Returns whether the request raising `err` asked for its error not to
+    be retried."""
+    return getattr(err, "retried", True) is False
+
+
+class PoolAdapter(HTTPAdapter):
+    """A HTTPAdapter with TCP keep-alive probes enabled on its connections
+    and access to its connection pool statistics."""
+
+    def __init__(self, keepalive_idle: Optional[int] = None, **kwargs) -> None:
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        if self.keepalive_idle and hasattr(socket, "TCP_KEEPIDLE"):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle))
+        kwargs["socket_options"] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Returns the number of connections created and requests sent by the
+        pools of the adapter."""
+        pools = [self.poolmanager.pools[key] for key in self.poolmanager.pools.keys()]
+        return {
+            "connections_created": sum(pool.num_connections for pool in pools),
+            "requests_sent": sum(pool.num_requests for pool in pools),
+        }
+
+
 class Client:
     """
     A Wrapper class with support for V1 & V3 and UGC Yotpo api.
@@ -47,13 +103,62 @@ class Client:
     def __init__(self, config: Mapping[str, Any]) -> None:
         self.config = config
         self._session = session()
+        self._adapters = self.mount_adapters()
+        self.timeout = (
+            float(config.get("connect_timeout") or DEFAULT_CONNECT_TIMEOUT),
+            float(config.get("request_timeout") or DEFAULT_REQUEST_TIMEOUT),
+        )
         self.__utoken = None
+        # streams may fan out requests over worker threads sharing this client
+        self._lock = threading.RLock()
+        self.rate_limiter = RateLimiter(config)
         self.req_counter: metrics.Counter = None
         self.req_timer: metrics.Timer = None
 
+    def mount_adapters(self) -> Dict[str, PoolAdapter]:
+        """Mounts a keep-alive connection pool for each yotpo host.
+
+        The `pool_maxsize` config is either a number applied to every host or
+        a mapping of `api`/`cdn` to a number. By default the pools are sized
+        to the largest worker count configured so that parallel streams
+        don't discard their connections.
+        """
+        concurrency = [
+            int(value)
+            for key, value in self.config.items()
+            if (key.endswith("_concurrency") or key == "max_parallel_streams") and str(value).isdigit()
+        ]
+        default_size = max(concurrency + [DEFAULT_POOL_MAXSIZE])
+        pool_maxsize = self.config.get("pool_maxsize") or default_size
+        adapters = {}
+        for name, host in POOL_HOSTS.items():
+            size = int(pool_maxsize.get(name, default_size) if isinstance(pool_maxsize, dict) else pool_maxsize)
+            adapters[name] = PoolAdapter(
+                keepalive_idle=int(self.config.get("keepalive_idle", 60)), pool_connections=1, pool_maxsize=size
+            )
+            self._session.mount(host, adapters[name])
+        return adapters
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Returns the connections created and reused across the yotpo
+        hosts."""
+        stats = {"connections_created": 0, "connections_reused": 0}
+        for adapter in self._adapters.values():
+            adapter_stats = adapter.pool_stats()
+            stats["connections_created"] += adapter_stats["connections_created"]
+            stats["connections_reused"] += adapter_stats["requests_sent"] - adapter_stats["connections_created"]
+        return stats
+
     def _get_auth_token(self, force: Optional[bool] = False):
         if self.__utoken and not force:
             return self.__utoken
+        with self._lock:
+            # another worker may have fetched the token while this one was waiting
+            if self.__utoken and not force:
+                return self.__utoken
+            return self.__fetch_auth_token()
+
+    def __fetch_auth_token(self) -> str:
         data = {
             "client_id": self.config["api_key"],
             "client_secret": self.config["api_secret"],
@@ -61,7 +166,7 @@ class Client:
         }
         # directly using the session object bypassing the self.__make_request
         # as a authentication failure creates a infinite recursion loop
-        resp = self._session.request("POST", self.auth_url, data=data)
+        resp = self._session.request("POST", self.auth_url, data=data, timeout=self.timeout)
         if resp.status_code == 200:
             response = resp.json()
             self.__utoken = response["access_token"]
@@ -82,10 +187,14 @@ class Client:
         return headers, params
 
     @backoff.on_exception(wait_gen=backoff.expo, exception=(errors.Http401RequestError,), jitter=None, max_tries=1)
-    def get(self, endpoint: str, params: Dict, headers: Dict, api_auth_version: Any) -> Any:
-        """Calls the make_request method with a prefixed method type `GET`"""
+    def get(
+        self, endpoint: str, params: Dict, headers: Dict, api_auth_version: Any, retry_not_found: bool = True
+    ) -> Any:
+        """Calls the make_request method with a prefixed method type `GET`,
+        a `404` is raised at once with `retry_not_found=False`."""
+        # pylint: disable=R0913
         headers, params = self.authenticate(headers, params, api_auth_version)
-        return self.__make_request("GET", endpoint, headers=headers, params=params)
+        return self.__make_request("GET", endpoint, headers=headers, params=params, retry_not_found=retry_not_found)
 
     def post(self, endpoint: str, params: Dict, headers: Dict, api_auth_version: Any, body: Dict) -> Any:
         """Calls the make_request method with a prefixed method type `POST`"""
@@ -93,6 +202,45 @@ class Client:
         headers, params = self.authenticate(headers, params, api_auth_version)
         self.__make_request("POST", endpoint, headers=headers, params=params, data=body)
 
+    @backoff.on_exception(wait_gen=backoff.expo, exception=(errors.Http401RequestError,), jitter=None, max_tries=1)
+    def iter_get(
+        self, endpoint: str, params: Dict, headers: Dict, api_auth_version: Any, records_path: Sequence[str]
+    ) -> Iterator[Any]:
+        """Performs a `GET` request and yields the records of the array at
+        `records_path` in the response while the body is being received."""
+        # pylint: disable=R0913
+        headers, params = self.authenticate(headers, params, api_auth_version)
+        request = partial(
+            self.__make_request, "GET", endpoint, headers=headers, params=params, records_path=records_path
+        )
+        return self.__retry_stream(request, request())
+
+    @staticmethod
+    def __retry_stream(
+        request: Callable[[], Optional[Iterator[Any]]], records: Optional[Iterator[Any]]
+    ) -> Iterator[Any]:
+        """Yields the records of a streamed page, requesting the page again
+        when its body is interrupted.
+
+        The body is received after `__make_request` returned, out of reach of
+        its retries. The records already yielded by an interrupted attempt are
+        skipped when the page is received again.
+        """
+        yielded = 0
+        for attempt in range(1, STREAM_MAX_TRIES + 1):
+            try:
+                for index, record in enumerate(records or ()):
+                    if index >= yielded:
+                        yielded += 1
+                        yield record
+                return
+            except STREAM_ERRORS as err:
+                if attempt == STREAM_MAX_TRIES:
+                    raise
+                LOGGER.warning("Response interrupted after %s records (%s), requesting the page again", yielded, err)
+                time.sleep(2**attempt)
+                records = request()
+
     @backoff.on_exception(
         wait_gen=backoff.expo,
         exception=(
@@ -106,27 +254,48 @@ class Client:
         ),
         jitter=None,
         max_tries=5,
+        giveup=is_not_retried,
     )
     @backoff.on_exception(
-        wait_gen=backoff.expo, exception=(errors.Http429RequestError,
-                                          ConnectionResetError), jitter=None, max_time=60, max_tries=6
+        wait_gen=backoff.expo,
+        exception=(errors.Http429RequestError, ConnectionResetError, requests.Timeout),
+        jitter=None,
+        max_time=60,
+        max_tries=6,
     )
-    def __make_request(self, method: str, endpoint: str, **kwargs) -> Optional[Mapping[Any, Any]]:
+    def __make_request(
+        self,
+        method: str,
+        endpoint: str,
+        records_path: Optional[Sequence[str]] = None,
+        retry_not_found: bool = True,
+        **kwargs,
+    ) -> Optional[Mapping[Any, Any]]:
         """
         Performs HTTP Operations
         Args:
             method (str): represents the state file for the tap.
             endpoint (str): url of the resource that needs to be fetched
+            records_path (tuple): path of the records array to stream from the response
+            retry_not_found (bool): whether a `404` is retried, ids of deleted resources are not
             params (dict): A mapping for url params eg: ?name=Avery&age=3
             headers (dict): A mapping for the headers that need to be sent
             body (dict): only applicable to post request, body of the request
 
         Returns:
-            Dict,List,None: Returns a `Json Parsed` HTTP Response or None if exception
+            Dict,List,None: Returns a `Json Parsed` HTTP Response or None if exception,
+            Iterator: Returns the records of the response if `records_path` is passed
         """
-        response = self._session.request(method, endpoint, **kwargs)
+        if shutdown_requested.is_set():
+            raise ShutdownRequested("Request not sent, the sync is shutting down")
+        self.rate_limiter.acquire(endpoint)
+        response = self._session.request(
+            method, endpoint, timeout=self.timeout, stream=records_path is not None, **kwargs
+        )
+        self.rate_limiter.update(endpoint, response.status_code, response.headers)
         if self.req_counter:
-            self.req_counter.increment()
+            with self._lock:
+                self.req_counter.increment()
         if response.status_code != 200:
             try:
                 LOGGER.error("Failed due: %s", response.text)
@@ -140,6 +309,19 @@ class Client:
                 raise _
             except errors.Http404RequestError as _:
                 LOGGER.error("Resource Not Found %s", response.url or "")
+                _.retried = retry_not_found
                 raise _
             return None
-        return response.json()
+        if records_path is not None:
+            return self.__stream_records(response, records_path)
+        return jsoncodec.loads(response.content)
+
+    @staticmethod
+    def __stream_records(response: requests.Response, records_path: Sequence[str]) -> Iterator[Any]:
+        """Yields the records of a streamed response, the (gzip) body is
+        decompressed and decoded chunk by chunk."""
+        response.encoding = response.encoding or "utf-8"
+        try:
+            yield from iter_json_array(response.iter_content(STREAM_CHUNK_SIZE, decode_unicode=True), records_path)
+        finally:
+            response.close()
@@ -0,0 +1,326 @@
+"""tap-yotpo concurrency helpers module."""
+import queue
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import count, islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def ordered_map(func: Callable, items: Iterable[Tuple], max_workers: int = 1) -> Iterator[Tuple[Tuple, Any]]:
+    """Applies `func` to every argument tuple of `items` using a bounded
+    thread pool and yields `(args, result)` pairs in input order.
+
+    At most `2 * max_workers` calls are in flight at any point in time, and
+    `items` is consumed lazily from the calling thread, so reading state while
+    building the arguments is safe. With `max_workers <= 1` no threads are
+    created and the calls are performed serially.
+    """
+    if max_workers <= 1:
+        for args in items:
+            yield args, func(*args)
+        return
+
+    window = deque()
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tap-yotpo") as executor:
+        try:
+            for args in items:
+                window.append((args, executor.submit(func, *args)))
+                if len(window) >= 2 * max_workers:
+                    args, future = window.popleft()
+                    yield args, future.result()
+            while window:
+                args, future = window.popleft()
+                yield args, future.result()
+        finally:
+            # drop the pending calls if the consumer stopped early or a call failed
+            for _, future in window:
+                future.cancel()
+
+
+def unordered_map(func: Callable, items: Iterable[Tuple], max_workers: int = 1) -> Iterator[Tuple[Tuple, Any]]:
+    """Applies `func` to every argument tuple of `items` using a bounded
+    thread pool and yields `(args, result)` pairs as soon as each call
+    completes.
+
+    Like `ordered_map`, at most `2 * max_workers` calls are in flight and
+    `items` is consumed lazily from the calling thread, but a slow call does
+    not hold back the results of the calls submitted after it.
+    """
+    if max_workers <= 1:
+        for args in items:
+            yield args, func(*args)
+        return
+
+    in_flight = {}
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tap-yotpo") as executor:
+        try:
+            for args in items:
+                in_flight[executor.submit(func, *args)] = args
+                if len(in_flight) < 2 * max_workers:
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def read_ahead(items: Iterable, depth: int = 1) -> Iterator:
+    """Iterates over `items` on a background thread, up to `depth` items
+    ahead of the consumer.
+
+    Meant for page iterators, the next pages are requested while the
+    current one is processed. At most `depth` items wait in memory, plus
+    the one being produced. Errors raised while producing are raised to the
+    consumer once the items produced before them were consumed. With
+    `depth <= 0` the items are iterated in the calling thread.
+    """
+    if depth <= 0:
+        yield from items
+        return
+
+    buffer, stop = queue.Queue(maxsize=depth), threading.Event()
+
+    def put(item: Tuple) -> None:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        try:
+            for item in items:
+                put((True, item))
+                if stop.is_set():
+                    return
+            put((False, None))
+        except BaseException as err:  # pylint: disable=W0703
+            put((False, err))
+
+    threading.Thread(target=produce, name="tap-yotpo-read-ahead", daemon=True).start()
+    try:
+        while True:
+            has_item, item = buffer.get()
+            if not has_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        # the producer stops after its current item if the consumer stopped early
+        stop.set()
+
+
+def unordered_pages(
+    func: Callable, items: Iterable[Tuple], max_workers: int = 1, depth: int = 1
+) -> Iterator[Tuple[Tuple, Optional[Any]]]:
+    """Applies `func` to every argument tuple of `items`, `func` returning an
+    iterable of pages, and yields `(args, page)` pairs as soon as each page
+    is produced, then `(args, None)` once the pages of a call are exhausted.
+
+    Up to `max_workers` calls produce their pages in parallel into a queue
+    of `max_workers * depth` pages, so at most that many pages, plus the one
+    being produced by each call, are held in memory. The pages of a call are
+    yielded in order. A failing call is raised to the consumer ahead of the
+    pages still queued. With `max_workers <= 1` each call is consumed while
+    it is produced.
+    """
+    if max_workers <= 1:
+        for args in items:
+            for page in func(*args):
+                yield args, page
+            yield args, None
+        return
+
+    pages, stop, errors = queue.Queue(maxsize=max_workers * max(depth, 1)), threading.Event(), []
+
+    def put(item: Tuple) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(args: Tuple) -> None:
+        try:
+            for page in func(*args):
+                if not put((args, page)):
+                    return
+            put((args, None))
+        except BaseException as err:  # pylint: disable=W0703
+            # the other producers stop, the consumer raises the error instead of waiting for room in the queue
+            errors.append(err)
+            stop.set()
+
+    def get() -> Tuple:
+        while not errors:
+            try:
+                return pages.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise errors[0]
+
+    items, running = iter(items), 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tap-yotpo") as executor:
+        try:
+            for args in islice(items, max_workers):
+                executor.submit(produce, args)
+                running += 1
+            while running:
+                args, page = get()
+                if page is None:
+                    running -= 1
+                    for next_args in islice(items, 1):
+                        executor.submit(produce, next_args)
+                        running += 1
+                yield args, page
+        finally:
+            # the producers stop after their current page if the consumer stopped early or a call failed
+            stop.set()
+
+
+def iter_pages(
+    fetch_page: Callable[[int], Iterable],
+    max_workers: int = 1,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    stop_after: Optional[Callable[[Any], bool]] = None,
+) -> Iterator:
+    """Yields the records of consecutive pages, in page order, until the
+    first empty page or `last_page` when the page count is known.
+
+    Up to `2 * max_workers` pages are requested ahead of the page being
+    consumed, the pages probed past the first empty page are dropped. No
+    page is requested after a page whose last record matches `stop_after`,
+    eg: a record older than the bookmark of a sorted endpoint. With
+    `max_workers <= 1` each page is consumed while it is fetched, so
+    `fetch_page` may return a lazy iterator.
+    """
+    pages = count(first_page) if last_page is None else range(first_page, last_page + 1)
+    if max_workers <= 1:
+        for page in pages:
+            record_count, record = 0, None
+            for record in fetch_page(page):
+                record_count += 1
+                yield record
+            if not record_count or (stop_after and stop_after(record)):
+                return
+        return
+
+    stop = threading.Event()
+
+    def fetch(page: int) -> List:
+        records = list(fetch_page(page))
+        if records and stop_after and stop_after(records[-1]):
+            stop.set()
+        return records
+
+    def requested_pages() -> Iterator[Tuple[int]]:
+        for page in pages:
+            if stop.is_set():
+                return
+            yield (page,)
+
+    for _, records in ordered_map(fetch, requested_pages(), max_workers):
+        if not records:
+            return
+        yield from records
+        if stop_after and stop_after(records[-1]):
+            return
+
+
+class LowWatermark:
+    """Tracks the highest position below which every position is complete.
+
+    Positions may be completed in any order; the watermark only advances
+    over a contiguous run of completed positions.
+    """
+
+    def __init__(self, start: int = -1) -> None:
+        self.value = start
+        self._completed = set()
+
+    def complete(self, position: int) -> bool:
+        """Marks a position as complete, returns `True` if the watermark
+        advanced."""
+        self._completed.add(position)
+        advanced = False
+        while self.value + 1 in self._completed:
+            self.value += 1
+            self._completed.discard(self.value)
+            advanced = True
+        return advanced
+
+
+class Feed:
+    """An append-only sequence filled by a producer thread while any number
+    of consumer threads iterate over it.
+
+    Iterating yields every item from the start, blocking until more items
+    are appended or the feed is closed. A failed producer closes the feed
+    with its error, which is raised to the consumers. A `unique` feed drops
+    the items already appended.
+    """
+
+    def __init__(self, unique: bool = False) -> None:
+        self._items = []
+        self._seen = set() if unique else None
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    def append(self, item: Any) -> None:
+        """Adds an item and wakes up the waiting consumers."""
+        with self._condition:
+            if self._seen is not None:
+                if item in self._seen:
+                    return
+                self._seen.add(item)
+            self._items.append(item)
+            self._condition.notify_all()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Marks the feed complete, or failed with `error`."""
+        with self._condition:
+            self._closed, self._error = True, error
+            self._condition.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        """`True` once every item was appended."""
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> Any:
+        return self._items[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: index < len(self._items) or self._closed)
+                if self._error is not None:
+                    raise RuntimeError("The feed producer failed") from self._error
+                items = self._items[index:]
+                if not items and self._closed:
+                    return
+            index += len(items)
+            yield from items
+
+    def result(self) -> List[Any]:
+        """Waits for the feed to be closed and returns all its items."""
+        return list(self)
@@ -0,0 +1,59 @@
+"""tap-yotpo parent id index module.
+
+Child streams are fetched for every id of their parent stream. The ids read
+by a sync are kept in a sqlite database of the `parent_id_cache_dir`, so the
+next sync starts the child streams from them while the parent is read
+again, or only reads the parent records added since.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Iterable, Optional, Tuple
+
+from .parentids import ParentIds
+
+
+class ParentIdIndex:
+    """The `(yotpo_id, external_id)` pairs of a parent stream, sorted by
+    `yotpo_id`, with a `watermark` recording up to which replication value
+    the ids were read."""
+
+    def __init__(self, cache_dir: str, api_key: str, tap_stream_id: str) -> None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # one database per store, the api key itself is not written to disk
+        store = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"{tap_stream_id}-{store}.sqlite")
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS ids (yotpo_id PRIMARY KEY, external_id)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+
+    @property
+    def watermark(self) -> Optional[str]:
+        """The latest replication value the ids were read up to."""
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return row[0] if row else None
+
+    def get_ids(self) -> ParentIds:
+        """Returns every `(yotpo_id, external_id)` pair sorted by
+        `yotpo_id`."""
+        with self._lock:
+            return ParentIds(self._connection.execute("SELECT yotpo_id, external_id FROM ids ORDER BY 1"))
+
+    def update(self, ids: Iterable[Tuple], watermark: Optional[str] = None, replace: bool = False) -> None:
+        """Adds or updates `ids`, `replace` drops the ids missing from a
+        complete read of the parent."""
+        with self._lock, self._connection:
+            if replace:
+                self._connection.execute("DELETE FROM ids")
+            self._connection.executemany("INSERT OR REPLACE INTO ids VALUES (?, ?)", ids)
+            if watermark:
+                self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('watermark', ?)", (watermark,))
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,104 @@
+"""tap-yotpo json codec module.
+
+Decodes api responses and encodes singer messages with the fastest json
+library available, `orjson` or `ujson` when installed, else the standard
+library.
+"""
+import json
+from typing import Any, Union
+
+import simplejson
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec:
+    """Standard library codec, messages are encoded like
+    `singer.format_message` does."""
+
+    name = "json"
+
+    @staticmethod
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decodes a json document."""
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj: Any) -> str:
+        """Encodes an object as a single line json document."""
+        return simplejson.dumps(obj, use_decimal=True)
+
+
+class OrjsonCodec(JsonCodec):
+    """`orjson` backed codec."""
+
+    name = "orjson"
+
+    @staticmethod
+    def loads(data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    @staticmethod
+    def dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # eg: decimals or integers beyond 64 bits
+            return JsonCodec.dumps(obj)
+
+
+class UjsonCodec(JsonCodec):
+    """`ujson` backed codec."""
+
+    name = "ujson"
+
+    @staticmethod
+    def loads(data: Union[bytes, str]) -> Any:
+        return ujson.loads(data)
+
+    @staticmethod
+    def dumps(obj: Any) -> str:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+        except (TypeError, OverflowError):
+            return JsonCodec.dumps(obj)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, OrjsonCodec, UjsonCodec)}
+AVAILABLE_CODECS = [name for name, module in (("orjson", orjson), ("ujson", ujson)) if module] + ["json"]
+
+
+def get_codec(name: str = None) -> JsonCodec:
+    """Returns the codec named `name`, or the fastest available one."""
+    name = name or AVAILABLE_CODECS[0]
+    if name not in AVAILABLE_CODECS:
+        raise ValueError(f"Json backend {name} is not available, expected one of {', '.join(AVAILABLE_CODECS)}")
+    return CODECS[name]
+
+
+_codec = get_codec()
+
+
+def set_codec(name: str = None) -> None:
+    """Selects the codec used by `loads` and `dumps`, defaults to the
+    fastest available one."""
+    global _codec  # pylint: disable=W0603
+    _codec = get_codec(name)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decodes a json document with the selected codec."""
+    return _codec.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encodes an object with the selected codec."""
+    return _codec.dumps(obj)
@@ -0,0 +1,103 @@
+"""tap-yotpo incremental json decoding module."""
+import json
+import re
+from typing import Any, Iterable, Iterator, Sequence
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DECODER = json.JSONDecoder()
+
+
+class _ChunkReader:
+    """A cursor over a json document received as a sequence of text chunks.
+
+    Only the unconsumed tail of the document is buffered.
+    """
+
+    def __init__(self, chunks: Iterable[str]) -> None:
+        self._chunks = iter(chunks)
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _read_more(self) -> bool:
+        if self.pos:
+            self.buf, self.pos = self.buf[self.pos :], 0
+        for chunk in self._chunks:
+            if chunk:
+                self.buf += chunk
+                return True
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, or an empty
+        string at the end of the document."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consumes the next character, which must be `char`."""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decodes the next complete json value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._read_more():
+                    continue
+                raise
+            # a number ending with the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._read_more():
+                continue
+            self.pos = end
+            return obj
+
+
+def _walk(reader: _ChunkReader, path: Sequence[str]) -> Iterator[Any]:
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == path[0] and len(path) == 1 and reader.peek() == "[":
+            reader.pos += 1
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    char = reader.peek()
+                    reader.expect(char if char in ",]" else ",")
+                    if char == "]":
+                        break
+        elif key == path[0] and len(path) > 1 and reader.peek() == "{":
+            yield from _walk(reader, path[1:])
+        else:
+            reader.value()
+        char = reader.peek()
+        reader.expect(char if char in ",}" else ",")
+        if char == "}":
+            return
+
+
+def iter_json_array(chunks: Iterable[str], path: Sequence[str]) -> Iterator[Any]:
+    """Yields the items of the array found at `path` in a json object, eg:
+    `("response", "reviews")`, while the document is being received.
+
+    Items are decoded one at a time so memory stays proportional to a
+    single item rather than the whole document. Nothing is yielded if the
+    path is missing or does not hold an array.
+    """
+    reader = _ChunkReader(chunks)
+    yield from _walk(reader, path)
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buf, reader.pos)
@@ -0,0 +1,93 @@
+"""tap-yotpo singer message writer module.
+
+RECORD messages are encoded with the selected json codec and accumulated
+in a byte buffer flushed to stdout in large chunks. The buffer is always
+flushed before a STATE or SCHEMA message is written, so a state is never
+emitted ahead of the records it covers. Messages may be written from
+several threads, each message is written whole.
+"""
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import singer
+
+from . import jsoncodec
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class MessageWriter:
+    """Buffers encoded RECORD messages and writes them to stdout."""
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self.lock = threading.RLock()
+
+    def write_record(self, stream_name: str, record: Dict) -> None:
+        """Buffers a RECORD message, flushing once the buffer is full."""
+        message = jsoncodec.dumps({"type": "RECORD", "stream": stream_name, "record": record}).encode("utf-8")
+        with self.lock:
+            self._buffer += message
+            self._buffer += b"\n"
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered messages to stdout."""
+        with self.lock:
+            if not self._buffer:
+                return
+            stdout = sys.stdout
+            stdout.flush()
+            if hasattr(stdout, "buffer"):
+                stdout.buffer.write(self._buffer)
+                stdout.buffer.flush()
+            else:
+                stdout.write(self._buffer.decode("utf-8"))
+                stdout.flush()
+            self._buffer.clear()
+
+
+writer = MessageWriter()
+
+
+def set_buffer_size(buffer_size: Optional[int] = None) -> None:
+    """Sets the number of bytes buffered before the records are flushed, `0`
+    writes every record immediately."""
+    writer.buffer_size = DEFAULT_BUFFER_SIZE if buffer_size is None else int(buffer_size)
+
+
+def write_record(stream_name: str, record: Dict) -> None:
+    """Writes a singer RECORD message."""
+    writer.write_record(stream_name, record)
+
+
+def write_schema(stream_name: str, schema: Dict, key_properties: List, bookmark_properties: Any = None) -> None:
+    """Flushes the buffered records and writes a singer SCHEMA message."""
+    with writer.lock:
+        writer.flush()
+        singer.write_schema(stream_name, schema, key_properties, bookmark_properties)
+
+
+def write_state(value: Dict) -> None:
+    """Flushes the buffered records and writes a singer STATE message."""
+    with writer.lock:
+        writer.flush()
+        singer.write_state(value)
+
+
+def flush() -> None:
+    """Writes the buffered records."""
+    writer.flush()
+
+
+@contextmanager
+def flushing() -> Iterator[None]:
+    """Flushes the buffered records on exit, including on failures."""
+    try:
+        yield
+    finally:
+        writer.flush()
@@ -0,0 +1,89 @@
+"""tap-yotpo parent ids module.
+
+The child streams are synced for every product or order id, which adds up
+to millions of `(yotpo_id, external_id)` pairs for a large order history.
+`ParentIds` keeps them in flat arrays instead of tuples of python objects.
+"""
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+class ParentIds(Sequence):
+    """A sequence of `(yotpo_id, external_id)` pairs stored compactly.
+
+    The yotpo ids are kept in an integer array and the external ids in a
+    single utf-8 buffer indexed by their offsets. Once sorted, a yotpo id is
+    looked up by binary search.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple] = ()) -> None:
+        self._ids = array("q")
+        self._offsets = array("Q", [0])
+        self._external_ids = bytearray()
+        self._sorted = True
+        for pair in pairs:
+            self.append(pair)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[_] for _ in range(*index.indices(len(self)))]
+        yotpo_id = self._ids[index]
+        index = index % len(self._ids)
+        return yotpo_id, self._external_ids[self._offsets[index] : self._offsets[index + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        external_ids, start = self._external_ids, 0
+        for yotpo_id, end in zip(self._ids, self._offsets[1:]):
+            yield yotpo_id, external_ids[start:end].decode("utf-8")
+            start = end
+
+    def __repr__(self) -> str:
+        return f"ParentIds({len(self)} ids)"
+
+    def append(self, pair: Tuple) -> None:
+        """Adds a `(yotpo_id, external_id)` pair."""
+        yotpo_id, external_id = int(pair[0]), str(pair[1])
+        if self._ids and yotpo_id < self._ids[-1]:
+            self._sorted = False
+        self._ids.append(yotpo_id)
+        self._external_ids.extend(external_id.encode("utf-8"))
+        self._offsets.append(len(self._external_ids))
+
+    def sort(self) -> None:
+        """Sorts the pairs by yotpo id.
+
+        The positions are sorted by yotpo id into an array, then the arrays
+        are rebuilt in that order, without creating a tuple per pair.
+        """
+        if self._sorted:
+            return
+        ids, offsets, external_ids = self._ids, self._offsets, memoryview(self._external_ids)
+        order = array("q", sorted(range(len(ids)), key=ids.__getitem__))
+        self._ids = array("q", (ids[_] for _ in order))
+        self._offsets, self._external_ids = array("Q", [0]), bytearray()
+        for index in order:
+            self._external_ids += external_ids[offsets[index] : offsets[index + 1]]
+            self._offsets.append(len(self._external_ids))
+        external_ids.release()
+        self._sorted = True
+
+    def bisect(self, yotpo_id) -> Optional[int]:
+        """Returns the position of a yotpo id in the sorted pairs, or of the
+        first greater id when it is missing, `None` for an invalid id."""
+        try:
+            return bisect_left(self._ids, int(yotpo_id))
+        except (TypeError, ValueError):
+            return None
+
+    def find(self, yotpo_id) -> Optional[int]:
+        """Returns the position of a yotpo id in the sorted pairs, `None`
+        when it is missing."""
+        position = self.bisect(yotpo_id)
+        if position is not None and position < len(self._ids) and self._ids[position] == int(yotpo_id):
+            return position
+        return None
@@ -0,0 +1,154 @@
+"""tap-yotpo client side rate limiting module."""
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import urlparse
+
+from singer import get_logger
+
+LOGGER = get_logger()
+
+API_FAMILIES = ("core", "apps", "analytics", "widget")
+
+
+def get_api_family(endpoint: str) -> str:
+    """Returns the rate limit family of a Yotpo url.
+
+    The core v3, v1 apps, analytics and widget CDN apis are throttled
+    independently by Yotpo.
+    """
+    url = urlparse(endpoint)
+    if url.netloc.startswith("api-cdn."):
+        return "widget"
+    if url.path.startswith("/core/"):
+        return "core"
+    if url.path.startswith("/analytics/"):
+        return "analytics"
+    return "apps"
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket adapting its refill rate to the api feedback.
+    ~~~
+    - a `rate` of `None` does not throttle until the first 429 response
+    - a 429 response halves the rate and pauses the bucket for `Retry-After`
+    - rate limit headers set the rate to the advertised remaining budget, up to `max_rate`
+    - every successful response increases the rate additively up to `max_rate`
+    """
+
+    min_rate = 0.5
+    increase_step = 0.1
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None) -> None:
+        self.max_rate = self.rate = rate
+        self.burst = burst
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        # sliding estimate of the request rate, used when the first 429 is hit without a configured rate
+        self._window_start, self._window_count = self.updated_at, 0
+
+    @property
+    def capacity(self) -> float:
+        """Maximum number of tokens the bucket can hold."""
+        if self.burst:
+            return self.burst
+        return max(self.rate or 1, 1)
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self) -> float:
+        """Reserves a token and blocks until it is available, returns the time
+        slept.
+
+        Tokens may be borrowed, concurrent callers queue up behind each
+        other's debt instead of polling the bucket.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now - self._window_start > 60:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            wait = max(self.blocked_until - now, 0)
+            if self.rate:
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        """Slows the bucket down after a 429 response."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate:
+                self.rate = max(self.rate / 2, self.min_rate)
+            else:
+                observed = self._window_count / max(now - self._window_start, 1)
+                self.rate = max(observed / 2, self.min_rate)
+            self.tokens = min(self.tokens, 0)
+            self.blocked_until = max(self.blocked_until, now + (retry_after or 1 / self.rate))
+            LOGGER.warning("API limit exceeded, throttling requests to %.2f/s", self.rate)
+
+    def on_success(self, limit_remaining: Optional[float] = None, reset_after: Optional[float] = None) -> None:
+        """Speeds the bucket up after a successful response, or follows the
+        budget advertised by the rate limit headers."""
+        with self._lock:
+            if limit_remaining is not None and reset_after:
+                self.rate = max(limit_remaining / reset_after, self.min_rate)
+                if self.max_rate:
+                    self.rate = min(self.rate, self.max_rate)
+                if limit_remaining < 1:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + reset_after)
+            elif self.rate and (self.max_rate is None or self.rate < self.max_rate):
+                self.rate += self.increase_step
+                if self.max_rate:
+                    self.rate = min(self.rate, self.max_rate)
+
+
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        try:
+            return float(headers[name])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class RateLimiter:
+    """Holds one `TokenBucket` per api family, shared by every stream and
+    worker thread of a client.
+
+    Rates are read from the `rate_limits` config, a mapping of api family to
+    requests per second, eg: `{"core": 20, "widget": 50}`.
+    """
+
+    def __init__(self, config: Mapping[str, Any]) -> None:
+        rate_limits: Dict = config.get("rate_limits") or {}
+        self.buckets = {
+            family: TokenBucket(float(rate_limits[family]) if rate_limits.get(family) else None)
+            for family in API_FAMILIES
+        }
+
+    def acquire(self, endpoint: str) -> float:
+        """Blocks until a request to the endpoint may be sent."""
+        return self.buckets[get_api_family(endpoint)].acquire()
+
+    def update(self, endpoint: str, status_code: int, headers: Mapping[str, str]) -> None:
+        """Adapts the bucket of the endpoint to the response received."""
+        bucket = self.buckets[get_api_family(endpoint)]
+        if status_code == 429:
+            bucket.on_throttled(_header_float(headers, "Retry-After"))
+        elif status_code == 200:
+            reset_after = _header_float(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+            if reset_after and reset_after > 1e9:
+                # some apis send the reset as an epoch timestamp rather than a delay
+                reset_after = max(reset_after - time.time(), 1)
+            bucket.on_success(_header_float(headers, "X-RateLimit-Remaining", "RateLimit-Remaining"), reset_after)
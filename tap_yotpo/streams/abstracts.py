@@ -1,6 +1,17 @@
 """tap-yotpo abstract stream module."""
+import hashlib
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
 from singer import (
     Transformer,
@@ -8,10 +19,15 @@ from singer import (
     get_logger,
     metrics,
     write_bookmark,
-    write_record,
 )
 from singer.metadata import get_standard_metadata, to_list, to_map, write
-from singer.utils import strftime, strptime_to_utc
+from singer.utils import strftime
+
+from .. import jsoncodec
+from ..bookmarks import ParentBookmarks
+from ..checkpoints import ShutdownRequested, StatePolicy, shutdown_requested
+from ..messages import write_record, write_state
+from ..timestamps import strptime_to_utc
 
 LOGGER = get_logger()
 
@@ -27,6 +43,9 @@ class BaseStream(ABC):
      - `sync` and `get_records` method for performing sync
     """
 
+    # tap_stream_id of the stream whose records this stream is fetched for
+    parent_stream: Optional[str] = None
+
     @property
     @abstractmethod
     def stream(self) -> str:
@@ -102,6 +121,62 @@ class BaseStream(ABC):
 
     def __init__(self, client=None) -> None:
         self.client = client
+        self.state_writer = write_state
+        self.state_policy = None
+        self._pending_state = None
+        # set by the sync planner, the feed a parent stream publishes its ids to,
+        # the index persisting them across syncs and the feed of parent ids a child stream consumes
+        self.id_feed = None
+        self.id_index = None
+        self.parent_ids = None
+
+    def write_state(self, state: Dict) -> None:
+        """Emits the state of an ongoing sync through `self.state_writer`,
+        which merges it with the other streams when synced in parallel.
+
+        States are held back as set by `self.state_policy`. After a
+        shutdown signal or the failure of another stream, the state is
+        emitted and the stream stops.
+        """
+        if shutdown_requested.is_set():
+            self._pending_state = None
+            self.state_writer(state)
+            raise ShutdownRequested(f"{self.tap_stream_id} stopped, the sync is shutting down")
+        if self.state_policy is None:
+            try:
+                self.state_policy = StatePolicy.from_config(self.client.config)
+            except AttributeError:
+                self.state_policy = StatePolicy()
+        self._pending_state = state
+        if self.state_policy.due():
+            self.flush_state()
+
+    def flush_state(self) -> None:
+        """Emits the last state held back by the state policy, if any."""
+        if self._pending_state is not None:
+            state, self._pending_state = self._pending_state, None
+            self.state_writer(state)
+
+    def write_records(
+        self,
+        records: Generator,
+        schema: Dict,
+        stream_metadata: Dict,
+        transformer: Transformer,
+        counter: metrics.Counter,
+    ) -> Tuple[int, Any]:
+        """Writes the records of a generator as they are read, returns the
+        count of records written and the value returned by the generator."""
+        # pylint: disable=R0913
+        record_count = 0
+        while True:
+            try:
+                record = next(records)
+            except StopIteration as stop:
+                return record_count, stop.value
+            write_record(self.tap_stream_id, transformer.transform(record, schema, stream_metadata))
+            counter.increment()
+            record_count += 1
 
     @classmethod
     def get_metadata(cls, schema) -> Dict[str, str]:
@@ -208,3 +283,134 @@ class PageSizeMixin:
             return int(getattr(self, "client").config.get("page_size", self.default_page_size))
         except (AttributeError):
             return self.default_page_size
+
+
+class ReadAheadMixin:
+    """Adds a getter method to fetch the read-ahead depth for current
+    stream."""
+
+    default_read_ahead_depth = 1
+
+    @property
+    def read_ahead_depth(self) -> int:
+        """returns the `read_ahead_depth` from config if present, else returns
+        the self.default_read_ahead_depth."""
+        try:
+            return int(getattr(self, "client").config.get("read_ahead_depth", self.default_read_ahead_depth))
+        except (AttributeError, TypeError, ValueError):
+            return self.default_read_ahead_depth
+
+
+class ConcurrencyMixin:
+    """Adds a getter method to fetch the worker count for current stream."""
+
+    default_concurrency = 1
+
+    @property
+    def concurrency(self) -> int:
+        """returns the `<tap_stream_id>_concurrency` from config if present,
+        else returns the self.default_concurrency."""
+        try:
+            config_key = f"{getattr(self, 'tap_stream_id')}_concurrency"
+            return max(int(getattr(self, "client").config.get(config_key, self.default_concurrency)), 1)
+        except (AttributeError, TypeError, ValueError):
+            return self.default_concurrency
+
+    @property
+    def page_concurrency(self) -> int:
+        """returns the `<tap_stream_id>_page_concurrency` from config if
+        present, else returns 1."""
+        try:
+            config_key = f"{getattr(self, 'tap_stream_id')}_page_concurrency"
+            return max(int(getattr(self, "client").config.get(config_key, 1)), 1)
+        except (AttributeError, TypeError, ValueError):
+            return 1
+
+
+class PageFingerprint:
+    """A short hash of the raw pages read for a parent."""
+
+    def __init__(self) -> None:
+        self._digest = hashlib.sha1()
+
+    def update(self, page: List) -> None:
+        """Adds a page to the hash."""
+        self._digest.update(jsoncodec.dumps(page).encode("utf-8"))
+
+    def track(self, pages: Iterable[List]) -> Iterator[List]:
+        """Yields the pages, adding each one to the hash."""
+        for page in pages:
+            self.update(page)
+            yield page
+
+    @property
+    def value(self) -> str:
+        """The hash of the pages added so far."""
+        return self._digest.hexdigest()[:16]
+
+
+class FingerprintMixin:
+    """Adds the change detection of the streams fetched for every parent
+    id."""
+
+    @property
+    def skip_unchanged(self) -> bool:
+        """returns the `<tap_stream_id>_skip_unchanged` from config if
+        present, else returns False."""
+        try:
+            config_key = f"{getattr(self, 'tap_stream_id')}_skip_unchanged"
+            return str(getattr(self, "client").config.get(config_key, False)).lower() in ("true", "1")
+        except AttributeError:
+            return False
+
+    def fingerprint_pages(
+        self, pages: Iterable[List], last_fingerprint: Optional[str], fetch_pages: Callable[[], Iterable[List]]
+    ) -> Tuple[Iterable[List], Optional[PageFingerprint]]:
+        """Returns the pages of a parent and their fingerprint, which is
+        updated while the pages are iterated.
+
+        The pages of a parent fingerprinted by the previous sync are hashed
+        as they are read, no page is returned when they are unchanged. The
+        first page is kept while hashing, so a changed parent of a single
+        page, most of them, is returned without another request. The pages
+        of a changed parent of several pages are dropped once hashed, then
+        read again from `fetch_pages` and fingerprinted anew.
+        """
+        if not self.skip_unchanged:
+            return pages, None
+        fingerprint = PageFingerprint()
+        if not last_fingerprint:
+            return fingerprint.track(pages), fingerprint
+        first_page, page_count = None, 0
+        for page in pages:
+            fingerprint.update(page)
+            page_count += 1
+            first_page = page if page_count == 1 else None
+        if fingerprint.value == last_fingerprint:
+            return [], fingerprint
+        if page_count <= 1:
+            return [first_page] if first_page else [], fingerprint
+        fingerprint = PageFingerprint()
+        return fingerprint.track(fetch_pages()), fingerprint
+
+
+class ParentBookmarksMixin:
+    """Adds the bookmarks of the streams fetched for every parent id."""
+
+    @property
+    def compact_bookmarks(self) -> bool:
+        """returns the `compact_bookmarks` from config if present, else
+        returns False."""
+        try:
+            return str(getattr(self, "client").config.get("compact_bookmarks", False)).lower() in ("true", "1")
+        except AttributeError:
+            return False
+
+    def get_parent_bookmarks(self, state: Dict) -> ParentBookmarks:
+        """Returns the bookmarks of the parents of the stream."""
+        return ParentBookmarks(
+            state,
+            getattr(self, "tap_stream_id"),
+            getattr(self, "client").config.get(getattr(self, "config_start_key")),
+            self.compact_bookmarks,
+        )
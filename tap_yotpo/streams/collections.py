@@ -1,17 +1,25 @@
 """tap-yotpo collections stream module."""
-from typing import Dict, List
+from typing import Dict, Iterator, List
 
-from singer import Transformer, get_logger, metrics, write_record
-from singer.utils import strftime, strptime_to_utc
+from singer import Transformer, get_logger, metrics
+from singer.utils import strftime
 
+from ..concurrency import read_ahead
 from ..helpers import ApiSpec
-from .abstracts import IncrementalStream, PageSizeMixin, UrlEndpointMixin
+from ..messages import write_record
+from ..timestamps import strptime_to_utc
+from .abstracts import (
+    IncrementalStream,
+    PageSizeMixin,
+    ReadAheadMixin,
+    UrlEndpointMixin,
+)
 
 LOGGER = get_logger()
 DATE_FORMAT = "%Y-%m-%d"
 
 
-class Collections(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
+class Collections(IncrementalStream, UrlEndpointMixin, PageSizeMixin, ReadAheadMixin):
     """class for collections stream."""
 
     stream = "collections"
@@ -23,7 +31,13 @@ class Collections(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
     config_start_key = "start_date"
     url_endpoint = "https://api.yotpo.com/core/v3/stores/APP_KEY/collections"
 
-    def get_records(self) -> List:
+    def get_records(self) -> Iterator[Dict]:
+        """Yields the records while the next pages are fetched in the
+        background."""
+        for raw_records in read_ahead(self.get_pages(), self.read_ahead_depth):
+            yield from raw_records
+
+    def get_pages(self) -> Iterator[List]:
         """performs api querying and pagination of response."""
         extraction_url = self.get_url_endpoint()
         page_count, params = 1, {"limit": self.page_size}
@@ -42,7 +56,7 @@ class Collections(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
                 break
             params["page_info"] = next_param
             page_count += 1
-            yield from raw_records
+            yield raw_records
             if not next_param:
                 break
 
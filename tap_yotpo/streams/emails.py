@@ -1,18 +1,27 @@
 """tap-yotpo email stream module."""
-from datetime import datetime, timedelta
-from typing import Dict, Iterator
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from singer import Transformer, get_logger, metrics, write_record
-from singer.utils import strftime, strptime_to_utc
+from singer import Transformer, get_logger, metrics
+from singer.utils import strftime
 
+from ..concurrency import LowWatermark, iter_pages, unordered_pages
 from ..helpers import ApiSpec
-from .abstracts import IncrementalStream, PageSizeMixin, UrlEndpointMixin
+from ..messages import write_record
+from ..timestamps import strptime_to_utc
+from .abstracts import (
+    ConcurrencyMixin,
+    IncrementalStream,
+    PageSizeMixin,
+    UrlEndpointMixin,
+)
 
 LOGGER = get_logger()
 DATE_FORMAT = "%Y-%m-%d"
 
 
-class Emails(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
+class Emails(IncrementalStream, UrlEndpointMixin, PageSizeMixin, ConcurrencyMixin):
     """class for emails stream."""
 
     stream = "emails"
@@ -25,24 +34,62 @@ class Emails(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
     url_endpoint = "https://api.yotpo.com/analytics/v1/emails/APP_KEY/export/raw_data"
     default_page_size = 1000
 
-    def get_records(self, start_date: str) -> Iterator[Dict]:
-        """performs querying and pagination of email resource."""
+    @property
+    def slice_days(self) -> int:
+        """returns the `emails_slice_days` from config, `0` when the export
+        is not sliced."""
+        try:
+            return max(int(self.client.config.get("emails_slice_days") or 0), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def get_records(self, start_date: str, end_date: Optional[str] = None) -> Iterator[Dict]:
+        """performs querying and pagination of email resource.
+
+        Up to `emails_page_concurrency` pages are fetched in parallel.
+        """
         # pylint: disable=W0221
         extraction_url = self.get_url_endpoint()
         params = {
-            "page": 1,
             "per_page": self.page_size,
             "sort": "descending",
             "since": start_date,
-            "until": datetime.today().strftime(DATE_FORMAT),
+            "until": end_date or datetime.today().strftime(DATE_FORMAT),
         }
+
+        def fetch_page(page: int) -> Iterator[Dict]:
+            # records are decoded while the page is received, keeping memory flat regardless of the page size
+            page_params = {"page": page, **params}
+            return self.client.iter_get(extraction_url, page_params, {}, self.api_auth_version, ("records",))
+
+        yield from iter_pages(fetch_page, self.page_concurrency)
+
+    def get_slices(self, start_date: date) -> List[Tuple[date, date]]:
+        """Splits the days from `start_date` to today in `emails_slice_days`
+        long slices, as `(first_day, next_slice_first_day)` pairs."""
+        today, slices = datetime.today().date(), []
+        while start_date <= today:
+            slices.append((start_date, start_date + timedelta(days=self.slice_days)))
+            start_date = slices[-1][1]
+        return slices
+
+    def get_slice_pages(self, first_day: date, next_day: date) -> Iterator[List[Dict]]:
+        """Yields the records sent during a slice in pages of `page_size`
+        records.
+
+        A day is added on both sides of the requested range, so no record is
+        lost to the timezone of the api, the records outside of the slice
+        are filtered by `sync_slices`.
+        """
+        today = datetime.today().date()
+        records = self.get_records(
+            (first_day - timedelta(days=1)).strftime(DATE_FORMAT), min(next_day, today).strftime(DATE_FORMAT)
+        )
         while True:
-            response = self.client.get(extraction_url, params, {}, self.api_auth_version)
-            raw_records = response.get("records", [])
-            if not raw_records:
+            page = list(islice(records, self.page_size))
+            if not page:
                 break
-            params["page"] += 1
-            yield from raw_records
+            yield page
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
         """Sync implementation for `emails` stream."""
@@ -50,6 +97,8 @@ class Emails(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
         lookback_window = self.client.config.get("email_stats_lookback_days", 0)
         max_bookmark = bookmark_date_utc = strptime_to_utc(self.get_bookmark(state))
         bookmark_date_utc = bookmark_date_utc - timedelta(days=int(lookback_window))
+        if self.slice_days:
+            return self.sync_slices(state, schema, stream_metadata, transformer, bookmark_date_utc)
         with metrics.record_counter(self.tap_stream_id) as counter:
             for record in self.get_records(bookmark_date_utc.strftime(DATE_FORMAT)):
                 record_timestamp = strptime_to_utc(record[self.replication_key])
@@ -61,3 +110,44 @@ class Emails(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
                     break
             state = self.write_bookmark(state, value=strftime(max_bookmark))
         return state
+
+    def sync_slices(
+        self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer, bookmark_date_utc: datetime
+    ) -> Dict:
+        """Sync implementation for `emails` stream split in time slices.
+
+        Up to `emails_concurrency` slices are extracted in parallel, their
+        pages are written as they are received. The bookmark only moves over
+        slices whose every previous slice was written, so an interrupted
+        backfill resumes after the last of them.
+        """
+        # pylint: disable=R0913,R0914
+        max_bookmark = strptime_to_utc(self.get_bookmark(state))
+        slices = self.get_slices(bookmark_date_utc.date())
+        LOGGER.info("Extracting %s slices of %s days", len(slices), self.slice_days)
+        watermark, slice_bookmarks = LowWatermark(), {}
+        with metrics.record_counter(self.tap_stream_id) as counter:
+            for (index, first_day, next_day), page in unordered_pages(
+                lambda _, first_day, next_day: self.get_slice_pages(first_day, next_day),
+                ((index, *_) for index, _ in enumerate(slices)),
+                self.concurrency,
+            ):
+                slice_bookmark = slice_bookmarks.setdefault(index, max_bookmark)
+                if page is not None:
+                    for record in page:
+                        record_timestamp = strptime_to_utc(record[self.replication_key])
+                        if record_timestamp < bookmark_date_utc or not first_day <= record_timestamp.date() < next_day:
+                            continue
+                        write_record(self.tap_stream_id, transformer.transform(record, schema, stream_metadata))
+                        slice_bookmark = max(slice_bookmark, record_timestamp)
+                        counter.increment()
+                    slice_bookmarks[index] = slice_bookmark
+                    continue
+
+                if watermark.complete(index):
+                    for completed in [_ for _ in slice_bookmarks if _ <= watermark.value]:
+                        max_bookmark = max(max_bookmark, slice_bookmarks.pop(completed))
+                    LOGGER.info("Slices extracted up to %s", slices[watermark.value][1].strftime(DATE_FORMAT))
+                    state = self.write_bookmark(state, value=strftime(max_bookmark))
+                    self.write_state(state)
+        return state
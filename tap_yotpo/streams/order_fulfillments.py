@@ -1,6 +1,7 @@
 """tap-yotpo order-fulfillments stream module."""
 from datetime import datetime
-from typing import Dict, List, Tuple
+from itertools import chain, islice
+from typing import Dict, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import singer
 from singer import (
@@ -8,24 +9,44 @@ from singer import (
     clear_bookmark,
     get_bookmark,
     metrics,
-    write_record,
-    write_state,
 )
-from singer.utils import strftime, strptime_to_utc
+from singer.utils import strftime
 
+from tap_yotpo.bookmarks import ParentBookmarks
+from tap_yotpo.concurrency import LowWatermark, read_ahead, unordered_map
+from tap_yotpo.exceptions import Http404RequestError
 from tap_yotpo.helpers import ApiSpec
-
-from .abstracts import IncrementalStream, PageSizeMixin, UrlEndpointMixin
+from tap_yotpo.parentids import ParentIds
+from tap_yotpo.timestamps import strptime_to_utc
+
+from .abstracts import (
+    ConcurrencyMixin,
+    FingerprintMixin,
+    IncrementalStream,
+    PageSizeMixin,
+    ParentBookmarksMixin,
+    ReadAheadMixin,
+    UrlEndpointMixin,
+)
 from .orders import Orders
 
 LOGGER = singer.get_logger()
 
 
-class OrderFulfillments(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
+class OrderFulfillments(
+    IncrementalStream,
+    UrlEndpointMixin,
+    PageSizeMixin,
+    ReadAheadMixin,
+    ConcurrencyMixin,
+    FingerprintMixin,
+    ParentBookmarksMixin,
+):
     """class for Order fulfillments stream."""
 
     stream = "order_fulfillments"
     tap_stream_id = "order_fulfillments"
+    parent_stream = "orders"
     key_properties = ["id"]
     replication_key = "updated_at"
     valid_replication_keys = ["updated_at"]
@@ -38,30 +59,61 @@ class OrderFulfillments(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
         super().__init__(client)
         self.base_url = self.get_url_endpoint()
 
-    def get_orders(self, state: Dict) -> Tuple[List, int]:
-        """Returns index for sync resuming on interruption."""
-        shared_order_ids = Orders(self.client).prefetch_order_ids()
-        last_synced = get_bookmark(state, self.tap_stream_id, "currently_syncing", False)
-        last_sync_index = 0
-        if last_synced:
-            for pos, (order_id, _) in enumerate(shared_order_ids):
-                if order_id == last_synced:
-                    LOGGER.warning("Last Sync was interrupted after order *****%s", str(order_id)[-4:])
-                    last_sync_index = pos
-                    break
-        return shared_order_ids, last_sync_index
-
-    def get_records(self, order_id: str, bookmark_date: str) -> Tuple[List, datetime]:
-        # pylint: disable=W0221
+    def get_orders(self, state: Dict) -> Tuple[Sequence, int]:
+        """Returns index for sync resuming on interruption.
+
+        The `low_watermark` bookmark holds the position of the last order
+        below which every order was synced, along with its id to detect a
+        changed order list. States written before the watermark was
+        introduced are resumed from their `currently_syncing` order. An
+        order which no longer exists is located by binary search, the sync
+        resumes from the next order id.
+        Without an interrupted sync to resume, the orders are consumed from
+        the `orders` stream feed while it is still being filled.
+        """
+        low_watermark = get_bookmark(state, self.tap_stream_id, "low_watermark", {})
+        last_synced = low_watermark.get("order_id") or get_bookmark(
+            state, self.tap_stream_id, "currently_syncing", False
+        )
+        if self.parent_ids is not None and not self.parent_ids.closed and not last_synced:
+            return self.parent_ids, 0
+        if self.parent_ids is not None:
+            shared_order_ids = ParentIds(self.parent_ids.result())
+            shared_order_ids.sort()
+        else:
+            shared_order_ids = Orders(self.client).prefetch_ids()
+        if not last_synced:
+            return shared_order_ids, 0
+        watermark_index = low_watermark.get("index", -1)
+        in_range = 0 <= watermark_index < len(shared_order_ids)
+        if in_range and str(shared_order_ids[watermark_index][0]) == str(last_synced):
+            LOGGER.warning("Last Sync was interrupted after order *****%s", str(last_synced)[-4:])
+            return shared_order_ids, watermark_index + 1
+        # the orders are sorted by id, the ones before the interrupted order were synced
+        pos = shared_order_ids.find(last_synced)
+        if pos is not None:
+            LOGGER.warning("Last Sync was interrupted after order *****%s", str(last_synced)[-4:])
+            return shared_order_ids, pos + 1 if low_watermark else pos
+        pos = shared_order_ids.bisect(last_synced)
+        if pos is None:
+            LOGGER.warning("Unable to resume after order %s, syncing every order", last_synced)
+            return shared_order_ids, 0
+        LOGGER.warning("Order *****%s no longer exists, resuming from the next one", str(last_synced)[-4:])
+        return shared_order_ids, pos
+
+    def get_pages(self, order_id: str) -> Iterator[List]:
         """performs api querying and pagination of response."""
         extraction_url = self.base_url.replace("ORDER_ID", order_id)
-        bookmark_date = current_max = strptime_to_utc(bookmark_date)
-        filtered_records = []
         page_count, params = 1, {"limit": self.page_size}
         while True:
             LOGGER.info("Fetching Page %s", page_count)
 
-            response = self.client.get(extraction_url, params, {}, self.api_auth_version)
+            try:
+                response = self.client.get(extraction_url, params, {}, self.api_auth_version, retry_not_found=False)
+            except Http404RequestError:
+                # ids loaded from the parent id index may have been deleted since
+                LOGGER.warning("Order *****%s no longer exists", order_id[-4:])
+                break
 
             raw_records = response.get("fulfillments", [])
             pagination = response.get("pagination", {}).get("next_page_info", None)
@@ -69,12 +121,7 @@ class OrderFulfillments(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
             if not raw_records:
                 LOGGER.warning("No records found on Page %s", page_count)
                 break
-
-            for record in raw_records:
-                record_timestamp = strptime_to_utc(record[self.replication_key])
-                if record_timestamp >= bookmark_date:
-                    current_max = max(current_max, record_timestamp)
-                    filtered_records.append(record)
+            yield raw_records
 
             if not pagination:
                 break
@@ -82,36 +129,100 @@ class OrderFulfillments(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
                 params["page_info"] = pagination
             page_count += 1
 
-        return (filtered_records, current_max)
+    def get_records(
+        self, order_id: str, bookmark_date: str, last_fingerprint: Optional[str] = None
+    ) -> Generator[Dict, None, Tuple[datetime, Optional[str]]]:
+        # pylint: disable=W0221
+        """Fetches the first page of fulfillments and returns a generator of
+        the fulfillments updated since `bookmark_date`, returning the max
+        bookmark and the fingerprint of the order.
+
+        The following pages are fetched in the background, up to
+        `read_ahead_depth` pages ahead of the records consumed. With
+        `order_fulfillments_skip_unchanged`, the fulfillments matching the
+        `last_fingerprint` of the previous sync are not filtered again.
+        """
+        pages = read_ahead(self.get_pages(order_id), self.read_ahead_depth)
+        first_page = next(pages, None)
+        return self.filter_records(
+            order_id, chain([first_page] if first_page else [], pages), bookmark_date, last_fingerprint
+        )
+
+    def filter_records(
+        self, order_id: str, pages: Iterable[List], bookmark_date: str, last_fingerprint: Optional[str]
+    ) -> Generator[Dict, None, Tuple[datetime, Optional[str]]]:
+        """Yields the fulfillments updated since `bookmark_date`."""
+        bookmark_date = current_max = strptime_to_utc(bookmark_date)
+        pages, fingerprint = self.fingerprint_pages(
+            pages, last_fingerprint, lambda: read_ahead(self.get_pages(order_id), self.read_ahead_depth)
+        )
+        for raw_records in pages:
+            for record in raw_records:
+                record_timestamp = strptime_to_utc(record[self.replication_key])
+                if record_timestamp >= bookmark_date:
+                    current_max = max(current_max, record_timestamp)
+                    yield record
+
+        return current_max, fingerprint.value if fingerprint else None
+
+    def get_pending_orders(
+        self, state: Dict, orders: Sequence, start_index: int, parent_bookmarks: ParentBookmarks
+    ) -> Iterator[Tuple[int, str, str, Optional[str]]]:
+        """Yields the position, id, bookmark and fingerprint of every order
+        left to sync."""
+        for index, (order_id, _) in enumerate(islice(orders, start_index, None), start_index):
+            LOGGER.info("Sync for order *****%s (%s/%s)", str(order_id)[-4:], index + 1, len(orders))
+            # If bookmark value not present in state, refer to the start-date from config
+            yield (
+                index,
+                str(order_id),
+                parent_bookmarks.get(order_id),
+                parent_bookmarks.get_fingerprint(order_id),
+            )
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
-        """Sync implementation for `order_fulfillments` stream."""
-        # pylint: disable=R0914
+        """Sync implementation for `order_fulfillments` stream.
+
+        Up to `order_fulfillments_concurrency` orders are fetched in parallel
+        and written as they complete. The `low_watermark` bookmark only moves
+        over orders whose every predecessor was written, so an interrupted
+        sync resumes after it without losing any order.
+        """
         with metrics.Timer(self.tap_stream_id, None):
-            config_start = self.client.config[self.config_start_key]
             orders, start_index = self.get_orders(state)
+            # orders piped from the `orders` stream are not sorted, no position to resume from
+            resumable = orders is not self.parent_ids
+            parent_bookmarks = self.get_parent_bookmarks(state)
+            parent_bookmarks.start(resumed=resumable and start_index > 0, in_order=resumable)
             LOGGER.info("STARTING SYNC FROM INDEX %s", start_index)
-            order_len = len(orders)
+            watermark = LowWatermark(start_index - 1)
 
             with metrics.Counter(self.tap_stream_id) as counter:
-                # pylint: disable=W0612
-                for index, (order_id, ext_order_id) in enumerate(orders[start_index:], max(start_index, 1)):
-
-                    LOGGER.info("Sync for order *****%s (%s/%s)", str(order_id)[-4:], index, order_len)
-
-                    # If bookmark value not present in state, refer to the start-date from config
-                    bookmark_date = get_bookmark(state, self.tap_stream_id, str(order_id), config_start)
-                    records, max_bookmark = self.get_records(str(order_id), bookmark_date)
-
-                    for _ in records:
-                        write_record(self.tap_stream_id, transformer.transform(_, schema, stream_metadata))
-                        counter.increment()
+                for (index, order_id, _, _), records in unordered_map(
+                    lambda _, *args: self.get_records(*args),
+                    self.get_pending_orders(state, orders, start_index, parent_bookmarks),
+                    self.concurrency,
+                ):
+                    record_count, (max_bookmark, fingerprint) = self.write_records(
+                        records, schema, stream_metadata, transformer, counter
+                    )
 
                     # bookmark value won't be updated for those order_id which are not having any latest
                     # fulfillments records.
-                    if records:
-                        state = self.write_bookmark(state, str(order_id), strftime(max_bookmark))
-                    state = self.write_bookmark(state, "currently_syncing", str(order_id))
-                    write_state(state)
+                    if record_count:
+                        parent_bookmarks.update(order_id, strftime(max_bookmark))
+                    if fingerprint:
+                        parent_bookmarks.set_fingerprint(order_id, fingerprint)
+                    if watermark.complete(index):
+                        if resumable:
+                            parent_bookmarks.advance(orders[watermark.value][0])
+                            state = self.write_bookmark(
+                                state,
+                                "low_watermark",
+                                {"index": watermark.value, "order_id": str(orders[watermark.value][0])},
+                            )
+                        self.write_state(parent_bookmarks.write())
+            parent_bookmarks.complete(orders)
+            state = clear_bookmark(parent_bookmarks.write(), self.tap_stream_id, "low_watermark")
             state = clear_bookmark(state, self.tap_stream_id, "currently_syncing")
         return state
@@ -1,16 +1,32 @@
 """tap-yotpo Orders stream module."""
-from typing import Dict, Iterator, List
-
-from singer import Transformer, get_logger, metrics, write_record
-from singer.utils import strftime, strptime_to_utc
-
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from singer import (
+    Transformer,
+    clear_bookmark,
+    get_bookmark,
+    get_logger,
+    metrics,
+)
+from singer.utils import strftime
+
+from ..concurrency import LowWatermark, read_ahead, unordered_pages
 from ..helpers import ApiSpec
-from .abstracts import IncrementalStream, UrlEndpointMixin
+from ..messages import write_record
+from ..parentids import ParentIds
+from ..timestamps import strptime_to_utc
+from .abstracts import (
+    ConcurrencyMixin,
+    IncrementalStream,
+    ReadAheadMixin,
+    UrlEndpointMixin,
+)
 
 LOGGER = get_logger()
 
 
-class Orders(IncrementalStream, UrlEndpointMixin):
+class Orders(IncrementalStream, UrlEndpointMixin, ReadAheadMixin, ConcurrencyMixin):
     """class for Orders stream."""
 
     stream = "orders"
@@ -22,7 +38,22 @@ class Orders(IncrementalStream, UrlEndpointMixin):
     config_start_key = "start_date"
     url_endpoint = "https://api.yotpo.com/core/v3/stores/APP_KEY/orders"
 
-    def get_records(self, start_date: str = None) -> Iterator[Dict]:
+    @property
+    def window_days(self) -> int:
+        """returns the `orders_window_days` from config, `0` when the orders
+        are not extracted in date windows."""
+        try:
+            return max(int(self.client.config.get("orders_window_days") or 0), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def get_records(self, start_date: datetime = None, end_date: datetime = None) -> Iterator[Dict]:
+        """Yields the records while the next pages are fetched in the
+        background."""
+        for raw_records in read_ahead(self.get_pages(start_date, end_date), self.read_ahead_depth):
+            yield from raw_records
+
+    def get_pages(self, start_date: datetime = None, end_date: datetime = None) -> Iterator[List]:
         """performs api querying and pagination of response."""
         extraction_url = self.get_url_endpoint()
         page_count, params = 1, {}
@@ -30,6 +61,8 @@ class Orders(IncrementalStream, UrlEndpointMixin):
             params["order_date_min"] = strftime(start_date)
         else:
             LOGGER.info("Executing Order Stream without date filter %s", params)
+        if end_date:
+            params["order_date_max"] = strftime(end_date)
 
         while True:
             LOGGER.info("Fetching Page %s", page_count)
@@ -46,51 +79,176 @@ class Orders(IncrementalStream, UrlEndpointMixin):
                 break
             params["page_info"] = next_param
 
-            # if `order_date_min` param is passed with page_info, it will break the api resulting in 400 error
+            # if `order_date_min`/`order_date_max` params are passed with page_info, it will break the api resulting
+            # in 400 error
             # the date is stored in the page_info cursor which sends the filtered records without requiring
             # the filter param for further pages
-            if "order_date_min" in params:
-                del params["order_date_min"]
+            params.pop("order_date_min", None)
+            params.pop("order_date_max", None)
             page_count += 1
-            yield from raw_records
+            yield raw_records
             if not next_param:
                 break
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
-        """Sync implementation for `orders` stream."""
+        """Sync implementation for `orders` stream.
+
+        When the order ids are required by `order_fulfillments`, every order
+        is read once and filtered here instead of reading the new orders and
+        then all the orders again, or only the orders placed since the
+        indexed ones with an id index. The ids are published to
+        `self.id_feed` as they are read.
+        """
+        if self.window_days and self.id_feed is None:
+            return self.sync_windows(state, schema, stream_metadata, transformer)
         current_bookmark_date = self.get_bookmark(state)
         max_bookmark = current_bookmark_date_utc = strptime_to_utc(current_bookmark_date)
+        shared_order_ids, latest_order_date = ParentIds(), None
+        start_date = current_bookmark_date_utc
+        if self.id_feed is not None:
+            index_watermark = self.get_index_watermark()
+            start_date = min(start_date, index_watermark) if index_watermark else None
 
         with metrics.record_counter(self.tap_stream_id) as counter:
-            for record in self.get_records(current_bookmark_date_utc):
+            for record in self.get_records(start_date):
+                if self.id_feed is not None:
+                    self.collect_order_id(record, shared_order_ids)
                 try:
                     record_timestamp = strptime_to_utc(record[self.replication_key])
                 except IndexError as _:
                     LOGGER.error("Unable to process Record, Exception occurred: %s for stream %s", _, self.__class__)
                     continue
+                latest_order_date = max(latest_order_date or record_timestamp, record_timestamp)
                 if record_timestamp >= current_bookmark_date_utc:
                     write_record(self.tap_stream_id, transformer.transform(record, schema, stream_metadata))
                     max_bookmark = max(max_bookmark, record_timestamp)
                     counter.increment()
-                else:
+                elif self.id_feed is None:
                     LOGGER.warning("Skipping Older Record, order-id - ******%s", str(record["yotpo_id"])[-4:])
 
             state = self.write_bookmark(state, value=strftime(max_bookmark))
+        if self.id_feed is not None:
+            self.client.shared_order_ids = self.update_id_index(shared_order_ids, latest_order_date)
         return state
 
-    def prefetch_order_ids(self) -> List:
+    def get_index_watermark(self) -> Optional[datetime]:
+        """Returns the order date up to which the orders of `self.id_index`
+        were read, `None` without index."""
+        watermark = self.id_index.watermark if self.id_index is not None else None
+        return strptime_to_utc(watermark) if watermark else None
+
+    def update_id_index(self, order_ids: ParentIds, latest_order_date: Optional[datetime]) -> ParentIds:
+        """Adds the order ids read to `self.id_index`, returns every known
+        order id sorted."""
+        if self.id_index is None:
+            order_ids.sort()
+            return order_ids
+        self.id_index.update(order_ids, strftime(latest_order_date) if latest_order_date else None)
+        return self.id_index.get_ids()
+
+    def get_windows(self, start_date: datetime) -> List[Tuple[datetime, Optional[datetime]]]:
+        """Splits the dates from `start_date` to now in `orders_window_days`
+        long windows, as `(order_date_min, order_date_max)` pairs.
+
+        Windows are aligned on the config start date so they stay the same
+        across syncs, the last window has no upper bound.
+        """
+        anchor = strptime_to_utc(self.client.config[self.config_start_key])
+        window_size = timedelta(days=self.window_days)
+        window_start = anchor + ((start_date - anchor) // window_size) * window_size
+        windows, now = [], datetime.now(timezone.utc)
+        while window_start + window_size <= now:
+            windows.append((window_start, window_start + window_size))
+            window_start += window_size
+        windows.append((window_start, None))
+        return windows
+
+    def sync_windows(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
+        """Sync implementation for `orders` stream split in date windows.
+
+        Up to `orders_concurrency` windows are extracted in parallel, their
+        pages are written as they are received. Each completed window is
+        checkpointed in the `completed_windows` bookmark along with its
+        latest order date, the `order_date` bookmark only moves over windows
+        whose every previous window was written. An
+        interrupted sync skips the windows already completed.
+        """
+        bookmark_date_utc = max_bookmark = strptime_to_utc(self.get_bookmark(state))
+        completed = dict(get_bookmark(state, self.tap_stream_id, "completed_windows") or {})
+        windows = self.get_windows(bookmark_date_utc)
+        watermark, window_bookmarks = LowWatermark(), {}
+        for index, (window_start, _) in enumerate(windows):
+            if strftime(window_start) in completed:
+                window_bookmarks[index] = strptime_to_utc(completed[strftime(window_start)])
+                watermark.complete(index)
+        pending = [(index, *window) for index, window in enumerate(windows) if strftime(window[0]) not in completed]
+        LOGGER.info("Extracting %s of %s windows of %s days", len(pending), len(windows), self.window_days)
+
+        with metrics.record_counter(self.tap_stream_id) as counter:
+            for (index, window_start, window_end), page in unordered_pages(
+                lambda _, window_start, window_end: self.get_pages(max(window_start, bookmark_date_utc), window_end),
+                pending,
+                self.concurrency,
+                self.read_ahead_depth,
+            ):
+                if page is not None:
+                    window_bookmark = window_bookmarks.setdefault(index, bookmark_date_utc)
+                    for record in page:
+                        record_timestamp = strptime_to_utc(record[self.replication_key])
+                        if record_timestamp < max(window_start, bookmark_date_utc) or (
+                            window_end and record_timestamp >= window_end
+                        ):
+                            continue
+                        write_record(self.tap_stream_id, transformer.transform(record, schema, stream_metadata))
+                        window_bookmark = max(window_bookmark, record_timestamp)
+                        counter.increment()
+                    window_bookmarks[index] = window_bookmark
+                    continue
+
+                window_bookmark = window_bookmarks.setdefault(index, bookmark_date_utc)
+                if window_end:
+                    # the last window keeps receiving orders, it is extracted again by an interrupted sync
+                    completed[strftime(window_start)] = strftime(window_bookmark)
+                watermark.complete(index)
+
+                for contiguous in [_ for _ in window_bookmarks if _ <= watermark.value]:
+                    max_bookmark = max(max_bookmark, window_bookmarks.pop(contiguous))
+                    completed.pop(strftime(windows[contiguous][0]), None)
+                state = self.write_bookmark(state, value=strftime(max_bookmark))
+                state = self.write_bookmark(state, "completed_windows", completed)
+                self.write_state(state)
+
+        # windows completed by an interrupted sync may follow the last extracted one
+        max_bookmark = max([max_bookmark] + list(window_bookmarks.values()))
+        state = self.write_bookmark(state, value=strftime(max_bookmark))
+        return clear_bookmark(state, self.tap_stream_id, "completed_windows")
+
+    def collect_order_id(self, record: Dict, order_ids: ParentIds) -> None:
+        """Adds the `(yotpo_id, external_id)` of an order to `order_ids` and
+        publishes it to `self.id_feed`."""
+        try:
+            order_id = (record["yotpo_id"], record["external_id"])
+        except KeyError:
+            LOGGER.warning("Unable to find external order ID or Yotpo ID")
+            return
+        order_ids.append(order_id)
+        if self.id_feed is not None:
+            self.id_feed.append(order_id)
+
+    def prefetch_ids(self) -> ParentIds:
         """Helper method implemented for other streams to load all order_ids.
 
         eg: orders are required to fetch `fullfilment` stream
         """
-        order_ids = getattr(self.client, "shared_order_ids", [])
+        order_ids = getattr(self.client, "shared_order_ids", None)
         if not order_ids:
-            LOGGER.info("Fetching all Order_ids")
-            for record in self.get_records():
-                try:
-                    order_ids.append((record["yotpo_id"], record["external_id"]))
-                except KeyError:
-                    LOGGER.warning("Unable to find external order ID or Yotpo ID")
-
-            self.client.shared_order_ids = sorted(order_ids, key=lambda _: _[0])
+            order_ids = ParentIds()
+            index_watermark, latest_order_date = self.get_index_watermark(), None
+            LOGGER.info("Fetching all Order_ids" if not index_watermark else "Fetching the Order_ids of new orders")
+            for record in self.get_records(index_watermark):
+                self.collect_order_id(record, order_ids)
+                record_timestamp = strptime_to_utc(record[self.replication_key])
+                latest_order_date = max(latest_order_date or record_timestamp, record_timestamp)
+
+            self.client.shared_order_ids = order_ids = self.update_id_index(order_ids, latest_order_date)
         return order_ids
@@ -1,7 +1,19 @@
 """tap-yotpo product-reviews stream module."""
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
 from math import ceil
-from typing import Dict, List, Tuple
+from typing import (
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 from singer import (
     Transformer,
@@ -9,24 +21,38 @@ from singer import (
     get_bookmark,
     get_logger,
     metrics,
-    write_record,
-    write_state,
 )
-from singer.utils import strftime, strptime_to_utc
+from singer.utils import now, strftime
 
+from tap_yotpo.bookmarks import ParentBookmarks
+from tap_yotpo.concurrency import iter_pages, ordered_map
+from tap_yotpo.exceptions import Http404RequestError
 from tap_yotpo.helpers import ApiSpec, skip_product
+from tap_yotpo.parentids import ParentIds
+from tap_yotpo.timestamps import strptime_to_utc
 
-from .abstracts import IncrementalStream, PageSizeMixin, UrlEndpointMixin
+from .abstracts import (
+    ConcurrencyMixin,
+    IncrementalStream,
+    PageSizeMixin,
+    ParentBookmarksMixin,
+    UrlEndpointMixin,
+)
 from .products import Products
+from .reviews import Reviews
 
 LOGGER = get_logger()
 
+# reviews updated right before the previous change detection may not have been listed yet
+CHANGES_LOOKBACK = timedelta(hours=1)
 
-class ProductReviews(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
+
+class ProductReviews(IncrementalStream, UrlEndpointMixin, PageSizeMixin, ConcurrencyMixin, ParentBookmarksMixin):
     """class for product_reviews stream."""
 
     stream = "product_reviews"
     tap_stream_id = "product_reviews"
+    parent_stream = "products"
     key_properties = ["id"]
     replication_key = "created_at"
     valid_replication_keys = ["created_at"]
@@ -40,103 +66,213 @@ class ProductReviews(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
         super().__init__(client)
         self.base_url = self.get_url_endpoint()
 
-    def get_products(self, state: Dict) -> Tuple[List, int]:
-        """Returns index for sync resuming on interuption."""
-        shared_product_ids = Products(self.client).prefetch_product_ids()
+    def get_products(self, state: Dict) -> Tuple[Sequence, int]:
+        """Returns the products to sync and the index for sync resuming on
+        interruption.
+
+        Without an interrupted sync to resume, the products are consumed
+        from the `products` stream feed while it is still being filled. The
+        interrupted product is located by binary search, the sync resumes
+        from the next product id when it no longer exists.
+        """
         last_synced = get_bookmark(state, self.tap_stream_id, "currently_syncing", False)
-        last_sync_index = 0
-        if last_synced:
-            for pos, (prod_id, _) in enumerate(shared_product_ids):
-                if prod_id == last_synced:
-                    LOGGER.warning("Last Sync was interrupted after product *****%s", str(prod_id)[-4:])
-                    last_sync_index = pos
-                    break
+        if self.parent_ids is not None and not self.parent_ids.closed and not last_synced:
+            return self.parent_ids, 0
+        if self.parent_ids is not None:
+            shared_product_ids = ParentIds(self.parent_ids.result())
+            shared_product_ids.sort()
+        else:
+            shared_product_ids = Products(self.client).prefetch_ids()
+        if not last_synced:
+            return shared_product_ids, 0
+        # the products are sorted by id, the ones before the interrupted product were synced
+        last_sync_index = shared_product_ids.bisect(last_synced)
+        if last_sync_index is None:
+            LOGGER.warning("Unable to resume after product %s, syncing every product", last_synced)
+            return shared_product_ids, 0
+        if shared_product_ids.find(last_synced) is None:
+            LOGGER.warning("Product *****%s no longer exists, resuming from the next one", str(last_synced)[-4:])
+        else:
+            LOGGER.warning("Last Sync was interrupted after product *****%s", str(last_synced)[-4:])
         return shared_product_ids, last_sync_index
 
+    @property
+    def skip_unchanged_products(self) -> bool:
+        """returns the `product_reviews_skip_unchanged` from config if
+        present, else returns False."""
+        return str(self.client.config.get("product_reviews_skip_unchanged", False)).lower() in ("true", "1")
+
+    def get_changed_products(self, state: Dict) -> Optional[Set[str]]:
+        """Returns the external ids of the products whose reviews were
+        updated since the previous complete sync.
+
+        The store wide `reviews` endpoint lists the updated reviews with the
+        external id of their product as `sku`, a few pages instead of one
+        request per product. Returns `None` when every product has to be
+        fetched, `product_reviews_skip_unchanged` is off or no sync completed
+        yet.
+        """
+        checked_at = get_bookmark(state, self.tap_stream_id, "changes_checked_at")
+        if not self.skip_unchanged_products or not checked_at:
+            return None
+        since = strftime(strptime_to_utc(checked_at) - CHANGES_LOOKBACK)
+        changed_products = {str(record.get("sku")) for record in Reviews(self.client).get_records(since)}
+        LOGGER.info("%s products with reviews updated since %s", len(changed_products), since)
+        return changed_products
+
     def get_records(
         self, product__external_id: str, product__yotpo_id: str, bookmark_date: str
-    ) -> Tuple[List, datetime]:
+    ) -> Generator[Dict, None, Tuple[datetime, int]]:
         # pylint: disable=W0221
-        """performs api querying and pagination of response."""
+        """Fetches the first page of reviews and returns a generator of the
+        reviews created since `bookmark_date`, returning the max bookmark
+        and the review count of the product.
+
+        The page count is known from the first page, the following pages
+        are fetched while the records are consumed, by up to
+        `product_reviews_page_concurrency` workers, until a page ends with a
+        review older than `bookmark_date`.
+        """
         params = {"page": 1, "per_page": self.page_size, "sort": "date", "direction": "desc"}
         extraction_url = self.base_url.replace("PRODUCT_ID", product__external_id)
         config_start = self.client.config.get(self.config_start_key, False)
-        bookmark_date = current_max = max(strptime_to_utc(bookmark_date), strptime_to_utc(config_start))
-        next_page, prod_map = True, None
-        filtered_records = []
-        while next_page:
-            response = self.client.get(extraction_url, params, {}, self.api_auth_version)
-            response = response.get("response", {})
-            raw_records = response.get("reviews", [])
-            if not prod_map:
-                prod_map = {px["id"]: px["name"] for px in response.get("products", [])}
-            current_page = response.get("pagination", {}).get("page", None)
-            total_records = response.get("pagination", {}).get("total", None)
-            max_pages = max(ceil(total_records / params["per_page"]), 1)
-
-            if not raw_records:
+        bookmark_date = max(strptime_to_utc(bookmark_date), strptime_to_utc(config_start))
+
+        try:
+            first_page = self.client.get(extraction_url, params, {}, self.api_auth_version, retry_not_found=False)
+        except Http404RequestError:
+            # ids loaded from the parent id index may have been deleted since
+            LOGGER.warning("Product *****%s no longer exists", product__yotpo_id[-4:])
+            return self.filter_records([], product__external_id, product__yotpo_id, bookmark_date, {}, 0)
+        first_page = first_page.get("response", {})
+        prod_map = {px["id"]: px["name"] for px in first_page.get("products", [])}
+        total_records = first_page.get("pagination", {}).get("total", None)
+        max_pages = max(ceil(total_records / params["per_page"]), 1)
+
+        def fetch_page(page: int) -> List[Dict]:
+            LOGGER.info("Page: (%s/%s)", page, max_pages)
+            if page == 1:
+                return first_page.get("reviews", [])
+            response = self.client.get(extraction_url, {**params, "page": page}, {}, self.api_auth_version)
+            return response.get("response", {}).get("reviews", [])
+
+        def older_than_bookmark(record: Dict) -> bool:
+            return strptime_to_utc(record[self.replication_key]) < bookmark_date
+
+        # the reviews are sorted newest first, the pages after a review older than the bookmark are not requested
+        if first_page.get("reviews") and older_than_bookmark(first_page["reviews"][-1]):
+            max_pages = 1
+        records = iter_pages(fetch_page, self.page_concurrency, last_page=max_pages, stop_after=older_than_bookmark)
+        return self.filter_records(
+            records, product__external_id, product__yotpo_id, bookmark_date, prod_map, total_records
+        )
+
+    def filter_records(
+        self,
+        records: Iterable[Dict],
+        product__external_id: str,
+        product__yotpo_id: str,
+        bookmark_date: datetime,
+        prod_map: Dict,
+        total_records: int,
+    ) -> Generator[Dict, None, Tuple[datetime, int]]:
+        """Yields the reviews created since `bookmark_date`."""
+        # pylint: disable=R0913
+        current_max = bookmark_date
+        for record in records:
+            record_timestamp = strptime_to_utc(record[self.replication_key])
+            if record_timestamp < bookmark_date:
+                # reviews are sorted by date, the remaining pages are older
                 break
+            try:
+                current_max = max(current_max, record_timestamp)
+                record["domain_key"] = product__external_id
+                record["product_yotpo_id"] = product__yotpo_id
+                record["name"] = prod_map[record["product_id"]]
+            except KeyError as _:
+                LOGGER.fatal("Error: %s for prod_id %s ", str(_), product__yotpo_id[-4:])
+                continue
+            yield record
 
-            LOGGER.info("Page: (%s/%s)", current_page, max(ceil(total_records / 150), 1))
+        return current_max, total_records
 
-            for record in raw_records:
-                record_timestamp = strptime_to_utc(record[self.replication_key])
-                if record_timestamp >= bookmark_date:
-                    try:
-                        current_max = max(current_max, record_timestamp)
-                        record["domain_key"] = product__external_id
-                        record["product_yotpo_id"] = product__yotpo_id
-                        record["name"] = prod_map[record["product_id"]]
-                        filtered_records.append(record)
-                    except KeyError as _:
-                        LOGGER.fatal("Error: %s for prod_id %s ", str(_), product__yotpo_id[-4:])
-                else:
-                    next_page = False
+    def get_pending_products(
+        self,
+        products: Sequence,
+        start_index: int,
+        parent_bookmarks: ParentBookmarks,
+        changed_products: Optional[Set[str]] = None,
+        skipped_counter: Optional[metrics.Counter] = None,
+    ) -> Iterator[Tuple[str, str, str]]:
+        """Yields the `get_records` arguments for every product left to sync.
 
-            params["page"] += 1
+        Products synced before which are not in `changed_products` have no
+        new review, they are skipped and counted by `skipped_counter`.
+        """
+        # pylint: disable=R0913
+        for index, (product__yotpo_id, product__external_id) in enumerate(
+            islice(products, start_index, None), max(start_index, 1)
+        ):
+            product__yotpo_id = str(product__yotpo_id)
+            if skip_product(product__external_id):
+                LOGGER.info(
+                    "Skipping Prod *****%s (%s/%s),Can't fetch reviews for products with special characters %s",
+                    product__yotpo_id[-4:],
+                    index,
+                    len(products),
+                    product__external_id,
+                )
+                continue
 
-            if params["page"] > max_pages:
-                next_page = False
+            if changed_products is not None and parent_bookmarks.known(product__yotpo_id):
+                if str(product__external_id) not in changed_products:
+                    skipped_counter.increment()
+                    continue
 
-        return (filtered_records, current_max, total_records)
+            LOGGER.info("Sync for prod *****%s (%s/%s)", product__yotpo_id[-4:], index, len(products))
+            yield product__external_id, product__yotpo_id, parent_bookmarks.get(product__yotpo_id)
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
-        """Sync implementation for `product_reviews` stream."""
-        # pylint: disable=R0914
+        """Sync implementation for `product_reviews` stream.
+
+        Products are fetched by a pool of `product_reviews_concurrency`
+        workers, the records and bookmarks are written in product order so
+        `currently_syncing` always points to a fully synced product. With
+        `product_reviews_skip_unchanged`, the products without updated
+        reviews are skipped and reported by the `api_calls_avoided` metric.
+        """
         with metrics.Timer(self.tap_stream_id, None):
+            checked_at = now()
+            changed_products = self.get_changed_products(state)
             products, start_index = self.get_products(state)
+            # products piped from the `products` stream are not sorted, no position to resume from
+            resumable = products is not self.parent_ids
+            parent_bookmarks = self.get_parent_bookmarks(state)
+            parent_bookmarks.start(resumed=resumable and start_index > 0, in_order=resumable)
             LOGGER.info("STARTING SYNC FROM INDEX %s", start_index)
-            prod_len = len(products)
 
-            with metrics.Counter(self.tap_stream_id) as counter:
-                for index, (product__yotpo_id, product__external_id) in enumerate(
-                    products[start_index:], max(start_index, 1)
+            with metrics.Counter(self.tap_stream_id) as counter, metrics.Counter(
+                "api_calls_avoided", {"endpoint": self.tap_stream_id}, log_interval=sys.maxsize
+            ) as skipped_counter:
+                pending_products = self.get_pending_products(
+                    products, start_index, parent_bookmarks, changed_products, skipped_counter
+                )
+                for (_, product__yotpo_id, _), records in ordered_map(
+                    self.get_records, pending_products, self.concurrency
                 ):
-                    product__yotpo_id = str(product__yotpo_id)
-                    if skip_product(product__external_id):
-                        LOGGER.info(
-                            "Skipping Prod *****%s (%s/%s),Can't fetch reviews for products with special characters %s",
-                            product__yotpo_id[-4:],
-                            index,
-                            prod_len,
-                            product__external_id,
-                        )
-                        continue
-
-                    LOGGER.info("Sync for prod *****%s (%s/%s)", product__yotpo_id[-4:], index, prod_len)
-
-                    bookmark_date = self.get_bookmark(state, product__yotpo_id)
-                    records, max_bookmark, total_records = self.get_records(
-                        product__external_id, product__yotpo_id, bookmark_date
+                    record_count, (max_bookmark, total_records) = self.write_records(
+                        records, schema, stream_metadata, transformer, counter
                     )
-
-                    for _ in records:
-                        write_record(self.tap_stream_id, transformer.transform(_, schema, stream_metadata))
-                        counter.increment()
-
-                    LOGGER.info("Total records : %s, Total records synced : %s", total_records, len(records))
-                    state = self.write_bookmark(state, product__yotpo_id, strftime(max_bookmark))
-                    state = self.write_bookmark(state, "currently_syncing", product__yotpo_id)
-                    write_state(state)
-            state = clear_bookmark(state, self.tap_stream_id, "currently_syncing")
+                    LOGGER.info("Total records : %s, Total records synced : %s", total_records, record_count)
+                    parent_bookmarks.update(product__yotpo_id, strftime(max_bookmark))
+                    if resumable:
+                        parent_bookmarks.advance(product__yotpo_id)
+                        state = self.write_bookmark(state, "currently_syncing", product__yotpo_id)
+                    self.write_state(parent_bookmarks.write())
+                if changed_products is not None:
+                    LOGGER.info("Skipped %s products without updated reviews", skipped_counter.value)
+            parent_bookmarks.complete(products)
+            state = clear_bookmark(parent_bookmarks.write(), self.tap_stream_id, "currently_syncing")
+            if self.skip_unchanged_products:
+                state = self.write_bookmark(state, "changes_checked_at", strftime(checked_at))
         return state
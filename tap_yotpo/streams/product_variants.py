@@ -1,6 +1,7 @@
 """tap-yotpo product-variants stream module."""
 from datetime import datetime
-from typing import Dict, List, Tuple
+from itertools import chain, islice
+from typing import Dict, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from singer import (
     Transformer,
@@ -8,24 +9,44 @@ from singer import (
     get_bookmark,
     get_logger,
     metrics,
-    write_record,
-    write_state,
 )
-from singer.utils import strftime, strptime_to_utc
+from singer.utils import strftime
 
+from tap_yotpo.bookmarks import ParentBookmarks
+from tap_yotpo.concurrency import ordered_map, read_ahead
+from tap_yotpo.exceptions import Http404RequestError
 from tap_yotpo.helpers import ApiSpec
-
-from .abstracts import IncrementalStream, PageSizeMixin, UrlEndpointMixin
+from tap_yotpo.parentids import ParentIds
+from tap_yotpo.timestamps import strptime_to_utc
+
+from .abstracts import (
+    ConcurrencyMixin,
+    FingerprintMixin,
+    IncrementalStream,
+    PageSizeMixin,
+    ParentBookmarksMixin,
+    ReadAheadMixin,
+    UrlEndpointMixin,
+)
 from .products import Products
 
 LOGGER = get_logger()
 
 
-class ProductVariants(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
+class ProductVariants(
+    IncrementalStream,
+    UrlEndpointMixin,
+    PageSizeMixin,
+    ReadAheadMixin,
+    ConcurrencyMixin,
+    FingerprintMixin,
+    ParentBookmarksMixin,
+):
     """class for product_variants stream."""
 
     stream = "product_variants"
     tap_stream_id = "product_variants"
+    parent_stream = "products"
     key_properties = ["yotpo_id"]
     replication_key = "updated_at"
     valid_replication_keys = ["updated_at"]
@@ -38,35 +59,49 @@ class ProductVariants(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
         super().__init__(client)
         self.base_url = self.get_url_endpoint()
 
-    def get_products(self, state: Dict) -> Tuple[List, int]:
-        """Returns index for sync resuming on interruption."""
-        shared_product_ids = Products(self.client).prefetch_product_ids()
+    def get_products(self, state: Dict) -> Tuple[Sequence, int]:
+        """Returns the products to sync and the index for sync resuming on
+        interruption.
+
+        Without an interrupted sync to resume, the products are consumed
+        from the `products` stream feed while it is still being filled. The
+        interrupted product is located by binary search, the sync resumes
+        from the next product id when it no longer exists.
+        """
         last_synced = get_bookmark(state, self.tap_stream_id, "currently_syncing", False)
-        last_sync_index = 0
-        if last_synced:
-            for pos, (prod_id, _) in enumerate(shared_product_ids):
-                if prod_id == last_synced:
-                    LOGGER.warning("Last Sync was interrupted after product *****%s", str(prod_id)[-4:])
-                    last_sync_index = pos
-                    break
+        if self.parent_ids is not None and not self.parent_ids.closed and not last_synced:
+            return self.parent_ids, 0
+        if self.parent_ids is not None:
+            shared_product_ids = ParentIds(self.parent_ids.result())
+            shared_product_ids.sort()
+        else:
+            shared_product_ids = Products(self.client).prefetch_ids()
+        if not last_synced:
+            return shared_product_ids, 0
+        # the products are sorted by id, the ones before the interrupted product were synced
+        last_sync_index = shared_product_ids.bisect(last_synced)
+        if last_sync_index is None:
+            LOGGER.warning("Unable to resume after product %s, syncing every product", last_synced)
+            return shared_product_ids, 0
+        if shared_product_ids.find(last_synced) is None:
+            LOGGER.warning("Product *****%s no longer exists, resuming from the next one", str(last_synced)[-4:])
+        else:
+            LOGGER.warning("Last Sync was interrupted after product *****%s", str(last_synced)[-4:])
         return shared_product_ids, last_sync_index
 
-    def get_records(self, prod_id: str, bookmark_date: str) -> Tuple[List, datetime]:
-        # pylint: disable=W0221
-        """Performs api querying and pagination of response.
-
-        Retrieves all record and filters within the code, as the API
-        endpoint does not have any query parameter to fetch the latest
-        record from specific date.
-        """
+    def get_pages(self, prod_id: str) -> Iterator[List]:
+        """Performs api querying and pagination of response."""
         extraction_url = self.base_url.replace("PRODUCT_ID", prod_id)
-        bookmark_date = current_max = strptime_to_utc(bookmark_date)
-        filtered_records = []
         page_count, params = 1, {"limit": self.page_size}
         while True:
             LOGGER.info("Calling Page %s", page_count)
 
-            response = self.client.get(extraction_url, params, {}, self.api_auth_version)
+            try:
+                response = self.client.get(extraction_url, params, {}, self.api_auth_version, retry_not_found=False)
+            except Http404RequestError:
+                # ids loaded from the parent id index may have been deleted since
+                LOGGER.warning("Product *****%s no longer exists", prod_id[-4:])
+                break
 
             # response = response.get("response", {})
             raw_records = response.get("variants", [])
@@ -74,7 +109,45 @@ class ProductVariants(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
 
             if not raw_records:
                 break
+            yield raw_records
 
+            if not pagination:
+                break
+            else:
+                params["page_info"] = pagination
+            page_count += 1
+
+    def get_records(
+        self, prod_id: str, bookmark_date: str, last_fingerprint: Optional[str] = None
+    ) -> Generator[Dict, None, Tuple[datetime, Optional[str]]]:
+        # pylint: disable=W0221
+        """Fetches the first page of variants and returns a generator of the
+        variants updated since `bookmark_date`, returning the max bookmark
+        and the fingerprint of the product.
+
+        Retrieves all record and filters within the code, as the API
+        endpoint does not have any query parameter to fetch the latest
+        record from specific date. The following pages are fetched in the
+        background, up to `read_ahead_depth` pages ahead of the records
+        consumed. With `product_variants_skip_unchanged`, the variants
+        matching the `last_fingerprint` of the previous sync are not
+        filtered again.
+        """
+        pages = read_ahead(self.get_pages(prod_id), self.read_ahead_depth)
+        first_page = next(pages, None)
+        return self.filter_records(
+            prod_id, chain([first_page] if first_page else [], pages), bookmark_date, last_fingerprint
+        )
+
+    def filter_records(
+        self, prod_id: str, pages: Iterable[List], bookmark_date: str, last_fingerprint: Optional[str]
+    ) -> Generator[Dict, None, Tuple[datetime, Optional[str]]]:
+        """Yields the variants updated since `bookmark_date`."""
+        bookmark_date = current_max = strptime_to_utc(bookmark_date)
+        pages, fingerprint = self.fingerprint_pages(
+            pages, last_fingerprint, lambda: read_ahead(self.get_pages(prod_id), self.read_ahead_depth)
+        )
+        for raw_records in pages:
             for record in raw_records:
                 record_timestamp = strptime_to_utc(record[self.replication_key])
                 if record_timestamp >= bookmark_date:
@@ -83,43 +156,58 @@ class ProductVariants(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
                     # Adding yotpo_product_id in record
                     if "yotpo_product_id" not in record.keys():
                         record["yotpo_product_id"] = int(prod_id)
-                    filtered_records.append(record)
-
-            if not pagination:
-                break
-            else:
-                params["page_info"] = pagination
-            page_count += 1
-
-        return (filtered_records, current_max)
+                    yield record
+
+        return current_max, fingerprint.value if fingerprint else None
+
+    def get_pending_products(
+        self, state: Dict, products: Sequence, start_index: int, parent_bookmarks: ParentBookmarks
+    ) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Yields the `get_records` arguments for every product left to
+        sync."""
+        # pylint: disable=W0612
+        for index, (prod_id, ext_prod_id) in enumerate(islice(products, start_index, None), max(start_index, 1)):
+            LOGGER.info("Sync for prod *****%s (%s/%s)", str(prod_id)[-4:], index, len(products))
+            yield (
+                str(prod_id),
+                parent_bookmarks.get(prod_id),
+                parent_bookmarks.get_fingerprint(prod_id),
+            )
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
-        """Sync implementation for `product_variants` stream."""
-        # pylint: disable=R0914
+        """Sync implementation for `product_variants` stream.
+
+        Variants of up to `product_variants_concurrency` products are
+        fetched in parallel and written back in product order.
+        """
         with metrics.Timer(self.tap_stream_id, None):
-            config_start = self.client.config[self.config_start_key]
             products, start_index = self.get_products(state)
+            # products piped from the `products` stream are not sorted, no position to resume from
+            resumable = products is not self.parent_ids
+            parent_bookmarks = self.get_parent_bookmarks(state)
+            parent_bookmarks.start(resumed=resumable and start_index > 0, in_order=resumable)
             LOGGER.info("STARTING SYNC FROM INDEX %s", start_index)
-            prod_len = len(products)
 
             with metrics.Counter(self.tap_stream_id) as counter:
-                # pylint: disable=W0612
-                for index, (prod_id, ext_prod_id) in enumerate(products[start_index:], max(start_index, 1)):
-
-                    LOGGER.info("Sync for prod *****%s (%s/%s)", str(prod_id)[-4:], index, prod_len)
-
-                    bookmark_date = get_bookmark(state, self.tap_stream_id, str(prod_id), config_start)
-                    records, max_bookmark = self.get_records(str(prod_id), bookmark_date)
-
-                    for _ in records:
-                        write_record(self.tap_stream_id, transformer.transform(_, schema, stream_metadata))
-                        counter.increment()
+                for (prod_id, _, _), records in ordered_map(
+                    self.get_records,
+                    self.get_pending_products(state, products, start_index, parent_bookmarks),
+                    self.concurrency,
+                ):
+                    record_count, (max_bookmark, fingerprint) = self.write_records(
+                        records, schema, stream_metadata, transformer, counter
+                    )
 
                     # bookmark value won't be updated for those prod_id which are not having any latest
                     # variants records.
-                    if records:
-                        state = self.write_bookmark(state, str(prod_id), strftime(max_bookmark))
-                    state = self.write_bookmark(state, "currently_syncing", str(prod_id))
-                    write_state(state)
-            state = clear_bookmark(state, self.tap_stream_id, "currently_syncing")
+                    if record_count:
+                        parent_bookmarks.update(prod_id, strftime(max_bookmark))
+                    if fingerprint:
+                        parent_bookmarks.set_fingerprint(prod_id, fingerprint)
+                    if resumable:
+                        parent_bookmarks.advance(prod_id)
+                        state = self.write_bookmark(state, "currently_syncing", prod_id)
+                    self.write_state(parent_bookmarks.write())
+            parent_bookmarks.complete(products)
+            state = clear_bookmark(parent_bookmarks.write(), self.tap_stream_id, "currently_syncing")
         return state
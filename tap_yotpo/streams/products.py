@@ -1,15 +1,23 @@
 """tap-yotpo products stream module."""
 from typing import Dict, Iterator, List
 
-from singer import Transformer, get_logger, metrics, write_record
+from singer import Transformer, get_logger, metrics
 
+from ..concurrency import read_ahead
 from ..helpers import ApiSpec
-from .abstracts import FullTableStream, PageSizeMixin, UrlEndpointMixin
+from ..messages import write_record
+from ..parentids import ParentIds
+from .abstracts import (
+    FullTableStream,
+    PageSizeMixin,
+    ReadAheadMixin,
+    UrlEndpointMixin,
+)
 
 LOGGER = get_logger()
 
 
-class Products(FullTableStream, UrlEndpointMixin, PageSizeMixin):
+class Products(FullTableStream, UrlEndpointMixin, PageSizeMixin, ReadAheadMixin):
     """class for products stream."""
 
     stream = "products"
@@ -19,6 +27,12 @@ class Products(FullTableStream, UrlEndpointMixin, PageSizeMixin):
     url_endpoint = "https://api.yotpo.com/core/v3/stores/APP_KEY/products"
 
     def get_records(self) -> Iterator[Dict]:
+        """Yields the records while the next pages are fetched in the
+        background."""
+        for raw_records in read_ahead(self.get_pages(), self.read_ahead_depth):
+            yield from raw_records
+
+    def get_pages(self) -> Iterator[List]:
         """performs api querying and pagination of response."""
         extraction_url = self.get_url_endpoint()
         headers, params, call_next = {}, {"limit": self.page_size}, True
@@ -35,11 +49,15 @@ class Products(FullTableStream, UrlEndpointMixin, PageSizeMixin):
                 call_next = False
 
             params["page_info"] = next_param
-            yield from raw_records
+            yield raw_records
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer: Transformer) -> Dict:
-        """Sync implementation for `products` stream."""
-        shared_product_ids = []
+        """Sync implementation for `products` stream.
+
+        The product ids are published to `self.id_feed` as they are read,
+        so the child streams start while products are still paginated.
+        """
+        shared_product_ids = ParentIds()
         with metrics.record_counter(self.tap_stream_id) as counter:
             for record in self.get_records():
 
@@ -47,28 +65,45 @@ class Products(FullTableStream, UrlEndpointMixin, PageSizeMixin):
                 write_record(self.tap_stream_id, transformed_record)
                 counter.increment()
 
-                try:
-                    # creating a cache of product_ids for `product_reviews` stream
-                    shared_product_ids.append((record["yotpo_id"], record["external_id"]))
-                except KeyError:
-                    LOGGER.warning("Unable to find external product ID")
+                # creating a cache of product_ids for `product_reviews` stream
+                self.collect_product_id(record, shared_product_ids)
 
-        self.client.shared_product_ids = sorted(shared_product_ids, key=lambda _: _[0])
+        shared_product_ids.sort()
+        self.client.shared_product_ids = shared_product_ids
+        self.update_id_index(self.client.shared_product_ids)
         return state
 
-    def prefetch_product_ids(self) -> List:
+    def update_id_index(self, product_ids: ParentIds) -> None:
+        """Replaces the ids of `self.id_index` with the ones read by a
+        complete read of the products."""
+        if self.id_index is not None:
+            self.id_index.update(product_ids, replace=True)
+
+    def collect_product_id(self, record: Dict, product_ids: ParentIds) -> None:
+        """Adds the `(yotpo_id, external_id)` of a product to `product_ids`
+        and publishes it to `self.id_feed`."""
+        try:
+            product_id = (record["yotpo_id"], record["external_id"])
+        except KeyError:
+            LOGGER.warning("Unable to find external product ID")
+            return
+        product_ids.append(product_id)
+        if self.id_feed is not None:
+            self.id_feed.append(product_id)
+
+    def prefetch_ids(self) -> ParentIds:
         """Helper method implemented for other streams to load all product_ids.
 
         eg: products are required to fetch `product_reviews`
         """
-        prod_ids = getattr(self.client, "shared_product_ids", [])
+        prod_ids = getattr(self.client, "shared_product_ids", None)
         if not prod_ids:
             LOGGER.info("Fetching all product records")
+            prod_ids = ParentIds()
             for record in self.get_records():
-                try:
-                    prod_ids.append((record["yotpo_id"], record["external_id"]))
-                except KeyError:
-                    LOGGER.warning("Unable to find external product ID")
+                self.collect_product_id(record, prod_ids)
 
-            self.client.shared_product_ids = sorted(prod_ids, key=lambda _: _[0])
+            prod_ids.sort()
+            self.client.shared_product_ids = prod_ids
+            self.update_id_index(prod_ids)
         return prod_ids
@@ -2,16 +2,24 @@
 from datetime import timedelta
 from typing import Dict, Iterator, Optional
 
-from singer import get_logger, metrics, write_record
-from singer.utils import strftime, strptime_to_utc
+from singer import get_logger, metrics
+from singer.utils import strftime
 
+from ..concurrency import iter_pages
 from ..helpers import ApiSpec
-from .abstracts import IncrementalStream, PageSizeMixin, UrlEndpointMixin
+from ..messages import write_record
+from ..timestamps import strptime_to_utc
+from .abstracts import (
+    ConcurrencyMixin,
+    IncrementalStream,
+    PageSizeMixin,
+    UrlEndpointMixin,
+)
 
 LOGGER = get_logger()
 
 
-class Reviews(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
+class Reviews(IncrementalStream, UrlEndpointMixin, PageSizeMixin, ConcurrencyMixin):
     """class for `reviews` stream."""
 
     stream = "reviews"
@@ -24,18 +32,20 @@ class Reviews(IncrementalStream, UrlEndpointMixin, PageSizeMixin):
     url_endpoint = "https://api.yotpo.com/v1/apps/APP_KEY/reviews"
 
     def get_records(self, bookmark_date: Optional[str]) -> Iterator[Dict]:
-        """performs querying and pagination of reviews resource."""
+        """performs querying and pagination of reviews resource.
+
+        Up to `reviews_page_concurrency` pages are fetched in parallel.
+        """
         # pylint: disable=W0221
         extraction_url = self.get_url_endpoint()
-        params = {"page": 1, "count": self.page_size, "since_updated_at": bookmark_date, "deleted": "true"}
-        while True:
-            response = self.client.get(extraction_url, params, {}, self.api_auth_version)
-            raw_records = response.get(self.stream, [])
-            if not raw_records:
-                break
-            LOGGER.info("Fetched Reviews from page: %s", params["page"])
-            params["page"] += 1
-            yield from raw_records
+        params = {"count": self.page_size, "since_updated_at": bookmark_date, "deleted": "true"}
+
+        def fetch_page(page: int) -> Iterator[Dict]:
+            LOGGER.info("Fetching Reviews from page: %s", page)
+            page_params = {"page": page, **params}
+            return self.client.iter_get(extraction_url, page_params, {}, self.api_auth_version, (self.stream,))
+
+        yield from iter_pages(fetch_page, self.page_concurrency)
 
     def sync(self, state: Dict, schema: Dict, stream_metadata: Dict, transformer) -> Dict:
         """Sync implementation for `reviews` stream."""
@@ -3,13 +3,19 @@ from typing import Dict, Iterator
 
 from singer import get_logger
 
+from ..concurrency import iter_pages
 from ..helpers import ApiSpec
-from .abstracts import FullTableStream, PageSizeMixin, UrlEndpointMixin
+from .abstracts import (
+    ConcurrencyMixin,
+    FullTableStream,
+    PageSizeMixin,
+    UrlEndpointMixin,
+)
 
 LOGGER = get_logger()
 
 
-class Unsubscribers(FullTableStream, UrlEndpointMixin, PageSizeMixin):
+class Unsubscribers(FullTableStream, UrlEndpointMixin, PageSizeMixin, ConcurrencyMixin):
     """class for unsubscribers stream."""
 
     stream = "unsubscribers"
@@ -20,12 +26,17 @@ class Unsubscribers(FullTableStream, UrlEndpointMixin, PageSizeMixin):
     default_page_size = 5000
 
     def get_records(self) -> Iterator[Dict]:
+        """performs querying and pagination of unsubscribers resource.
+
+        Up to `unsubscribers_page_concurrency` pages are fetched in
+        parallel.
+        """
         extraction_url = self.get_url_endpoint()
-        params = {"page": 1, "count": self.page_size}
-        while True:
-            response = self.client.get(extraction_url, params, {}, self.api_auth_version)
-            raw_records = response.get("response", {}).get(self.stream, [])
-            if not raw_records:
-                break
-            params["page"] += 1
-            yield from raw_records
+        records_path = ("response", self.stream)
+
+        def fetch_page(page: int) -> Iterator[Dict]:
+            # records are decoded while the page is received, keeping memory flat regardless of the page size
+            params = {"page": page, "count": self.page_size}
+            return self.client.iter_get(extraction_url, params, {}, self.api_auth_version, records_path)
+
+        yield from iter_pages(fetch_page, self.page_concurrency)
@@ -1,29 +1,225 @@
 """tap-yotpo sync."""
-from typing import Dict
+import threading
+from copy import deepcopy
+from typing import Dict, List, Optional, Tuple
 
 import singer
 
-from . import streams
+from . import jsoncodec, messages, streams
+from .checkpoints import ShutdownRequested, shutdown_requested, stopping_on_signals
+from .concurrency import Feed, unordered_map
+from .idindex import ParentIdIndex
+from .transform import CompiledTransformer
 
 LOGGER = singer.get_logger()
 
 
-def sync(client, catalog: singer.Catalog, state: Dict):
-    """performs sync for selected streams."""
-    with singer.Transformer() as transformer:
-        for stream in catalog.get_selected_streams(state):
-            tap_stream_id = stream.tap_stream_id
-            stream_schema = stream.schema.to_dict()
-            stream_metadata = singer.metadata.to_map(stream.metadata)
-            stream_obj = streams.STREAMS[tap_stream_id](client)
-            LOGGER.info("Starting sync for stream: %s", tap_stream_id)
-            state = singer.set_currently_syncing(state, tap_stream_id)
-            singer.write_state(state)
-            singer.write_schema(tap_stream_id, stream_schema, stream_obj.key_properties, stream.replication_key)
+class SharedState:
+    """The tap state shared by the streams synced in parallel.
+
+    Every stream syncs with its own copy of the state, the bookmarks of a
+    stream are merged into the shared state each time it emits a state.
+    `currently_syncing` points to the first stream, in sync order, still in
+    progress so an interrupted sync resumes from it. The errors of the
+    failed streams are kept in `errors`, in the order they failed.
+    """
+
+    def __init__(self, state: Dict, sync_order: List[str]) -> None:
+        self.value = state
+        self.sync_order = sync_order
+        self.errors = []
+        self._in_progress = set()
+        self._lock = threading.Lock()
+
+    def start(self, tap_stream_id: str) -> Dict:
+        """Marks a stream in progress, returns the state copy it syncs
+        with."""
+        with self._lock:
+            self._in_progress.add(tap_stream_id)
+            self._set_currently_syncing()
+            messages.write_state(self.value)
+            return deepcopy(self.value)
+
+    def write(self, tap_stream_id: str, stream_state: Dict) -> None:
+        """Merges the bookmarks of a stream and writes the shared state."""
+        with self._lock:
+            self._merge(tap_stream_id, stream_state)
+            messages.write_state(self.value)
+
+    def finish(self, tap_stream_id: str, stream_state: Dict) -> None:
+        """Merges the final bookmarks of a stream and marks it done."""
+        with self._lock:
+            self._merge(tap_stream_id, stream_state)
+            self._in_progress.discard(tap_stream_id)
+            self._set_currently_syncing()
+            messages.write_state(self.value)
+
+    def fail(self, error: BaseException) -> None:
+        """Records the error of a failed stream."""
+        with self._lock:
+            self.errors.append(error)
+
+    def _merge(self, tap_stream_id: str, stream_state: Dict) -> None:
+        bookmark = stream_state.get("bookmarks", {}).get(tap_stream_id)
+        if bookmark is None:
+            self.value.get("bookmarks", {}).pop(tap_stream_id, None)
+        else:
+            # streams keep mutating their bookmarks and the nested dicts of parent ids, copied one level deeper
+            self.value.setdefault("bookmarks", {})[tap_stream_id] = {
+                key: dict(value) if isinstance(value, dict) else value for key, value in bookmark.items()
+            }
+
+    def _set_currently_syncing(self) -> None:
+        in_progress = [_ for _ in self.sync_order if _ in self._in_progress]
+        self.value = singer.set_currently_syncing(self.value, in_progress[0] if in_progress else None)
+
+
+def plan_streams(catalog: singer.Catalog, state: Dict) -> List[Tuple[str, Optional[singer.CatalogEntry]]]:
+    """Returns the streams to sync in dependency order, as `(tap_stream_id,
+    catalog_entry)` pairs.
+
+    A parent stream is planned right before its first child stream, so the
+    child streams consume the ids the parent reads instead of reading the
+    parent again. A parent stream which is not selected is planned without
+    a catalog entry, its ids are read without writing any record. Streams
+    otherwise keep their catalog order, which starts with the
+    `currently_syncing` stream.
+    """
+    selected = {stream.tap_stream_id: stream for stream in catalog.get_selected_streams(state)}
+    plan, planned = [], set()
+    for tap_stream_id in selected:
+        for node in (streams.STREAMS[tap_stream_id].parent_stream, tap_stream_id):
+            if node and node not in planned:
+                planned.add(node)
+                plan.append((node, selected.get(node)))
+    return plan
+
+
+def sync_stream(stream_obj, stream: singer.CatalogEntry, shared_state: SharedState) -> None:
+    """performs sync for a single stream."""
+    tap_stream_id = stream.tap_stream_id
+    stream_schema = stream.schema.to_dict()
+    stream_metadata = singer.metadata.to_map(stream.metadata)
+    stream_obj.state_writer = lambda stream_state: shared_state.write(tap_stream_id, stream_state)
+    LOGGER.info("Starting sync for stream: %s", tap_stream_id)
+    state = shared_state.start(tap_stream_id)
+    messages.write_schema(tap_stream_id, stream_schema, stream_obj.key_properties, stream.replication_key)
+    # transformers collect the removed fields of a sync, one per thread
+    with CompiledTransformer() as transformer:
+        try:
             state = stream_obj.sync(
                 state=state, schema=stream_schema, stream_metadata=stream_metadata, transformer=transformer
             )
-            singer.write_state(state)
+        except BaseException:
+            # the state held back by the state policy only covers records already written
+            stream_obj.flush_state()
+            raise
+    shared_state.finish(tap_stream_id, state)
+
+
+def get_id_feeds(client, plan: List[Tuple[str, Optional[singer.CatalogEntry]]]) -> Tuple[Dict, Dict]:
+    """Returns the id feeds of the planned parent streams and their id
+    indexes.
+
+    With a `parent_id_cache_dir`, the feeds start with the ids indexed by
+    the previous syncs, the ids read again by the parent are not repeated.
+    """
+    parent_streams = {streams.STREAMS[tap_stream_id].parent_stream for tap_stream_id, _ in plan} - {None}
+    cache_dir = client.config.get("parent_id_cache_dir")
+    if not cache_dir:
+        return {parent: Feed() for parent in parent_streams}, {}
+
+    feeds, indexes = {}, {}
+    for parent in parent_streams:
+        indexes[parent] = ParentIdIndex(cache_dir, client.config["api_key"], parent)
+        feeds[parent] = Feed(unique=True)
+        for parent_id in indexes[parent].get_ids():
+            feeds[parent].append(parent_id)
+        LOGGER.info("Loaded %s %s ids from %s", len(feeds[parent]), parent, indexes[parent].path)
+    return feeds, indexes
+
+
+def sync_node(
+    client,
+    tap_stream_id: str,
+    stream: Optional[singer.CatalogEntry],
+    shared_state: SharedState,
+    feeds: Dict,
+    indexes: Dict,
+) -> None:
+    """Syncs a planned stream, publishing its ids to the feed of its child
+    streams."""
+    # pylint: disable=R0913
+    stream_obj = streams.STREAMS[tap_stream_id](client)
+    stream_obj.id_feed = feeds.get(tap_stream_id)
+    stream_obj.id_index = indexes.get(tap_stream_id)
+    stream_obj.parent_ids = feeds.get(stream_obj.parent_stream)
+    try:
+        if stream is None:
+            LOGGER.info("Fetching %s ids for the child streams", tap_stream_id)
+            stream_obj.prefetch_ids()
+        else:
+            sync_stream(stream_obj, stream, shared_state)
+    except BaseException as err:
+        # recorded before the other streams are stopped, so the error which stopped them comes first
+        shared_state.fail(err)
+        # the streams running in parallel stop at their next checkpoint instead of running to completion
+        shutdown_requested.set()
+        if stream_obj.id_feed is not None:
+            stream_obj.id_feed.close(err)
+        raise
+    if stream_obj.id_feed is not None:
+        stream_obj.id_feed.close()
+
+
+def is_shutdown(error: BaseException) -> bool:
+    """Returns whether a stream was stopped by a shutdown, the child
+    streams raise the error of their parent feed."""
+    return isinstance(error, ShutdownRequested) or isinstance(error.__cause__, ShutdownRequested)
+
+
+def sync(client, catalog: singer.Catalog, state: Dict):
+    """performs sync for selected streams.
+
+    Up to `max_parallel_streams` streams are synced in parallel, their
+    messages are written through the shared message writer. Planned streams
+    are started in order, so a child stream always starts after its parent
+    and consumes the parent ids as they are read. On SIGTERM or SIGINT, or
+    once a stream failed, the streams write their state and stop at their
+    next checkpoint. A sync stopped by a signal returns once the state is
+    written, with `currently_syncing` left on the first interrupted stream,
+    a failed sync raises the error of the first failed stream.
+    """
+    jsoncodec.set_codec(client.config.get("json_backend"))
+    messages.set_buffer_size(client.config.get("output_buffer_size"))
+    max_parallel_streams = max(int(client.config.get("max_parallel_streams", 1)), 1)
+    plan = plan_streams(catalog, state)
+    feeds, indexes = get_id_feeds(client, plan)
+    shared_state = SharedState(state, [tap_stream_id for tap_stream_id, stream in plan if stream is not None])
+    LOGGER.info("Sync plan: %s, %s in parallel", [_ for _, __ in plan], min(max_parallel_streams, len(plan)))
+
+    try:
+        with stopping_on_signals(), messages.flushing():
+            for _ in unordered_map(
+                lambda tap_stream_id, stream: sync_node(client, tap_stream_id, stream, shared_state, feeds, indexes),
+                plan,
+                min(max_parallel_streams, len(plan)),
+            ):
+                pass
+    except BaseException as err:
+        error = next((_ for _ in shared_state.errors if not is_shutdown(_)), err)
+        if not is_shutdown(error):
+            if error is err:
+                raise
+            raise error from None
+        LOGGER.warning(
+            "Sync stopped by a shutdown signal, resuming from %s", shared_state.value.get("currently_syncing")
+        )
+        messages.write_state(shared_state.value)
+        return
+    finally:
+        for index in indexes.values():
+            index.close()
 
-    state = singer.set_currently_syncing(state, None)
-    singer.write_state(state)
+    state = singer.set_currently_syncing(shared_state.value, None)
+    messages.write_state(state)
@@ -0,0 +1,48 @@
+"""tap-yotpo timestamp parsing module.
+
+Every record of an incremental stream has its replication key parsed to be
+compared with the bookmark. `singer.utils.strptime_to_utc` guesses the
+format with `dateutil`, while the api returns ISO-8601 timestamps. They are
+parsed with `ciso8601` when installed, else `datetime.fromisoformat`, and
+other formats fall back to `dateutil`.
+"""
+from datetime import datetime
+from typing import Any, Optional
+
+import pytz
+from singer import utils
+
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+
+def _fromisoformat(value: str) -> datetime:
+    if value[-1:] in ("Z", "z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+_parse = ciso8601.parse_datetime if ciso8601 else _fromisoformat
+
+
+def parse_iso8601(value: Any) -> Optional[datetime]:
+    """Returns an ISO-8601 timestamp as a UTC datetime, a timestamp without
+    offset being UTC, `None` when `value` is not an ISO-8601 string."""
+    try:
+        parsed = _parse(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=pytz.UTC)
+    return parsed.astimezone(pytz.UTC)
+
+
+def strptime_to_utc(value: str) -> datetime:
+    """Same as `singer.utils.strptime_to_utc`, with a fast path for the
+    ISO-8601 timestamps."""
+    parsed = parse_iso8601(value)
+    if parsed is None:
+        return utils.strptime_to_utc(value)
+    return parsed
@@ -0,0 +1,297 @@
+"""tap-yotpo compiled schema transform module.
+
+`singer.Transformer` walks the json schema and looks up the field
+selection metadata for every record. `CompiledTransformer` does that walk
+once per stream, turning the schema and its metadata into a tree of
+specialised closures reused for every record, with the same output as
+`singer.Transformer`.
+"""
+import decimal
+import re
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import singer
+from singer.transform import (
+    NO_INTEGER_DATETIME_PARSING,
+    breadcrumb_path,
+    string_to_datetime,
+)
+from singer.utils import strftime
+
+from .timestamps import parse_iso8601
+
+Converter = Callable[[Any], Tuple[bool, Any]]
+FAILED = (False, None)
+
+
+def _identity(data: Any) -> Tuple[bool, Any]:
+    return True, data
+
+
+def _to_null(data: Any) -> Tuple[bool, Any]:
+    if data is None or data == "":
+        return True, None
+    return FAILED
+
+
+def _to_datetime(data: Any) -> Tuple[bool, Any]:
+    if data is None or data == "":
+        return FAILED
+    parsed = parse_iso8601(data)
+    if parsed is not None:
+        return True, strftime(parsed)
+    data = string_to_datetime(data)
+    if data is None:
+        return FAILED
+    return True, data
+
+
+def _to_decimal(data: Any) -> Tuple[bool, Any]:
+    # pylint: disable=W0702
+    if isinstance(data, (str, float, int)):
+        try:
+            return True, str(decimal.Decimal(str(data)))
+        except:  # noqa: E722
+            return FAILED
+    if isinstance(data, decimal.Decimal):
+        try:
+            return True, "NaN" if data.is_snan() else str(data)
+        except:  # noqa: E722
+            return FAILED
+    return FAILED
+
+
+def _to_string(data: Any) -> Tuple[bool, Any]:
+    # pylint: disable=W0702
+    if type(data) is str:  # pylint: disable=C0123
+        return True, data
+    if data is None:
+        return FAILED
+    try:
+        return True, str(data)
+    except:  # noqa: E722
+        return FAILED
+
+
+def _to_integer(data: Any) -> Tuple[bool, Any]:
+    # pylint: disable=W0702
+    if type(data) is int:  # pylint: disable=C0123
+        return True, data
+    if isinstance(data, str):
+        data = data.replace(",", "")
+    try:
+        return True, int(data)
+    except:  # noqa: E722
+        return FAILED
+
+
+def _to_number(data: Any) -> Tuple[bool, Any]:
+    # pylint: disable=W0702
+    if isinstance(data, str):
+        data = data.replace(",", "")
+    try:
+        return True, float(data)
+    except:  # noqa: E722
+        return FAILED
+
+
+def _to_boolean(data: Any) -> Tuple[bool, Any]:
+    # pylint: disable=W0702
+    if isinstance(data, str) and data.lower() == "false":
+        return True, False
+    try:
+        return True, bool(data)
+    except:  # noqa: E722
+        return FAILED
+
+
+SCALAR_CONVERTERS = {
+    "null": _to_null,
+    "string": _to_string,
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+}
+
+
+class CompiledTransformer(singer.Transformer):
+    """
+    A drop-in replacement of `singer.Transformer` compiling each stream
+    schema and metadata on first use.
+    ~~~
+    Records the compiled transform rejects are handed to
+    `singer.Transformer.transform`, so schema mismatches raise the exact
+    same errors.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._compiled = {}
+
+    def transform(self, data: Any, schema: Dict, metadata: Optional[Dict] = None) -> Any:
+        key = (id(schema), id(metadata))
+        try:
+            compiled = self._compiled[key][0]
+        except KeyError:
+            compiled = self.compile(schema, metadata)
+            # schema and metadata are kept referenced so their ids are not reused
+            self._compiled[key] = (compiled, schema, metadata)
+
+        success, transformed_data = compiled(data)
+        if not success:
+            return super().transform(data, schema, metadata)
+        return transformed_data
+
+    def compile(self, schema: Dict, metadata: Optional[Dict] = None) -> Converter:
+        """Returns a function transforming a record for the schema and field
+        selection metadata, returning a `(success, record)` tuple."""
+        if self.pre_hook or self.integer_datetime_fmt != NO_INTEGER_DATETIME_PARSING:
+            return lambda data: FAILED
+        record_filter = self._compile_filter(metadata or {}, ()) if metadata else None
+        converter = self._compile_schema(schema, ())
+
+        if record_filter is None:
+            return converter
+        return lambda data: converter(record_filter(data))
+
+    def _compile_filter(self, metadata: Dict, parent: Tuple) -> Optional[Callable[[Any], Any]]:
+        """Mirrors `singer.Transformer.filter_data_by_metadata` without
+        modifying the record."""
+        dropped, nested = {}, {}
+        for breadcrumb in metadata:
+            if len(breadcrumb) <= len(parent) + 1 or breadcrumb[: len(parent) + 1] != parent + ("properties",):
+                continue
+            field_name = breadcrumb[len(parent) + 1]
+            field_breadcrumb = parent + ("properties", field_name)
+            if field_name in dropped or field_name in nested:
+                continue
+            field_metadata = metadata.get(field_breadcrumb, {})
+            if field_metadata.get("inclusion") == "automatic":
+                continue
+            if field_metadata.get("selected") is False or field_metadata.get("inclusion") == "unsupported":
+                dropped[field_name] = breadcrumb_path(field_breadcrumb)
+                continue
+            field_filter = self._compile_filter(metadata, field_breadcrumb)
+            if field_filter:
+                nested[field_name] = field_filter
+        items_filter = None
+        if any(breadcrumb[: len(parent) + 1] == parent + ("items",) for breadcrumb in metadata):
+            items_filter = self._compile_filter(metadata, parent + ("items",))
+        if not dropped and not nested and not items_filter:
+            return None
+
+        def record_filter(data):
+            if isinstance(data, dict):
+                if dropped and not dropped.keys().isdisjoint(data):
+                    self.filtered.update(path for key, path in dropped.items() if key in data)
+                    data = {key: value for key, value in data.items() if key not in dropped}
+                if nested and not nested.keys().isdisjoint(data):
+                    data = {key: nested[key](value) if key in nested else value for key, value in data.items()}
+            if isinstance(data, list) and items_filter:
+                data = [items_filter(row) for row in data]
+            return data
+
+        return record_filter
+
+    def _compile_schema(self, schema: Dict, path: Tuple) -> Converter:
+        """Mirrors `singer.Transformer.transform_recur`."""
+        if "anyOf" in schema:
+            return self._first_match([self._compile_schema(subschema, path) for subschema in schema["anyOf"]])
+
+        if "type" not in schema:
+            return _identity
+
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        # null is always attempted last
+        types = [typ for typ in types if typ != "null"] + (["null"] if "null" in types else [])
+        return self._first_match([self._compile_type(typ, schema, path) for typ in types])
+
+    @staticmethod
+    def _first_match(converters: list) -> Converter:
+        if len(converters) == 1:
+            return converters[0]
+        if len(converters) == 2 and converters[1] is _to_null:
+            first = converters[0]
+
+            def nullable(data):
+                result = first(data)
+                if result[0]:
+                    return result
+                return _to_null(data)
+
+            return nullable
+
+        def first_match(data):
+            for converter in converters:
+                result = converter(data)
+                if result[0]:
+                    return result
+            return FAILED
+
+        return first_match
+
+    def _compile_type(self, typ: str, schema: Dict, path: Tuple) -> Converter:
+        """Mirrors `singer.Transformer._transform`."""
+        if typ == "null":
+            return _to_null
+        if schema.get("format") == "date-time":
+            return _to_datetime
+        if schema.get("format") == "singer.decimal":
+            return _to_decimal
+        if typ == "object":
+            return self._compile_object(schema.get("properties", {}), schema.get("patternProperties"), path)
+        if typ == "array":
+            return self._compile_array(schema["items"], path)
+        return SCALAR_CONVERTERS.get(typ, lambda data: FAILED)
+
+    def _compile_object(self, properties: Dict, pattern_properties: Optional[Dict], path: Tuple) -> Converter:
+        if properties == {} and not pattern_properties:
+
+            def empty_object(data):
+                return (True, data) if isinstance(data, dict) else (False, data)
+
+            return empty_object
+
+        converters = {key: self._compile_schema(subschema, path + (key,)) for key, subschema in properties.items()}
+        pattern_converters = {}
+        removed = self.removed
+
+        def pattern_converter(key):
+            if key not in pattern_converters:
+                pattern_schemas = [
+                    subschema for pattern, subschema in (pattern_properties or {}).items() if re.match(pattern, key)
+                ]
+                pattern_converters[key] = (
+                    self._compile_schema({"anyOf": pattern_schemas}, path + (key,)) if pattern_schemas else None
+                )
+            return pattern_converters[key]
+
+        def transform_object(data):
+            if not isinstance(data, dict):
+                return False, data
+            result, success = {}, True
+            for key, value in data.items():
+                converter = converters.get(key) or (pattern_properties and pattern_converter(key))
+                if converter:
+                    converted, result[key] = converter(value)
+                    success = success and converted
+                else:
+                    removed.add(".".join(map(str, path + (key,))))
+            return success, result
+
+        return transform_object
+
+    def _compile_array(self, items: Dict, path: Tuple) -> Converter:
+        converter = self._compile_schema(items, path + ("[]",))
+
+        def transform_array(data):
+            if not isinstance(data, list):
+                return False, data
+            result, success = [], True
+            for row in data:
+                converted, subdata = converter(row)
+                success = success and converted
+                result.append(subdata)
+            return success, result
+
+        return transform_array
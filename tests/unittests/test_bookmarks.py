@@ -0,0 +1,148 @@
+from copy import deepcopy
+from datetime import timedelta
+from unittest import TestCase, mock
+
+from singer.utils import now, strftime
+
+from tap_yotpo.bookmarks import ParentBookmarks
+from tap_yotpo.parentids import ParentIds
+from tap_yotpo.streams import ProductVariants
+
+START_DATE = "2021-01-01T00:00:00.000000Z"
+
+
+class TestParentBookmarks(TestCase):
+    """Checking the compact bookmarks of the parents of a child stream."""
+
+    def test_default_keeps_a_key_per_parent(self):
+        state = {"bookmarks": {"product_variants": {"1": "2022-01-01T00:00:00.000000Z"}}}
+        bookmarks = ParentBookmarks(state, "product_variants", START_DATE)
+        bookmarks.start(resumed=False)
+        bookmarks.update(2, "2022-02-01T00:00:00.000000Z")
+        bookmarks.complete()
+        self.assertEqual(
+            [bookmarks.get(1), bookmarks.get(2), bookmarks.get(3)],
+            [*state["bookmarks"]["product_variants"].values(), START_DATE],
+        )
+        self.assertEqual(bookmarks.write(), state)
+
+    def test_pass(self):
+        state = {"bookmarks": {"product_variants": {"1": "2022-01-01T00:00:00.000000Z", "currently_syncing": "1"}}}
+        bookmarks = ParentBookmarks(state, "product_variants", START_DATE, compact=True)
+        self.assertEqual([bookmarks.get(1), bookmarks.get(2)], ["2022-01-01T00:00:00.000000Z", START_DATE])
+
+        bookmarks.start(resumed=False)
+        recent = strftime(now() + timedelta(minutes=1))
+        bookmarks.update(1, "2022-03-01T00:00:00.000000Z")
+        bookmarks.advance(1)
+        bookmarks.update(3, recent)
+        # synced before 2, it is not covered by the pass yet
+        self.assertEqual(bookmarks.write()["bookmarks"]["product_variants"]["parents"]["exceptions"], {"3": recent})
+        self.assertEqual(bookmarks.get(1), bookmarks.pass_watermark)
+        self.assertEqual(bookmarks.get(2), START_DATE)
+        self.assertNotIn("1", state["bookmarks"]["product_variants"])
+
+        resumed = ParentBookmarks(deepcopy(state), "product_variants", START_DATE, compact=True)
+        resumed.start(resumed=True)
+        self.assertEqual(
+            [resumed.get(1), resumed.get(2), resumed.get(3)], [bookmarks.pass_watermark, START_DATE, recent]
+        )
+        resumed.advance(3)
+        resumed.complete([(1, "a"), (2, "b"), (3, "c")])
+        parents = resumed.write()["bookmarks"]["product_variants"]["parents"]
+        self.assertEqual(
+            parents, {"watermark": bookmarks.pass_watermark, "exceptions": {"3": recent}, "covered_through": 3}
+        )
+        self.assertEqual([resumed.get(2), resumed.get(3)], [bookmarks.pass_watermark, recent])
+
+    def test_new_parent(self):
+        """A parent created after the last complete pass starts from the
+        start date and is not known."""
+        state = {
+            "bookmarks": {
+                "product_variants": {
+                    "parents": {"watermark": "2022-01-01T00:00:00.000000Z", "exceptions": {}, "covered_through": 20}
+                }
+            }
+        }
+        bookmarks = ParentBookmarks(state, "product_variants", START_DATE, compact=True)
+        self.assertEqual([bookmarks.get(10), bookmarks.get(21)], ["2022-01-01T00:00:00.000000Z", START_DATE])
+        self.assertEqual([bookmarks.known(10), bookmarks.known(21), bookmarks.known("x")], [True, False, False])
+
+        bookmarks.start(resumed=False)
+        bookmarks.update(21, "2022-02-01T00:00:00.000000Z")
+        bookmarks.complete([(10, "a"), (21, "b")])
+        self.assertEqual(bookmarks.covered_through, 21)
+        self.assertTrue(bookmarks.known(21))
+
+    def test_out_of_order_pass_is_written_once_complete(self):
+        state = {
+            "bookmarks": {
+                "product_variants": {"parents": {"watermark": "2022-01-01T00:00:00.000000Z", "exceptions": {}}}
+            }
+        }
+        bookmarks = ParentBookmarks(deepcopy(state), "product_variants", START_DATE, compact=True)
+        bookmarks.start(resumed=False, in_order=False)
+        bookmarks.update(2, "2022-03-01T00:00:00.000000Z")
+        bookmarks.advance(2)
+        self.assertEqual(bookmarks.write(), state)
+        bookmarks.complete()
+        self.assertEqual(bookmarks.write()["bookmarks"]["product_variants"]["parents"]["exceptions"], {})
+
+    def test_fingerprints_packed(self):
+        """The fingerprints of the compact store are packed in the `parents`
+        bookmark, the fingerprint keys of the previous syncs are migrated."""
+        state = {"bookmarks": {"product_variants": {"1": START_DATE, "fingerprints": {"1": "0123456789abcdef"}}}}
+        bookmarks = ParentBookmarks(state, "product_variants", START_DATE, compact=True)
+        bookmarks.set_fingerprint(200, "fedcba9876543210")
+        self.assertEqual([bookmarks.get_fingerprint(1), bookmarks.get_fingerprint(2)], ["0123456789abcdef", None])
+
+        state = bookmarks.write()
+        self.assertEqual(set(state["bookmarks"]["product_variants"]), {"parents"})
+        self.assertIsInstance(state["bookmarks"]["product_variants"]["parents"]["fingerprints"], str)
+        reloaded = ParentBookmarks(deepcopy(state), "product_variants", START_DATE, compact=True)
+        self.assertEqual(reloaded.fingerprints, {"1": "0123456789abcdef", "200": "fedcba9876543210"})
+
+
+class TestCompactSync(TestCase):
+    """Checking the state size of a child stream with compact bookmarks."""
+
+    def sync(self, state, failing_product=None):
+        config = {"api_key": "key", "start_date": START_DATE, "compact_bookmarks": True}
+        client = mock.Mock(config=config, shared_product_ids=ParentIds((_, f"ext{_}") for _ in range(1, 201)))
+
+        def get(url, params, headers, api_auth_version, retry_not_found=True):
+            prod_id = int(url.split("/")[-2])
+            if prod_id == failing_product:
+                raise ConnectionError("failed")
+            return {
+                "variants": [{"yotpo_id": prod_id, "updated_at": self.updated_at.get(prod_id, "2022-01-01T00:00:00Z")}]
+            }
+
+        client.get.side_effect = get
+        stream = ProductVariants(client)
+        states, written = [], []
+        stream.state_writer = lambda state: states.append(deepcopy(state))
+        with mock.patch("tap_yotpo.streams.abstracts.write_record", lambda _, record: written.append(record)):
+            try:
+                state = stream.sync(state, {}, {}, mock.Mock(transform=lambda record, *_: record))
+            except ConnectionError:
+                state = states[-1]
+        return written, state
+
+    def test_state_size(self):
+        self.updated_at = {7: strftime(now() + timedelta(minutes=1))}
+        written, state = self.sync({}, failing_product=150)
+        self.assertEqual(len(written), 149)
+        self.assertEqual(set(state["bookmarks"]["product_variants"]), {"currently_syncing", "parents"})
+        self.assertEqual(list(state["bookmarks"]["product_variants"]["parents"]["exceptions"]), ["7"])
+
+        written, state = self.sync(state)
+        # resumed after product 149, synced through the pass watermark
+        self.assertEqual([_["yotpo_id"] for _ in written], list(range(150, 201)))
+        self.assertEqual(set(state["bookmarks"]["product_variants"]), {"parents"})
+        self.assertEqual(list(state["bookmarks"]["product_variants"]["parents"]["exceptions"]), ["7"])
+
+        # only the variant updated after the pass started is at its bookmark
+        written, state = self.sync(state)
+        self.assertEqual([_["yotpo_id"] for _ in written], [7])
@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import signal
+from contextlib import ExitStack
+from unittest import TestCase, mock
+
+from singer import metadata
+
+from tap_yotpo import streams
+from tap_yotpo.checkpoints import StatePolicy
+from tap_yotpo.discover import discover
+from tap_yotpo.sync import sync
+
+
+class TestStatePolicy(TestCase):
+    """Checking which states of a stream are emitted."""
+
+    def test_every_state_by_default(self):
+        """Without a policy every state is emitted."""
+        policy = StatePolicy()
+        self.assertEqual([policy.due() for _ in range(3)], [True, True, True])
+
+    def test_every_n_states(self):
+        """One state out of `every` is emitted."""
+        policy = StatePolicy(every="3")
+        self.assertEqual([policy.due() for _ in range(7)], [False, False, True, False, False, True, False])
+
+    def test_every_t_seconds(self):
+        """A state is emitted once `seconds` elapsed since the last one, or
+        earlier when `every` states were passed."""
+        clock = mock.Mock(return_value=0)
+        policy = StatePolicy(every=5, seconds=10, clock=clock)
+        emitted = []
+        for second in (1, 2, 11, 12, 13, 14, 15, 16):
+            clock.return_value = second
+            emitted.append(policy.due())
+        self.assertEqual(emitted, [False, False, True, False, False, False, False, True])
+
+
+class TestThrottledSync(TestCase):
+    """Checking the states emitted by a stream syncing many parents."""
+
+    def get_catalog(self):
+        catalog = discover()
+        catalog.streams = [_ for _ in catalog.streams if _.tap_stream_id == "reviews"]
+        for stream in catalog.streams:
+            stream.metadata = metadata.to_list(metadata.write(metadata.to_map(stream.metadata), (), "selected", True))
+        return catalog
+
+    def run_sync(self, config, on_parent=None):
+        """Syncs `reviews` writing a record and a state for each of 10
+        parents, returns the parent of every emitted state and the error."""
+
+        def fake_sync(stream_obj, state, schema, stream_metadata, transformer):
+            for parent in range(1, 11):
+                if on_parent:
+                    on_parent(parent)
+                streams.abstracts.write_record("reviews", {"id": parent})
+                state.setdefault("bookmarks", {})["reviews"] = {"parent": parent}
+                stream_obj.write_state(state)
+            return state
+
+        stdout, error = io.StringIO(), None
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch("sys.stdout", stdout))
+            stack.enter_context(mock.patch.object(streams.Reviews, "sync", fake_sync))
+            try:
+                sync(mock.Mock(config={"api_key": "key", **config}), self.get_catalog(), {})
+            except BaseException as err:  # pylint: disable=W0703
+                error = err
+
+        lines = [json.loads(_) for _ in stdout.getvalue().splitlines()]
+        self.last_state = [_ for _ in lines if _["type"] == "STATE"][-1]["value"]
+        records = [_["record"]["id"] for _ in lines if _["type"] == "RECORD"]
+        states = [
+            _["value"].get("bookmarks", {}).get("reviews", {}).get("parent") for _ in lines if _["type"] == "STATE"
+        ]
+        # a state never covers records which are not written yet
+        for index, line in enumerate(lines):
+            if line["type"] == "STATE":
+                written = [_["record"]["id"] for _ in lines[:index] if _["type"] == "RECORD"]
+                parent = line["value"].get("bookmarks", {}).get("reviews", {}).get("parent")
+                self.assertTrue(parent is None or parent in written)
+        return records, [_ for _ in states if _ is not None], error
+
+    def test_every_state(self):
+        """By default a state is emitted for every parent."""
+        _, states, error = self.run_sync({})
+        self.assertIsNone(error)
+        self.assertEqual(states, list(range(1, 11)) + [10, 10])
+
+    def test_throttled_states(self):
+        """A state is emitted every `state_emit_every` parents and at the
+        end of the stream."""
+        records, states, error = self.run_sync({"state_emit_every": 4})
+        self.assertIsNone(error)
+        self.assertEqual(records, list(range(1, 11)))
+        self.assertEqual(states, [4, 8, 10, 10])
+
+    def test_state_flushed_on_failure(self):
+        """The state held back when a stream fails is emitted."""
+
+        def fail(parent):
+            if parent == 7:
+                raise RuntimeError("boom")
+
+        _, states, error = self.run_sync({"state_emit_every": 4}, fail)
+        self.assertIsInstance(error, RuntimeError)
+        self.assertEqual(states, [4, 6])
+
+    def test_shutdown_signal(self):
+        """On a shutdown signal the stream emits its state and stops at the
+        next checkpoint, the sync returns with the stream still
+        `currently_syncing`."""
+        handler = signal.getsignal(signal.SIGTERM)
+
+        def terminate(parent):
+            if parent == 3:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        records, states, error = self.run_sync({"state_emit_every": 100}, terminate)
+        self.assertIsNone(error)
+        self.assertEqual(records, [1, 2, 3])
+        self.assertEqual(states, [3, 3])
+        self.assertEqual(self.last_state["currently_syncing"], "reviews")
+        self.assertIs(signal.getsignal(signal.SIGTERM), handler)
@@ -0,0 +1,79 @@
+import enum
+import json
+from unittest import TestCase, mock
+
+import requests
+
+from tap_yotpo import checkpoints
+from tap_yotpo.client import POOL_HOSTS, Client
+
+
+class TestConnectionPooling(TestCase):
+    """Checking the connection pools mounted on the client session."""
+
+    def test_pool_size_follows_concurrency(self):
+        """Pools are sized to the largest worker count unless configured."""
+        config = {"api_key": enum.auto(), "api_secret": enum.auto(), "product_reviews_concurrency": 25}
+        client_obj = Client({**config, "pool_maxsize": {"api": 15}})
+        self.assertEqual(client_obj._session.get_adapter(POOL_HOSTS["api"] + "/v1")._pool_maxsize, 15)
+        self.assertEqual(client_obj._session.get_adapter(POOL_HOSTS["cdn"] + "/v1")._pool_maxsize, 25)
+
+    def test_timeouts(self):
+        """`request_timeout` is used as the read timeout of every request."""
+        client_obj = Client({"api_key": enum.auto(), "api_secret": enum.auto(), "request_timeout": "120"})
+        self.assertEqual(client_obj.timeout, (30, 120))
+        self.assertEqual(client_obj.pool_stats(), {"connections_created": 0, "connections_reused": 0})
+
+
+class StreamedResponse(requests.Response):
+    """A 200 response whose body is received in chunks, `fail_after` chunks
+    are received before the connection breaks."""
+
+    def __init__(self, body, fail_after=None):
+        super().__init__()
+        self.status_code = 200
+        self.raw = mock.Mock()
+        self.body = body
+        self.fail_after = fail_after
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for index in range(0, len(self.body), 10):
+            if self.fail_after is not None and index // 10 >= self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("Connection broken")
+            yield self.body[index : index + 10]
+
+
+class TestStreamedResponses(TestCase):
+    """Checking the retries of the responses decoded while being received."""
+
+    body = json.dumps({"records": [{"id": _} for _ in range(10)]})
+
+    @mock.patch("time.sleep")
+    def test_interrupted_body_is_requested_again(self, mocked_sleep):
+        """A page interrupted mid-body is requested again, without repeating
+        the records already yielded."""
+        responses = [StreamedResponse(self.body, fail_after=5), StreamedResponse(self.body)]
+        client_obj = Client({"api_key": enum.auto(), "api_secret": enum.auto()})
+        with mock.patch("requests.Session.request", side_effect=responses) as mocked_request:
+            records = list(client_obj.iter_get("https://api.yotpo.com/v1/x", {}, {}, None, ("records",)))
+        self.assertEqual(records, [{"id": _} for _ in range(10)])
+        self.assertEqual(mocked_request.call_count, 2)
+
+    @mock.patch("time.sleep")
+    def test_interrupted_body_gives_up(self, mocked_sleep):
+        """The error is raised once every attempt was interrupted."""
+        client_obj = Client({"api_key": enum.auto(), "api_secret": enum.auto()})
+        with mock.patch("requests.Session.request", side_effect=lambda *_, **__: StreamedResponse(self.body, 3)):
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                list(client_obj.iter_get("https://api.yotpo.com/v1/x", {}, {}, None, ("records",)))
+        self.assertEqual(mocked_sleep.call_count, 4)
+
+    def test_no_request_while_shutting_down(self):
+        """No request is sent once the sync is shutting down."""
+        client_obj = Client({"api_key": enum.auto(), "api_secret": enum.auto()})
+        with mock.patch("requests.Session.request") as mocked_request, mock.patch.object(
+            checkpoints.shutdown_requested, "is_set", return_value=True
+        ):
+            with self.assertRaises(checkpoints.ShutdownRequested):
+                client_obj.get("https://api.yotpo.com/v1/x", {}, {}, None)
+        mocked_request.assert_not_called()
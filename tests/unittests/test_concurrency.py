@@ -0,0 +1,229 @@
+import threading
+import time
+from unittest import TestCase
+
+from tap_yotpo.concurrency import (
+    Feed,
+    LowWatermark,
+    iter_pages,
+    ordered_map,
+    read_ahead,
+    unordered_map,
+    unordered_pages,
+)
+
+
+class TestOrderedMap(TestCase):
+    """Checking the ordered fan-out helper used by the child streams."""
+
+    @staticmethod
+    def slow_square(value, delay):
+        time.sleep(delay)
+        return value * value
+
+    def test_results_in_input_order(self):
+        """Results are yielded in input order even if later calls finish
+        first."""
+        items = [(_, 0.05 if _ % 2 else 0) for _ in range(10)]
+        for workers in (1, 4):
+            results = list(ordered_map(self.slow_square, items, workers))
+            self.assertEqual([args for args, _ in results], items)
+            self.assertEqual([res for _, res in results], [_ * _ for _ in range(10)])
+
+    def test_exception_is_propagated(self):
+        """A failing call is raised to the consumer at its position."""
+
+        def func(value):
+            if value == 3:
+                raise ValueError(value)
+            return value
+
+        consumed = []
+        with self.assertRaises(ValueError):
+            for (value,), _ in ordered_map(func, ((_,) for _ in range(10)), 3):
+                consumed.append(value)
+        self.assertEqual(consumed, [0, 1, 2])
+
+
+class TestUnorderedMap(TestCase):
+    """Checking the completion ordered fan-out helper."""
+
+    def test_all_results_yielded(self):
+        """Every call is yielded exactly once, faster calls first."""
+        items = [(_, 0.1 if _ == 0 else 0) for _ in range(6)]
+        results = list(unordered_map(TestOrderedMap.slow_square, items, 3))
+        self.assertEqual(sorted(args for args, _ in results), items)
+        self.assertNotEqual(results[0][0], items[0])
+
+
+class TestUnorderedPages(TestCase):
+    """Checking the parallel page producer of the sliced streams."""
+
+    def test_pages_of_each_call_in_order(self):
+        """Every page is yielded once, the pages of a call in order and
+        followed by the end of the call, with a bounded number of pages
+        produced ahead of the consumer."""
+        produced = []
+
+        def pages(name, count):
+            for page in range(count):
+                produced.append((name, page))
+                yield [page]
+
+        for max_workers in (1, 3):
+            produced.clear()
+            consumed = []
+            for (name, _), page in unordered_pages(pages, [(_, 5) for _ in "abcd"], max_workers, 2):
+                time.sleep(0.01)
+                # the queued pages, the page held by each producer and the one consumed
+                written = len([_ for _ in consumed if _[1] is not None])
+                self.assertLessEqual(len(produced) - written, 3 * max_workers + 1)
+                consumed.append((name, page))
+            for name in "abcd":
+                self.assertEqual([page for _, page in consumed if _ == name], [[0], [1], [2], [3], [4], None])
+
+    def test_errors_stop_the_producers(self):
+        produced = []
+
+        def pages(name):
+            if name == "b":
+                raise ValueError(name)
+            for page in range(100):
+                produced.append(page)
+                yield [page]
+
+        with self.assertRaises(ValueError):
+            list(unordered_pages(pages, [(_,) for _ in "abc"], 3))
+        time.sleep(0.3)
+        self.assertLess(len(produced), 20)
+
+
+class TestReadAhead(TestCase):
+    """Checking the background page read-ahead helper."""
+
+    def test_items_are_read_ahead(self):
+        """Items are produced ahead of the consumer, at most `depth` items
+        plus the one being produced."""
+        produced = []
+
+        def pages():
+            for _ in range(10):
+                produced.append(_)
+                yield _
+
+        consumed = []
+        for item in read_ahead(pages(), 2):
+            time.sleep(0.02)
+            self.assertLessEqual(len(produced) - len(consumed), 4)
+            consumed.append(item)
+        self.assertEqual(consumed, list(range(10)))
+
+    def test_errors_follow_the_produced_items(self):
+        def pages():
+            yield 1
+            raise ValueError("failed")
+
+        items = read_ahead(pages(), 1)
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_stopping_early_stops_the_producer(self):
+        produced = []
+
+        def pages():
+            for _ in range(100):
+                produced.append(_)
+                yield _
+
+        for item in read_ahead(pages(), 1):
+            break
+        time.sleep(0.3)
+        self.assertLess(len(produced), 5)
+
+
+class TestIterPages(TestCase):
+    """Checking the parallel page number fetcher."""
+
+    @staticmethod
+    def fetch_page(page, requested, page_count=7):
+        requested.append(page)
+        time.sleep(0.01 * (page % 3))
+        return [f"{page}-{_}" for _ in range(3)] if page <= page_count else []
+
+    def test_pages_reassembled_in_order(self):
+        """Records are yielded in page order up to the first empty page."""
+        expected = [f"{page}-{_}" for page in range(1, 8) for _ in range(3)]
+        for max_workers in (1, 3):
+            requested = []
+            records = list(iter_pages(lambda page: self.fetch_page(page, requested), max_workers))
+            self.assertEqual(records, expected)
+            self.assertLessEqual(max(requested), 8 + 2 * max_workers)
+
+    def test_last_page(self):
+        """No page past `last_page` is requested."""
+        requested = []
+        records = list(iter_pages(lambda page: self.fetch_page(page, requested), 4, first_page=2, last_page=5))
+        self.assertEqual(records, [f"{page}-{_}" for page in range(2, 6) for _ in range(3)])
+        self.assertEqual(sorted(requested), [2, 3, 4, 5])
+
+    def test_stop_after(self):
+        """No record past the page ending with a `stop_after` match is
+        yielded, and the requests stop shortly after it."""
+        for max_workers in (1, 3):
+            requested = []
+            records = list(
+                iter_pages(
+                    lambda page: self.fetch_page(page, requested),
+                    max_workers,
+                    stop_after=lambda record: record == "2-2",
+                )
+            )
+            self.assertEqual(records, [f"{page}-{_}" for page in range(1, 3) for _ in range(3)])
+            self.assertLessEqual(max(requested), 2 + 2 * max_workers - 1)
+        requested = []
+        list(iter_pages(lambda page: self.fetch_page(page, requested), stop_after=lambda record: record == "2-2"))
+        self.assertEqual(requested, [1, 2])
+
+
+class TestLowWatermark(TestCase):
+    """Checking the contiguous completion tracker."""
+
+    def test_watermark_advances_over_contiguous_positions(self):
+        watermark = LowWatermark(4)
+        self.assertFalse(watermark.complete(6))
+        self.assertFalse(watermark.complete(7))
+        self.assertEqual(watermark.value, 4)
+        self.assertTrue(watermark.complete(5))
+        self.assertEqual(watermark.value, 7)
+
+
+class TestFeed(TestCase):
+    """Checking the feed of parent ids shared with the child streams."""
+
+    @staticmethod
+    def produce(feed, count, error=None):
+        for _ in range(count):
+            time.sleep(0.01)
+            feed.append(_)
+        feed.close(error)
+
+    def test_consumers_read_while_filled(self):
+        """Every consumer reads every item, in order, while the feed is
+        filled."""
+        feed = Feed()
+        producer = threading.Thread(target=self.produce, args=(feed, 10))
+        producer.start()
+        first = next(iter(feed))
+        self.assertFalse(feed.closed)
+        self.assertEqual(first, 0)
+        self.assertEqual(list(feed), list(range(10)))
+        self.assertEqual(feed.result(), list(range(10)))
+        producer.join()
+
+    def test_producer_failure(self):
+        """A failed producer raises in the consumers instead of blocking."""
+        feed = Feed()
+        threading.Thread(target=self.produce, args=(feed, 3, ValueError("failed"))).start()
+        with self.assertRaises(RuntimeError):
+            feed.result()
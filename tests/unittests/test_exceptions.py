@@ -73,6 +73,18 @@ class HTTPErrorCodeHandling(TestCase):
                 self.assertEqual(str(_), "Resource not found")
                 raise _
 
+    @mock.patch("time.sleep")
+    @mock.patch("requests.Session.request", side_effect=lambda *_, **__: Mockresponse(404))
+    def test_404_error_not_retried(self, mocked_request, mocked_sleep):
+        """A 404 is raised at once when the request does not retry it, other
+        requests retry it."""
+        with self.assertRaises(errors.Http404RequestError):
+            self.client_obj.get(self.ENDPOINT, {}, {}, None, retry_not_found=False)
+        self.assertEqual((mocked_request.call_count, mocked_sleep.call_count), (1, 0))
+        with self.assertRaises(errors.Http404RequestError):
+            self.client_obj.get(self.ENDPOINT, {}, {}, None)
+        self.assertEqual(mocked_request.call_count, 6)
+
     @mock.patch("time.sleep")
     @mock.patch("requests.Session.request", side_effect=lambda *_, **__: Mockresponse(429))
     def test_429_error_custom_message(self, *args):
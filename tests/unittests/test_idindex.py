@@ -0,0 +1,64 @@
+import io
+import tempfile
+from unittest import TestCase, mock
+
+from singer import metadata
+
+from tap_yotpo import streams
+from tap_yotpo.discover import discover
+from tap_yotpo.idindex import ParentIdIndex
+from tap_yotpo.sync import sync
+
+
+class TestParentIdIndex(TestCase):
+    """Checking the parent id index kept across syncs."""
+
+    def test_update(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            index = ParentIdIndex(cache_dir, "key", "orders")
+            self.assertEqual((list(index.get_ids()), index.watermark), ([], None))
+            index.update([(3, "c"), (1, "a")], "2022-01-01T00:00:00.000000Z")
+            index.update([(2, "b"), (3, "c2")])
+            index.close()
+
+            index = ParentIdIndex(cache_dir, "key", "orders")
+            self.assertEqual(list(index.get_ids()), [(1, "a"), (2, "b"), (3, "c2")])
+            self.assertEqual(index.watermark, "2022-01-01T00:00:00.000000Z")
+            index.update([(4, "d")], replace=True)
+            self.assertEqual(list(index.get_ids()), [(4, "d")])
+            self.assertEqual(list(ParentIdIndex(cache_dir, "other key", "orders").get_ids()), [])
+
+    def test_orders_read_incrementally(self):
+        """Only the orders placed since the indexed ones are read, the order
+        fulfillments still get every order id."""
+        orders = [
+            {"yotpo_id": _, "external_id": str(_), "order_date": f"2022-01-{_ + 1:02d}T00:00:00Z"} for _ in range(10)
+        ]
+
+        def get(url, params, headers, api_auth_version):
+            requested.append(params.get("order_date_min"))
+            return {"orders": [_ for _ in orders if _["order_date"] >= params.get("order_date_min", "")]}
+
+        catalog = discover()
+        catalog.streams = [_ for _ in catalog.streams if _.tap_stream_id == "order_fulfillments"]
+        for stream in catalog.streams:
+            stream.metadata = metadata.to_list(metadata.write(metadata.to_map(stream.metadata), (), "selected", True))
+        fulfilled = []
+
+        def fulfillments_sync(stream_obj, state, schema, stream_metadata, transformer):
+            fulfilled.append([_[0] for _ in stream_obj.get_orders(state)[0]])
+            return state
+
+        with tempfile.TemporaryDirectory() as cache_dir, mock.patch("sys.stdout", io.StringIO()), mock.patch.object(
+            streams.OrderFulfillments, "sync", fulfillments_sync
+        ):
+            config = {"api_key": "key", "start_date": "2022-01-01T00:00:00Z", "parent_id_cache_dir": cache_dir}
+            for _ in range(2):
+                requested = []
+                client = mock.Mock(config=config, shared_order_ids=[])
+                client.get.side_effect = get
+                sync(client, catalog, {})
+                orders.append({"yotpo_id": 10, "external_id": "10", "order_date": "2022-01-11T00:00:00Z"})
+
+        self.assertEqual(fulfilled, [list(range(10)), list(range(11))])
+        self.assertEqual(requested, ["2022-01-10T00:00:00.000000Z"])
@@ -0,0 +1,30 @@
+import json
+from decimal import Decimal
+from unittest import TestCase
+
+from tap_yotpo import jsoncodec
+
+
+class TestJsonCodecs(TestCase):
+    """Checking the available json codecs agree with the standard
+    library."""
+
+    record = {"id": 12, "title": 'Grüße / "quoted"', "score": 4.5, "tags": [None, True], "meta": {}}
+
+    def test_round_trip(self):
+        for name in jsoncodec.AVAILABLE_CODECS:
+            codec = jsoncodec.get_codec(name)
+            encoded = codec.dumps(self.record)
+            self.assertNotIn("\n", encoded)
+            self.assertEqual(json.loads(encoded), self.record)
+            self.assertEqual(codec.loads(encoded.encode("utf-8")), self.record)
+
+    def test_decimal_fallback(self):
+        """Values unsupported by a fast backend fall back to the singer
+        encoding."""
+        for name in jsoncodec.AVAILABLE_CODECS:
+            self.assertEqual(jsoncodec.get_codec(name).dumps({"price": Decimal("10.10")}), '{"price": 10.10}')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            jsoncodec.set_codec("marshal")
@@ -0,0 +1,46 @@
+import json
+from unittest import TestCase
+
+from tap_yotpo.jsonstream import iter_json_array
+
+
+def chunked(document, size):
+    return (document[pos : pos + size] for pos in range(0, len(document), size))
+
+
+class TestIterJsonArray(TestCase):
+    """Checking the incremental decoding of response records."""
+
+    response = {
+        "status": {"code": 200, "message": "OK"},
+        "response": {
+            "pagination": {"page": 1, "per_page": 3, "total": 3},
+            "unsubscribers": [
+                {"id": 1234567, "email": "a@b.com", "score": 4.5, "tags": [], "meta": {"x": None}},
+                {"id": 2, "email": 'qu"oteé', "score": -1e-05, "tags": ["x", "y"], "meta": {}},
+                {"id": 31, "email": "c@d.com", "score": 10, "tags": [1, [2, {"a": "}"}]], "meta": {"y": True}},
+            ],
+            "trailing": 12345,
+        },
+    }
+
+    def test_items_match_full_decoding(self):
+        """Items are identical to a full decode for any chunk size."""
+        for indent in (None, 2):
+            document = json.dumps(self.response, indent=indent)
+            for size in (1, 2, 7, 64, len(document)):
+                items = list(iter_json_array(chunked(document, size), ("response", "unsubscribers")))
+                self.assertEqual(items, self.response["response"]["unsubscribers"])
+
+    def test_missing_or_empty_path(self):
+        """Nothing is yielded for a missing path, an empty or a null array."""
+        self.assertEqual(list(iter_json_array([json.dumps(self.response)], ("records",))), [])
+        self.assertEqual(list(iter_json_array(['{"records": [ ]}'], ("records",))), [])
+        self.assertEqual(list(iter_json_array(['{"records": null}'], ("records",))), [])
+        self.assertEqual(list(iter_json_array(["{}"], ("records",))), [])
+
+    def test_truncated_document(self):
+        """A truncated response raises a decoding error."""
+        document = json.dumps({"records": [{"id": 1}, {"id": 2}]})
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(chunked(document[:-8], 4), ("records",)))
@@ -0,0 +1,40 @@
+import io
+import json
+from unittest import TestCase, mock
+
+from tap_yotpo import messages
+
+
+def get_output(stdout):
+    stdout.flush()
+    return stdout.getvalue() if isinstance(stdout, io.StringIO) else stdout.buffer.getvalue().decode("utf-8")
+
+
+class TestBufferedWriter(TestCase):
+    """Checking the buffered singer message writer."""
+
+    def write_messages(self, stdout, buffer_size):
+        """Writes a sync worth of messages, returns the output written before
+        the STATE message."""
+        with mock.patch("sys.stdout", stdout), mock.patch.object(messages.writer, "buffer_size", buffer_size):
+            messages.write_schema("reviews", {"type": "object"}, ["id"])
+            for _ in range(3):
+                messages.write_record("reviews", {"id": _})
+            written_before_state = get_output(stdout)
+            messages.write_state({"bookmarks": {"reviews": {"updated_at": "2022-01-01"}}})
+            messages.write_record("reviews", {"id": 3})
+            with messages.flushing():
+                pass
+        return written_before_state
+
+    def test_state_is_written_after_its_records(self):
+        """Records are buffered, and flushed before a STATE message."""
+        for stdout in (io.StringIO(), io.TextIOWrapper(io.BytesIO(), encoding="utf-8")):
+            self.assertNotIn("RECORD", self.write_messages(stdout, 1024))
+            lines = [json.loads(_) for _ in get_output(stdout).splitlines()]
+            self.assertEqual([_["type"] for _ in lines], ["SCHEMA"] + ["RECORD"] * 3 + ["STATE", "RECORD"])
+            self.assertEqual([_["record"]["id"] for _ in lines if _["type"] == "RECORD"], [0, 1, 2, 3])
+
+    def test_unbuffered(self):
+        """A zero buffer size writes every record immediately."""
+        self.assertEqual(self.write_messages(io.StringIO(), 0).count("RECORD"), 3)
@@ -0,0 +1,343 @@
+import time
+from copy import deepcopy
+from datetime import date, datetime, timedelta, timezone
+from unittest import TestCase, mock
+
+from singer.utils import strftime, strptime_to_utc
+
+from tap_yotpo.exceptions import Http404RequestError
+from tap_yotpo.streams import (
+    Emails,
+    OrderFulfillments,
+    Orders,
+    ProductReviews,
+    ProductVariants,
+)
+
+
+def review_pages(total, per_page):
+    """Returns a fake `client.get` serving `total` product reviews, newest
+    first."""
+
+    def get(url, params, headers, api_auth_version, retry_not_found=True):
+        start = (params["page"] - 1) * per_page
+        reviews = [
+            {"id": _, "product_id": 1, "created_at": f"2022-01-{28 - _ // 10:02d}T00:00:00Z"}
+            for _ in range(start, min(start + per_page, total))
+        ]
+        return {
+            "response": {
+                "reviews": reviews,
+                "products": [{"id": 1, "name": "product"}],
+                "pagination": {"page": params["page"], "total": total},
+            }
+        }
+
+    return get
+
+
+class TestProductReviewsPages(TestCase):
+    """Checking the product reviews pages fetched in parallel."""
+
+    config = {"api_key": "key", "start_date": "2021-01-01T00:00:00Z", "page_size": 10}
+
+    def get_records(self, page_concurrency, bookmark):
+        client = mock.Mock(config={**self.config, "product_reviews_page_concurrency": page_concurrency})
+        client.get.side_effect = review_pages(95, 10)
+        records, generator = [], ProductReviews(client).get_records("ext", "1234", bookmark)
+        while True:
+            try:
+                records.append(next(generator))
+            except StopIteration as stop:
+                _, total = stop.value
+                break
+        return records, total, client.get.call_count
+
+    def test_pages_in_order(self):
+        """Every page counted by `pagination.total` is fetched once, records
+        keep the page order."""
+        for page_concurrency in (1, 4):
+            records, total, call_count = self.get_records(page_concurrency, "2021-01-01T00:00:00Z")
+            self.assertEqual([_["id"] for _ in records], list(range(95)))
+            self.assertEqual((total, call_count), (95, 10))
+
+    def test_stops_at_bookmark(self):
+        """Records older than the bookmark end the sync of the product."""
+        records, _, call_count = self.get_records(1, "2022-01-25T00:00:00Z")
+        self.assertEqual([_["id"] for _ in records], list(range(40)))
+        self.assertEqual(call_count, 5)
+
+    def test_no_page_past_the_bookmark(self):
+        """A first page ending with a review older than the bookmark is the
+        only page requested, whatever the page concurrency."""
+        for page_concurrency in (1, 4):
+            records, total, call_count = self.get_records(page_concurrency, "2022-01-28T12:00:00Z")
+            self.assertEqual((records, total, call_count), ([], 95, 1))
+
+    def test_deleted_product(self):
+        """A product which no longer exists has no review, its 404 is not
+        retried."""
+        client = mock.Mock(config=self.config)
+        client.get.side_effect = Http404RequestError
+        generator = ProductReviews(client).get_records("ext", "1234", "2022-01-25T00:00:00Z")
+        with self.assertRaises(StopIteration) as stop:
+            next(generator)
+        self.assertEqual(stop.exception.value, (strptime_to_utc("2022-01-25T00:00:00Z"), 0))
+        client.get.assert_called_once_with(mock.ANY, mock.ANY, {}, mock.ANY, retry_not_found=False)
+
+
+class TestEmailSlices(TestCase):
+    """Checking the time sliced extraction of the emails export."""
+
+    sent = [
+        datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=6 * _)
+        for _ in range(80)
+    ]
+
+    def iter_get(self, url, params, headers, api_auth_version, records_path):
+        since, until = date.fromisoformat(params["since"]), date.fromisoformat(params["until"])
+        if since == self.failing_since:
+            raise ConnectionError("failed")
+        records = [
+            {"email_address": "a@b.com", "email_sent_timestamp": strftime(_)}
+            for _ in self.sent
+            if since <= _.date() <= until
+        ]
+        start = (params["page"] - 1) * params["per_page"]
+        return iter(records[start : start + params["per_page"]])
+
+    def sync(self, start_date, concurrency):
+        self.states = []
+        config = {
+            "api_key": "key",
+            "start_date": strftime(start_date),
+            "page_size": 5,
+            "emails_slice_days": 2,
+            "emails_concurrency": concurrency,
+        }
+        client = mock.Mock(config=config)
+        client.iter_get.side_effect = self.iter_get
+        stream = Emails(client)
+        stream.state_writer = lambda state: self.states.append(deepcopy(state))
+        written = []
+        with mock.patch("tap_yotpo.streams.emails.write_record", lambda _, record: written.append(record)):
+            state = stream.sync({}, {}, {}, mock.Mock(transform=lambda record, *_: record))
+        return written, state
+
+    def test_every_record_written_once(self):
+        self.failing_since = None
+        for concurrency in (1, 4):
+            written, state = self.sync(self.sent[50], concurrency)
+            self.assertEqual(
+                sorted(_["email_sent_timestamp"] for _ in written), sorted(strftime(_) for _ in self.sent[:51])
+            )
+            self.assertEqual(state["bookmarks"]["emails"]["email_sent_timestamp"], strftime(self.sent[0]))
+
+    def test_bookmark_follows_contiguous_slices(self):
+        """A failed slice holds the bookmark back to the slices before it."""
+        start_date = self.sent[-1]
+        self.failing_since = start_date.date() + timedelta(days=2 * 3 - 1)
+        with self.assertRaises(ConnectionError):
+            self.sync(start_date, 1)
+        bookmark = strptime_to_utc(self.states[-1]["bookmarks"]["emails"]["email_sent_timestamp"])
+        self.assertLess(bookmark.date(), start_date.date() + timedelta(days=2 * 3))
+        self.assertGreaterEqual(bookmark.date(), start_date.date() + timedelta(days=2 * 3 - 1))
+
+
+class TestOrderWindows(TestCase):
+    """Checking the date windowed extraction of orders."""
+
+    ordered = [
+        datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=12 * _)
+        for _ in range(60)
+    ]
+
+    def get(self, url, params, headers, api_auth_version):
+        if "page_info" in params:
+            order_date_min, order_date_max, offset = params["page_info"].split("|")
+            self.assertNotIn("order_date_min", params)
+        else:
+            order_date_min, order_date_max, offset = params.get("order_date_min"), params.get("order_date_max"), 0
+            self.requested.append(order_date_min)
+            if order_date_min == self.failing_window:
+                time.sleep(0.2)
+                raise ConnectionError("failed")
+        orders = [
+            {"yotpo_id": index, "external_id": str(index), "order_date": strftime(_)}
+            for index, _ in enumerate(self.ordered)
+            if (not order_date_min or _ >= strptime_to_utc(order_date_min))
+            and (not order_date_max or _ <= strptime_to_utc(order_date_max))
+        ]
+        offset = int(offset)
+        next_page = f"{order_date_min}|{order_date_max or ''}|{offset + 5}" if offset + 5 < len(orders) else None
+        return {"orders": orders[offset : offset + 5], "pagination": {"next_page_info": next_page}}
+
+    def sync(self, state, concurrency):
+        self.requested = []
+        config = {
+            "api_key": "key",
+            "start_date": strftime(self.ordered[-1] - timedelta(days=1)),
+            "orders_window_days": 3,
+            "orders_concurrency": concurrency,
+        }
+        client = mock.Mock(config=config)
+        client.get.side_effect = self.get
+        stream = Orders(client)
+        stream.state_writer = lambda state: self.states.append(deepcopy(state))
+        written = []
+        with mock.patch("tap_yotpo.streams.orders.write_record", lambda _, record: written.append(record)):
+            state = stream.sync(state, {}, {}, mock.Mock(transform=lambda record, *_: record))
+        return [_["yotpo_id"] for _ in written], state
+
+    def test_every_order_written_once(self):
+        self.states, self.failing_window = [], None
+        for concurrency in (1, 3):
+            written, state = self.sync({}, concurrency)
+            self.assertEqual(sorted(written), list(range(60)))
+            self.assertEqual(state["bookmarks"]["orders"], {"order_date": strftime(self.ordered[0])})
+
+    def test_interrupted_backfill_skips_completed_windows(self):
+        """Windows completed before an interruption are not extracted
+        again."""
+        self.states = []
+        windows = Orders(mock.Mock(config={"start_date": strftime(self.ordered[-1] - timedelta(days=1))}))
+        windows.client.config["orders_window_days"] = 3
+        window_starts = [strftime(start) for start, _ in windows.get_windows(self.ordered[-1])]
+        self.failing_window = window_starts[2]
+        with self.assertRaises(ConnectionError):
+            self.sync({}, 3)
+        state = self.states[-1]
+        completed = state["bookmarks"]["orders"]["completed_windows"]
+        self.assertNotIn(window_starts[2], completed)
+        self.assertTrue(completed)
+
+        self.failing_window = None
+        written, state = self.sync(deepcopy(state), 3)
+        self.assertFalse(set(self.requested) & set(completed))
+        self.assertNotIn("completed_windows", state["bookmarks"]["orders"])
+        self.assertEqual(state["bookmarks"]["orders"]["order_date"], strftime(self.ordered[0]))
+
+
+class TestUnchangedProductReviews(TestCase):
+    """Checking the products without updated reviews are skipped."""
+
+    def sync(self, state, skip_unchanged):
+        config = {"api_key": "key", "start_date": "2021-01-01T00:00:00Z", "page_size": 10}
+        client = mock.Mock(config={**config, "product_reviews_skip_unchanged": skip_unchanged})
+        client.get.side_effect = review_pages(5, 10)
+        client.iter_get.side_effect = lambda url, params, *_: iter(
+            [{"id": 1, "sku": "ext2", "updated_at": "2022-01-28T00:00:00Z"}] if params["page"] == 1 else []
+        )
+        stream = ProductReviews(client)
+        stream.state_writer = lambda state: None
+        with mock.patch.object(
+            stream, "get_products", return_value=([(_, f"ext{_}") for _ in range(1, 5)], 0)
+        ), mock.patch("tap_yotpo.streams.abstracts.write_record"):
+            state = stream.sync(state, {}, {}, mock.Mock(transform=lambda record, *_: record))
+        return [_.args[0].split("/")[-2] for _ in client.get.call_args_list], state
+
+    def test_skip_unchanged(self):
+        bookmarks = {str(_): "2022-01-01T00:00:00.000000Z" for _ in range(1, 4)}
+        state = {"bookmarks": {"product_reviews": {**bookmarks, "changes_checked_at": "2022-01-27T00:00:00.000000Z"}}}
+        requested, _ = self.sync(deepcopy(state), False)
+        self.assertEqual(requested, ["ext1", "ext2", "ext3", "ext4"])
+
+        requested, state = self.sync(state, True)
+        # ext4 was never synced, ext2 has an updated review
+        self.assertEqual(requested, ["ext2", "ext4"])
+        self.assertGreater(state["bookmarks"]["product_reviews"]["changes_checked_at"], "2022-01-27")
+
+    def test_first_sync_fetches_every_product(self):
+        requested, state = self.sync({}, True)
+        self.assertEqual(requested, ["ext1", "ext2", "ext3", "ext4"])
+        self.assertIn("changes_checked_at", state["bookmarks"]["product_reviews"])
+
+
+class TestUnchangedParents(TestCase):
+    """Checking the fingerprints of the records read for every parent."""
+
+    write_delay = 0
+
+    def sync(self, stream_class, state, skip_unchanged, read_ahead_depth=1, page_size=2):
+        config = {
+            "api_key": "key",
+            "start_date": "2021-01-01T00:00:00Z",
+            "page_size": page_size,
+            "read_ahead_depth": read_ahead_depth,
+        }
+        client = mock.Mock(config={**config, f"{stream_class.tap_stream_id}_skip_unchanged": skip_unchanged})
+
+        def get(url, params, headers, api_auth_version, retry_not_found=True):
+            offset, limit = int(params.get("page_info") or 0), params["limit"]
+            events.append(("get", offset))
+            records = [{"id": _, "yotpo_id": _, "updated_at": self.updated_at[_]} for _ in range(3)]
+            next_page = str(offset + limit) if offset + limit < len(records) else None
+            return {
+                stream_class.stream.split("_")[1]: records[offset : offset + limit],
+                "pagination": {"next_page_info": next_page},
+            }
+
+        client.get.side_effect = get
+        stream = stream_class(client)
+        stream.state_writer = lambda state: None
+        written = []
+        events = self.events = []
+        with mock.patch.object(
+            stream,
+            "get_products" if stream_class is ProductVariants else "get_orders",
+            return_value=([(1, "ext1"), (2, "ext2")], 0),
+        ), mock.patch(
+            "tap_yotpo.streams.abstracts.write_record",
+            lambda _, record: written.append(record) or time.sleep(self.write_delay) or events.append("write"),
+        ):
+            state = stream.sync(state, {}, {}, mock.Mock(transform=lambda record, *_: record))
+        return written, state
+
+    def test_records_written_as_pages_arrive(self):
+        """The records of a page are written while the next page is fetched
+        in the background, or before it is fetched without read-ahead."""
+        self.updated_at = ["2022-01-01T00:00:00Z", "2022-01-02T00:00:00Z", "2022-01-03T00:00:00Z"]
+        for stream_class in (ProductVariants, OrderFulfillments):
+            self.sync(stream_class, {}, False, read_ahead_depth=0)
+            self.assertEqual(self.events[:4], [("get", 0), "write", "write", ("get", 2)])
+            self.write_delay = 0.05
+            self.sync(stream_class, {}, False)
+            self.write_delay = 0
+            self.assertEqual(self.events[:4], [("get", 0), ("get", 2), "write", "write"])
+
+    def test_unchanged_parents_write_nothing(self):
+        for stream_class in (ProductVariants, OrderFulfillments):
+            with self.subTest(stream=stream_class.tap_stream_id):
+                self.updated_at = ["2022-01-01T00:00:00Z", "2022-01-02T00:00:00Z", "2022-01-03T00:00:00Z"]
+                written, state = self.sync(stream_class, {}, True)
+                self.assertEqual(len(written), 6)
+                self.assertEqual(set(state["bookmarks"][stream_class.tap_stream_id]["fingerprints"]), {"1", "2"})
+
+                # the records at the bookmark are written again without fingerprints
+                written, _ = self.sync(stream_class, deepcopy(state), False)
+                self.assertEqual(len(written), 2)
+                written, _ = self.sync(stream_class, deepcopy(state), True)
+                self.assertEqual(written, [])
+                self.assertEqual(len([_ for _ in self.events if _ != "write"]), 4)
+
+                self.updated_at[0] = "2022-01-04T00:00:00Z"
+                written, state = self.sync(stream_class, state, True)
+                # changed parents are filtered as before, from their bookmark included
+                self.assertEqual([_["id"] for _ in written], [0, 2, 0, 2])
+                # their pages are hashed first, then read again to be written
+                self.assertEqual(len([_ for _ in self.events if _ != "write"]), 8)
+
+    def test_changed_single_page_parents_read_once(self):
+        """A changed parent of a single page is written from the page read
+        to fingerprint it."""
+        for stream_class in (ProductVariants, OrderFulfillments):
+            with self.subTest(stream=stream_class.tap_stream_id):
+                self.updated_at = ["2022-01-01T00:00:00Z", "2022-01-02T00:00:00Z", "2022-01-03T00:00:00Z"]
+                _, state = self.sync(stream_class, {}, True, page_size=3)
+                self.updated_at[0] = "2022-01-04T00:00:00Z"
+                written, state = self.sync(stream_class, state, True, page_size=3)
+                self.assertEqual([_["id"] for _ in written], [0, 2, 0, 2])
+                self.assertEqual(len([_ for _ in self.events if _ != "write"]), 2)
+
+                written, _ = self.sync(stream_class, state, True, page_size=3)
+                self.assertEqual(written, [])
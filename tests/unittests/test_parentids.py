@@ -0,0 +1,89 @@
+import tracemalloc
+from unittest import TestCase, mock
+
+from tap_yotpo.parentids import ParentIds
+from tap_yotpo.streams import OrderFulfillments, ProductReviews, ProductVariants
+
+
+class TestParentIds(TestCase):
+    """Checking the compact storage of the parent ids."""
+
+    def test_sequence(self):
+        ids = ParentIds([(30, "c"), (10, "a"), (20, "ü")])
+        ids.append((5, 55))
+        self.assertEqual(list(ids), [(30, "c"), (10, "a"), (20, "ü"), (5, "55")])
+        ids.sort()
+        self.assertEqual(list(ids), [(5, "55"), (10, "a"), (20, "ü"), (30, "c")])
+        self.assertEqual((len(ids), ids[2], ids[-1], ids[1:3]), (4, (20, "ü"), (30, "c"), [(10, "a"), (20, "ü")]))
+        with self.assertRaises(IndexError):
+            ids[4]  # pylint: disable=W0104
+
+    def test_find(self):
+        ids = ParentIds((_, f"ext{_}") for _ in range(0, 1000, 2))
+        self.assertEqual(
+            [ids.find(500), ids.find("500"), ids.find(501), ids.find("x"), ids.find(None)], [250] * 2 + [None] * 3
+        )
+
+    def test_smaller_than_tuples(self):
+        def pairs():
+            return ((1_000_000_000 + _, f"product-{_}") for _ in range(50_000))
+
+        tracemalloc.start()
+        try:
+            tuples = list(pairs())
+            tuples_size = tracemalloc.get_traced_memory()[0]
+            del tuples
+            start = tracemalloc.get_traced_memory()[0]
+            ids = ParentIds(pairs())
+            ids_size = tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(ids), 50_000)
+        self.assertLess(ids_size * 4, tuples_size)
+
+    def test_sort_without_tuples(self):
+        """Sorting takes less memory than the pairs as tuples."""
+        ids = ParentIds((1_000_000_000 - _, f"product-{_}") for _ in range(50_000))
+        tracemalloc.start()
+        try:
+            tuples = list(ids)
+            tuples_size = tracemalloc.get_traced_memory()[0]
+            del tuples
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            ids.sort()
+            sort_peak = tracemalloc.get_traced_memory()[1] - start
+        finally:
+            tracemalloc.stop()
+        self.assertEqual((ids[0], ids[-1]), ((999_950_001, "product-49999"), (1_000_000_000, "product-0")))
+        self.assertLess(sort_peak * 1.5, tuples_size)
+
+
+class TestResume(TestCase):
+    """Checking an interrupted child stream resumes from its parent id."""
+
+    client = mock.Mock(
+        config={"api_key": "key", "start_date": "2021-01-01T00:00:00Z"},
+        shared_product_ids=ParentIds((_, f"ext{_}") for _ in range(10, 100, 10)),
+        shared_order_ids=ParentIds((_, f"ext{_}") for _ in range(10, 100, 10)),
+    )
+
+    def test_products(self):
+        for stream_class in (ProductReviews, ProductVariants):
+            stream = stream_class(self.client)
+            for last_synced, index in (("50", 4), ("55", 5), ("5", 0), ("999", 9), ("x", 0), (None, 0)):
+                state = {"bookmarks": {stream.tap_stream_id: {"currently_syncing": last_synced}}}
+                self.assertEqual(stream.get_products(state)[1], index)
+
+    def test_orders(self):
+        stream = OrderFulfillments(self.client)
+        for low_watermark, index in (
+            ({"index": 4, "order_id": "50"}, 5),
+            ({"index": 2, "order_id": "50"}, 5),
+            ({"index": 4, "order_id": "55"}, 5),
+            ({"index": 4, "order_id": "x"}, 0),
+        ):
+            state = {"bookmarks": {"order_fulfillments": {"low_watermark": low_watermark}}}
+            self.assertEqual(stream.get_orders(state)[1], index)
+        state = {"bookmarks": {"order_fulfillments": {"currently_syncing": "50"}}}
+        self.assertEqual(stream.get_orders(state)[1], 4)
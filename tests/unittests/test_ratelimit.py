@@ -0,0 +1,56 @@
+from unittest import TestCase, mock
+
+from tap_yotpo.ratelimit import RateLimiter, TokenBucket, get_api_family
+
+
+class TestRateLimiter(TestCase):
+    """Checking the client side rate limiter."""
+
+    def test_api_family(self):
+        """Each stream url is mapped to its rate limit family."""
+        urls = {
+            "https://api.yotpo.com/core/v3/stores/key/orders": "core",
+            "https://api.yotpo.com/v1/apps/key/reviews": "apps",
+            "https://api.yotpo.com/apps/key/unsubscribers": "apps",
+            "https://api.yotpo.com/analytics/v1/emails/key/export/raw_data": "analytics",
+            "https://api-cdn.yotpo.com/v1/widget/key/products/1/reviews.json": "widget",
+        }
+        for url, family in urls.items():
+            self.assertEqual(get_api_family(url), family)
+
+    @mock.patch("time.sleep")
+    def test_throttling_adapts_rate(self, mocked_sleep):
+        """A 429 halves the rate and pauses the bucket, successes raise it
+        back up to the configured rate."""
+        limiter = RateLimiter({"rate_limits": {"core": 4}})
+        bucket = limiter.buckets["core"]
+        url = "https://api.yotpo.com/core/v3/stores/key/orders"
+
+        limiter.update(url, 429, {"Retry-After": "3"})
+        self.assertEqual(bucket.rate, 2)
+        self.assertGreater(limiter.acquire(url), 2)
+
+        for _ in range(30):
+            limiter.update(url, 200, {})
+        self.assertEqual(bucket.rate, 4)
+        self.assertIsNone(limiter.buckets["widget"].rate)
+
+    def test_rate_limit_headers(self):
+        """The advertised remaining budget sets the rate."""
+        bucket = TokenBucket()
+        bucket.on_success(limit_remaining=30, reset_after=10)
+        self.assertEqual(bucket.rate, 3)
+
+        # a configured rate is never exceeded
+        bucket = TokenBucket(rate=2)
+        bucket.on_success(limit_remaining=300, reset_after=10)
+        self.assertEqual(bucket.rate, 2)
+
+    @mock.patch("time.sleep")
+    def test_concurrent_callers_queue_up(self, mocked_sleep):
+        """Callers beyond the burst borrow tokens and wait for their turn."""
+        bucket = TokenBucket(rate=2)
+        waits = [bucket.acquire() for _ in range(4)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 0.5, places=1)
+        self.assertAlmostEqual(waits[3], 1.0, places=1)
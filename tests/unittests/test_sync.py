@@ -0,0 +1,168 @@
+import io
+import json
+import threading
+import time
+from contextlib import ExitStack
+from unittest import TestCase, mock
+
+from singer import metadata
+
+from tap_yotpo import streams
+from tap_yotpo.checkpoints import ShutdownRequested, shutdown_requested
+from tap_yotpo.discover import discover
+from tap_yotpo.sync import plan_streams, sync
+
+
+def get_catalog():
+    """Returns a catalog with every stream selected."""
+    catalog = discover()
+    for stream in catalog.streams:
+        stream.metadata = metadata.to_list(metadata.write(metadata.to_map(stream.metadata), (), "selected", True))
+    return catalog
+
+
+class TestStreamScheduler(TestCase):
+    """Checking the parallel sync of independent streams."""
+
+    def test_plan_streams(self):
+        """Parent streams are planned before their child streams."""
+        plan = [tap_stream_id for tap_stream_id, _ in plan_streams(get_catalog(), {})]
+        self.assertEqual(sorted(plan), sorted(streams.STREAMS))
+        self.assertLess(plan.index("orders"), plan.index("order_fulfillments"))
+        self.assertLess(plan.index("products"), plan.index("product_reviews"))
+        self.assertLess(plan.index("products"), plan.index("product_variants"))
+
+        state = {"currently_syncing": "product_variants"}
+        catalog = get_catalog()
+        catalog.streams = [_ for _ in catalog.streams if _.tap_stream_id in {"product_variants", "reviews"}]
+        self.assertEqual(
+            [(tap_stream_id, bool(stream)) for tap_stream_id, stream in plan_streams(catalog, state)],
+            [("products", False), ("product_variants", True), ("reviews", True)],
+        )
+
+    def test_child_streams_consume_parent_ids(self):
+        """Child streams consume the parent ids while the parent is read,
+        without reading the parent again."""
+        events = []
+
+        def products_sync(stream_obj, state, schema, stream_metadata, transformer):
+            for _ in range(5):
+                time.sleep(0.02)
+                stream_obj.collect_product_id({"yotpo_id": _, "external_id": f"ext{_}"}, [])
+            events.append("products done")
+            return state
+
+        def child_sync(stream_obj, state, schema, stream_metadata, transformer):
+            products, _ = stream_obj.get_products(state)
+            for product in products:
+                events.append((stream_obj.tap_stream_id, product[0]))
+            return state
+
+        catalog = get_catalog()
+        catalog.streams = [_ for _ in catalog.streams if _.tap_stream_id.startswith("product")]
+        config = {"api_key": "key", "start_date": "2022-01-01T00:00:00Z", "max_parallel_streams": 3}
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch("sys.stdout", io.StringIO()))
+            stack.enter_context(mock.patch.object(streams.Products, "sync", products_sync))
+            stack.enter_context(mock.patch.object(streams.ProductReviews, "sync", child_sync))
+            stack.enter_context(mock.patch.object(streams.ProductVariants, "sync", child_sync))
+            get_records = stack.enter_context(mock.patch.object(streams.Products, "get_records"))
+            sync(mock.Mock(config=config), catalog, {})
+
+        get_records.assert_not_called()
+        for tap_stream_id in ("product_reviews", "product_variants"):
+            consumed = [_ for _ in events if isinstance(_, tuple) and _[0] == tap_stream_id]
+            self.assertEqual(consumed, [(tap_stream_id, _) for _ in range(5)])
+            self.assertLess(events.index((tap_stream_id, 0)), events.index("products done"))
+
+    def test_parallel_sync(self):
+        """Streams run in parallel, the state merges the bookmarks of every
+        stream and every message is written whole."""
+        synced, running, lock = [], set(), threading.Lock()
+        overlaps = []
+
+        def fake_sync(stream_obj, state, schema, stream_metadata, transformer):
+            with lock:
+                running.add(stream_obj.tap_stream_id)
+                overlaps.append(len(running))
+            for _ in range(50):
+                streams.abstracts.write_record(stream_obj.tap_stream_id, {"id": _, "text": "x" * 500})
+            state.setdefault("bookmarks", {})[stream_obj.tap_stream_id] = {"updated_at": "2022-01-01"}
+            stream_obj.write_state(state)
+            time.sleep(0.05)
+            with lock:
+                running.discard(stream_obj.tap_stream_id)
+                synced.append(stream_obj.tap_stream_id)
+            return state
+
+        stdout = io.StringIO()
+        config = {"api_key": "key", "max_parallel_streams": 4, "output_buffer_size": 1024}
+        client = mock.Mock(config=config)
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch("sys.stdout", stdout))
+            for stream_class in streams.STREAMS.values():
+                stack.enter_context(mock.patch.object(stream_class, "sync", fake_sync))
+            sync(client, get_catalog(), {})
+
+        self.assertEqual(sorted(synced), sorted(streams.STREAMS))
+        self.assertGreater(max(overlaps), 1)
+
+        lines = [json.loads(_) for _ in stdout.getvalue().splitlines()]
+        self.assertEqual(sum(_["type"] == "RECORD" for _ in lines), 50 * len(streams.STREAMS))
+        final_state = lines[-1]["value"]
+        self.assertIsNone(final_state.get("currently_syncing"))
+        self.assertEqual(set(final_state["bookmarks"]), set(streams.STREAMS))
+
+    def test_failure_stops_parallel_streams(self):
+        """A failing stream stops the streams running in parallel at their
+        next checkpoint instead of waiting for them to complete."""
+        completed = []
+
+        def fake_sync(stream_obj, state, schema, stream_metadata, transformer):
+            if stream_obj.tap_stream_id == "reviews":
+                time.sleep(0.05)
+                raise RuntimeError("boom")
+            for parent in range(200):
+                time.sleep(0.01)
+                state.setdefault("bookmarks", {})[stream_obj.tap_stream_id] = {"parent": parent}
+                stream_obj.write_state(state)
+            completed.append(stream_obj.tap_stream_id)
+            return state
+
+        catalog = get_catalog()
+        catalog.streams = [_ for _ in catalog.streams if _.tap_stream_id in {"reviews", "emails", "collections"}]
+        started = time.monotonic()
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch("sys.stdout", io.StringIO()))
+            for stream_class in streams.STREAMS.values():
+                stack.enter_context(mock.patch.object(stream_class, "sync", fake_sync))
+            with self.assertRaisesRegex(RuntimeError, "boom"):
+                sync(mock.Mock(config={"api_key": "key", "max_parallel_streams": 3}), catalog, {})
+
+        self.assertEqual(completed, [])
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_shutdown_stops_child_streams_cleanly(self):
+        """A shutdown stopping a parent stream stops its child streams
+        without failing the sync."""
+
+        def fake_sync(stream_obj, state, schema, stream_metadata, transformer):
+            if stream_obj.tap_stream_id == "products":
+                stream_obj.id_feed.append((1, "ext1"))
+                shutdown_requested.set()
+                raise ShutdownRequested("stopped")
+            for _ in stream_obj.parent_ids:
+                pass
+            return state
+
+        catalog = get_catalog()
+        catalog.streams = [_ for _ in catalog.streams if _.tap_stream_id in {"products", "product_variants"}]
+        stdout = io.StringIO()
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch("sys.stdout", stdout))
+            for stream_class in streams.STREAMS.values():
+                stack.enter_context(mock.patch.object(stream_class, "sync", fake_sync))
+            sync(mock.Mock(config={"api_key": "key", "max_parallel_streams": 2}), catalog, {})
+
+        states = [json.loads(_)["value"] for _ in stdout.getvalue().splitlines() if '"STATE"' in _]
+        self.assertEqual(states[-1]["currently_syncing"], "products")
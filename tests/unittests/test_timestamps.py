@@ -0,0 +1,49 @@
+from unittest import TestCase, mock
+
+from singer import utils
+from singer.transform import string_to_datetime
+
+from tap_yotpo import timestamps
+from tap_yotpo.transform import _to_datetime
+
+ISO_TIMESTAMPS = [
+    "2022-06-01T12:30:45Z",
+    "2022-06-01T12:30:45.123Z",
+    "2022-06-01T12:30:45.123456Z",
+    "2022-06-01T12:30:45+05:30",
+    "2022-06-01T12:30:45.5-08:00",
+    "2022-06-01T12:30:45",
+    "2022-06-01 12:30:45",
+    "2022-06-01",
+]
+
+
+class TestTimestamps(TestCase):
+    """Checking the ISO-8601 fast path parses like
+    `singer.utils.strptime_to_utc`."""
+
+    backends = {"fromisoformat": timestamps._fromisoformat}
+    if timestamps.ciso8601:
+        backends["ciso8601"] = timestamps.ciso8601.parse_datetime
+
+    def test_iso_timestamps(self):
+        """ISO-8601 timestamps are parsed by the fast path as utc
+        datetimes."""
+        for name, backend in self.backends.items():
+            for value in ISO_TIMESTAMPS:
+                with self.subTest(backend=name, value=value), mock.patch.object(timestamps, "_parse", backend):
+                    parsed = timestamps.parse_iso8601(value)
+                    self.assertEqual(parsed, utils.strptime_to_utc(value))
+                    self.assertEqual(parsed.utcoffset().total_seconds(), 0)
+                    self.assertEqual(utils.strftime(parsed), utils.strftime(utils.strptime_to_utc(value)))
+                    self.assertEqual(_to_datetime(value), (True, string_to_datetime(value)))
+
+    def test_fallback(self):
+        """Other formats are parsed by `dateutil`."""
+        for value in ("June 1 2022 12:30", "2022-6-1"):
+            self.assertIsNone(timestamps.parse_iso8601(value))
+            self.assertEqual(timestamps.strptime_to_utc(value), utils.strptime_to_utc(value))
+        self.assertIsNone(timestamps.parse_iso8601(None))
+        self.assertIsNone(timestamps.parse_iso8601(""))
+        with self.assertRaises(ValueError):
+            timestamps.strptime_to_utc("not a date")
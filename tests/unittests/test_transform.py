@@ -0,0 +1,77 @@
+import copy
+import json
+import random
+from unittest import TestCase
+
+import singer
+from singer.transform import SchemaMismatch
+
+from tap_yotpo.helpers import get_abs_path
+from tap_yotpo.streams import STREAMS
+from tap_yotpo.transform import CompiledTransformer
+
+VALUES = {
+    "string": ["text", "", "1,000", 12, 4.5, True],
+    "integer": [12, -3, "1,024", "7", 3.9, True],
+    "number": [4.5, 0, "1,024.5", "3", 7],
+    "boolean": [True, False, "false", "FALSE", "true", 0, 1],
+    "date-time": ["2022-09-05T14:54:55Z", "2022-09-05T14:54:55.123+02:00", "2022-09-05", "2022-09-05 14:54:55"],
+}
+INVALID_VALUES = [None, "", "nope", "not a date", 1662389695, {"unexpected": 1}, [1, 2]]
+
+
+def sample_value(schema, rand, noise):
+    """Returns a value matching the schema, including values which need
+    coercion, extra keys and with a `noise` probability invalid values."""
+    if rand.random() < noise:
+        return rand.choice(INVALID_VALUES)
+    types = schema.get("type", ["string"])
+    types = [types] if isinstance(types, str) else types
+    typ = rand.choice([_ for _ in types if _ != "null"] or ["string"])
+    if "null" in types and rand.random() < 0.05:
+        return rand.choice([None, ""])
+    if schema.get("format") == "date-time":
+        return rand.choice(VALUES["date-time"])
+    if typ == "object":
+        data = {key: sample_value(sub, rand, noise) for key, sub in schema.get("properties", {}).items()}
+        if rand.random() < 0.3:
+            data["not_in_schema"] = {"nested": [1]}
+        return data
+    if typ == "array":
+        return [sample_value(schema.get("items", {}), rand, noise) for _ in range(rand.randint(0, 3))]
+    return rand.choice(VALUES.get(typ, VALUES["string"]))
+
+
+def transform(transformer, record, schema, metadata):
+    # singer accumulates the errors of every record, only the ones of this record are compared
+    transformer.errors = []
+    try:
+        return transformer.transform(copy.deepcopy(record), schema, metadata)
+    except SchemaMismatch as err:
+        return SchemaMismatch, str(err)
+
+
+class TestCompiledTransformer(TestCase):
+    """Checking the compiled transform matches `singer.Transformer` for every
+    stream schema."""
+
+    def test_parity_with_singer_transformer(self):
+        rand = random.Random(7)
+        compiled_transformer = CompiledTransformer()
+        for stream_name, stream in STREAMS.items():
+            with open(get_abs_path(f"schemas/{stream_name}.json"), encoding="utf-8") as schema_file:
+                schema = json.load(schema_file)
+            metadata = singer.metadata.to_map(stream.get_metadata(schema))
+            # deselect a couple of fields, the automatic ones are kept regardless
+            for field_name in rand.sample(sorted(schema["properties"]), 3):
+                metadata[("properties", field_name)]["selected"] = False
+            for metadata_map in (metadata, None):
+                with self.subTest(stream=stream_name, metadata=bool(metadata_map)):
+                    mismatches = 0
+                    for noise in (0, 0.03) * 100:
+                        record = sample_value(schema, rand, noise)
+                        expected = transform(singer.Transformer(), record, copy.deepcopy(schema), metadata_map)
+                        self.assertEqual(transform(compiled_transformer, record, schema, metadata_map), expected)
+                        mismatches += isinstance(expected, tuple)
+                    # the samples cover both transformed and rejected records
+                    self.assertTrue(0 < mismatches < 100)